@@ -0,0 +1,225 @@
+#!usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+import pygame as pg
+
+from ResourceHelpers import animation_library
+
+IDLE = 'idle'
+ATTACK = 'attack'
+HIT = 'hit'
+KO = 'ko'
+
+FRAME_TIME = {IDLE: 400, ATTACK: 90, HIT: 70, KO: 300}  # Millis each frame of action is shown
+# Shift of sprite from it's place in each frame of action, x is multiplied by direction sprite faces
+MOTION = {ATTACK: ((6, 0), (12, 0), (12, 0), (6, 0), (0, 0)), HIT: ((-2, 0), (2, 0), (-2, 0), (2, 0), (0, 0))}
+BLINK = (HIT,)  # Actions during which sprite blinks
+
+CHARACTER_LAYER = 0
+ACTING_LAYER = 1  # Attacking character is drawn above others
+PROJECTILE_LAYER = 2
+
+
+class CharacterView:
+    """
+    Runtime images of party member or NPC.Characters keep it apart from their data, so it isn't pickled
+    and is created again by character's load_sprites
+    """
+
+    __slots__ = ('image', 'rect', 'portrait')
+
+    def __init__(self, image, portrait=None):
+        """
+
+        :param image: pygame surface - idle battle image
+        :param portrait: (pygame surface, pygame rect) tuple of party member's portrait, None for NPC
+        """
+        self.image = image
+        self.rect = image.get_rect()
+        self.portrait = portrait
+
+
+class BattleSprite(pg.sprite.DirtySprite):
+    """
+    Animated sprite of NPC or party member on battle field.Watches character's HP to play hit and KO
+    animations, so damage from any source is shown.Sprite is marked dirty only when it's image or position changes
+    """
+
+    def __init__(self, character, image, rect, facing, remove_on_ko=False):
+        """
+
+        :param character: BaseNPC or BaseMember object
+        :param image: pygame surface - idle battle image of character
+        :param rect: pygame rect - place of character on battle field
+        :param facing: 1 if character faces right, -1 if left
+        :param remove_on_ko: bool - remove sprite from field after KO animation
+        """
+        super().__init__()
+        self.character = character
+        self.frames = animation_library.get_battle_frames(character._res_name, image)
+        self.home = rect.copy()
+        self.facing = facing
+        self.remove_on_ko = remove_on_ko
+        self.hp = character.HP
+        self.action = IDLE
+        self.step = 0  # Index of current frame of action
+        self.time = 0  # Millis current frame is shown
+        self.image = None
+        self.rect = rect.copy()
+        if self.hp <= 0:
+            self.play(KO)
+            self.step = self.length() - 1
+        self.show()
+
+    def play(self, action):
+        """
+        Start action animation.KO'ed character plays nothing until revived
+        :param action: IDLE, ATTACK, HIT or KO
+        """
+        if self.action == KO and action != IDLE:
+            return
+        self.action = action
+        self.step = 0
+        self.time = 0
+        layer = ACTING_LAYER if action == ATTACK else CHARACTER_LAYER
+        if layer != self._layer:
+            for group in self.groups():
+                group.change_layer(self, layer)
+            self._layer = layer
+            self.dirty = 1
+        self.show()
+
+    def length(self):
+        return max(len(self.frames[self.action]), len(MOTION.get(self.action, ())))
+
+    def update(self, dt):
+        hp = self.character.HP
+        if hp < self.hp:
+            self.play(KO if hp <= 0 else HIT)
+        elif hp > self.hp and self.action == KO:
+            self.play(IDLE)  # Resurrected
+        self.hp = hp
+
+        self.time += dt
+        frame_time = FRAME_TIME[self.action]
+        if self.time < frame_time:
+            return
+        self.time -= frame_time
+        if self.step + 1 < self.length():
+            self.step += 1
+        elif self.action == IDLE:
+            self.step = 0
+        elif self.action == KO:
+            if self.remove_on_ko:
+                self.kill()
+            self.time = 0  # Last frame stays
+            return
+        else:
+            self.play(KO if hp <= 0 else IDLE)
+            return
+        self.show()
+
+    def show(self):
+        """
+        Set image and position for current frame, marking sprite dirty if anything changed
+        """
+        frames = self.frames[self.action]
+        image = frames[self.step % len(frames)]
+        motion = MOTION.get(self.action)
+        dx, dy = motion[self.step % len(motion)] if motion else (0, 0)
+        rect = image.get_rect(midbottom=(self.home.centerx + dx * self.facing, self.home.bottom + dy))
+        visible = 0 if self.action in BLINK and self.step % 2 == 0 else 1
+        if image is not self.image or rect != self.rect or visible != self.visible:
+            self.image = image
+            self.rect = rect
+            self.visible = visible
+            self.dirty = 1
+
+
+class Projectile(pg.sprite.DirtySprite):
+    """
+    Spell projectile flying to it's target
+    """
+
+    def __init__(self, image, pos, target_rect):
+        """
+
+        :param image: pygame surface
+        :param pos: (x, y) start position
+        :param target_rect: pygame rect projectile flies to
+        """
+        super().__init__()
+        self.image = image
+        self.rect = image.get_rect(topleft=pos)
+        self.target_rect = target_rect
+        self._layer = PROJECTILE_LAYER
+        self.dirty = 1
+
+    def update(self, dt):
+        xvel = 10
+        yvel = 1
+
+        if self.rect.x < self.target_rect.x:
+            self.rect.x += xvel
+        elif self.rect.x > self.target_rect.x:
+            self.rect.x -= xvel
+        if self.rect.y < self.target_rect.y:
+            self.rect.y += yvel
+        elif self.rect.y > self.target_rect.y:
+            self.rect.y -= yvel
+        self.dirty = 1
+        if self.rect.colliderect(self.target_rect):
+            self.kill()
+
+    def is_finished(self):
+        return not self.alive()
+
+
+class BattleField(pg.sprite.LayeredDirty):
+    """
+    Sprite batch of battle state.Draws sprites sorted by layer and redraws only areas of changed sprites,
+    the rest of the screen keeps last frame
+    """
+
+    def __init__(self, background):
+        """
+
+        :param background: pygame surface of screen size drawn under sprites
+        """
+        super().__init__()
+        self.background = background
+        self.sprites_of = {}  # character - BattleSprite
+
+    def add_character(self, character, image, rect, facing, remove_on_ko=False):
+        sprite = BattleSprite(character, image, rect, facing, remove_on_ko)
+        self.sprites_of[character] = sprite
+        self.add(sprite)
+        return sprite
+
+    def play(self, character, action):
+        """
+        Start animation of character, does nothing for characters not on field
+        :param character: BaseNPC or BaseMember object
+        :param action: IDLE, ATTACK, HIT or KO
+        """
+        sprite = self.sprites_of.get(character)
+        if sprite is not None:
+            sprite.play(action)
+
+    def center_of(self, character):
+        """
+        Get center of character's place on field
+        :param character: BaseNPC or BaseMember object
+        :return: (x, y) tuple
+        """
+        return self.sprites_of[character].home.center
+
+    def repaint(self):
+        """
+        Redraw whole field on next draw, used when something else was drawn over it
+        """
+        self.repaint_rect(self.background.get_rect())
+
+    def draw(self, surface):
+        return super().draw(surface, self.background)
@@ -0,0 +1,643 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks of engine hot paths on synthetic fixtures, run with SDL dummy drivers.
+
+Run all:            python Benchmarks.py
+Run some:           python Benchmarks.py world_draw party_collision
+Compare to saved:   python Benchmarks.py --compare
+Update baseline:    python Benchmarks.py --save
+"""
+
+import argparse
+import json
+import os
+import pickle as pic
+import random as rand
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from functools import partial
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame as pg
+
+import Events as evs
+from GameStates import GameState
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(CODE_DIR, 'benchmark_baseline.json')
+REGRESSION_RATIO = 1.25  # Median slower than baseline by this factor is reported as regression
+SCREEN = (800, 640)
+
+CREATURES = ('warrior', 'mage', 'healer', 'ranger', 'test', 'fire_elem', 'water_elem', 'earth_elem', 'light_elem',
+             'dark_elem', 'trader', 'wizard', 'splash', 'Fireball', 'Lightning')
+SPRITE_GROUPS = ('portrait', 'battle_idle', 'map', 'endgame', 'projectile')
+STRINGS = {
+    'main_menu': {'0': 'New game', '1': 'Load game', '2': 'Exit'},
+    'load_menu': {'0': 'Slot 1', '1': 'Slot 2', '2': 'Slot 3'},
+    'pause_menu': {'0': 'Resume', '1': 'Exit'},
+    'party_menu_info_first': {'0_hp': 'HP', '1_mp': 'MP', '2_str': 'STR', '3_int': 'INT', '4_dex': 'DEX',
+                              '5_dur': 'DUR', '6_lvl': 'LVL', '7_exp': 'EXP', '8_dmg': 'DMG', '9_def': 'DEF'},
+    'party_menu_info_second': {'0_wp': 'Weapon', '1_arm': 'Armor'},
+    'party_menu_info_others': {'sp': 'Spells'},
+}
+
+TMX_TEMPLATE = '''<?xml version="1.0" encoding="UTF-8"?>
+<map version="1.0" orientation="orthogonal" renderorder="right-down" width="{w}" height="{h}" tilewidth="16" tileheight="16" backgroundcolor="#3050a0" nextobjectid="10">
+ <tileset firstgid="1" name="tiles" tilewidth="16" tileheight="16" tilecount="4" columns="2">
+  <image source="tiles.png" width="32" height="32"/>
+  <tile id="0"><properties><property name="walkable" value="true"/></properties></tile>
+  <tile id="1"><properties><property name="walkable" value="false"/></properties></tile>
+  <tile id="2"><properties><property name="walkable" value="true"/></properties></tile>
+  <tile id="3"><properties><property name="walkable" value="false"/></properties></tile>
+ </tileset>
+ <layer name="ground" width="{w}" height="{h}"><data encoding="csv">{ground}</data></layer>
+ <layer name="walls" width="{w}" height="{h}"><data encoding="csv">{walls}</data></layer>
+ <objectgroup name="teleports" visible="0">
+  <object id="1" x="64" y="64" width="16" height="16"><properties><property name="pos_x" value="100"/><property name="pos_y" value="100"/><property name="map_f" value="town"/><property name="world" value="localworld"/></properties></object>
+ </objectgroup>
+ <objectgroup name="npc" visible="0">
+  <object id="2" x="200" y="40" width="16" height="16"><properties><property name="npc" value="enemy"/><property name="party_members" value="FireElemental,WaterElemental"/><property name="bg" value="forest"/><property name="nid" value="1"/></properties></object>
+  <object id="3" x="120" y="120" width="16" height="16"><properties><property name="npc" value="trader"/></properties></object>
+  <object id="4" x="304" y="304" width="16" height="16"><properties><property name="npc" value="enemy"/><property name="party_members" value="EarthElemental"/><property name="bg" value="forest"/><property name="nid" value="2"/><property name="ai" value="chase"/></properties></object>
+ </objectgroup>
+</map>
+'''
+
+BENCHMARKS = []
+
+
+def benchmark(name, rounds):
+    """
+    Decorator which registers benchmark setup function.Setup gets fixture and returns function to be timed
+    :param name: string - benchmark name
+    :param rounds: int - number of timed calls
+    """
+    def register(func):
+        BENCHMARKS.append((name, rounds, func))
+        return func
+
+    return register
+
+
+def write_tmx(path, width, height):
+    """
+    Write map with walkable ground layer and wall layer which has vertical wall segments and border
+    :param path: string - file path
+    :param width: int - width in tiles
+    :param height: int - height in tiles
+    """
+    walls = []
+    for y in range(height):
+        for x in range(width):
+            border = x in (0, width - 1) or y in (0, height - 1)
+            walls.append('2' if border or (x % 7 == 3 and y % 5 != 0) else '0')
+    with open(path, 'w') as f:
+        f.write(TMX_TEMPLATE.format(w=width, h=height, ground=','.join(['1'] * (width * height)), walls=','.join(walls)))
+
+
+def save_image(surface, path):
+    # pygame can't write gif, but SDL_image detects format by content, so png data under .gif name loads fine
+    tmp_path = path + '.png'
+    pg.image.save(surface, tmp_path)
+    os.replace(tmp_path, path)
+
+
+class Fixture:
+    """
+    Temporary game directory with generated sprites, strings and maps
+    """
+
+    def __init__(self):
+        self.old_dir = os.getcwd()
+        self.root = tempfile.mkdtemp(prefix='jrpg_bench_')
+        os.chdir(self.root)
+        pg.init()
+        self.screen = pg.display.set_mode(SCREEN)
+        self.write_sprites()
+        self.write_strings()
+        self.write_maps()
+        os.makedirs('saves')
+
+    def write_sprites(self):
+        sprites_dir = os.path.join('resources', 'sprites')
+        frame = pg.Surface((15, 18))
+        frame.fill(pg.Color('#c86432'))
+        for creature in CREATURES:
+            path = os.path.join(sprites_dir, creature)
+            os.makedirs(path)
+            for group in ('up', 'down', 'left', 'right'):
+                for x in range(1, 3):
+                    save_image(frame, os.path.join(path, '{}_{}.gif'.format(group, x)))
+            for group in SPRITE_GROUPS:
+                save_image(frame, os.path.join(path, group + '.gif'))
+        os.makedirs(os.path.join(sprites_dir, 'backgrounds'))
+        bg = pg.Surface((64, 64))
+        bg.fill(pg.Color('darkgreen'))
+        pg.image.save(bg, os.path.join(sprites_dir, 'backgrounds', 'forest.png'))
+
+    def write_strings(self):
+        strings_dir = os.path.join('resources', 'strings')
+        os.makedirs(strings_dir)
+        for name, strings in STRINGS.items():
+            with open(os.path.join(strings_dir, name + '_en'), 'wb') as f:
+                pic.dump(strings, f)
+
+    def write_maps(self):
+        maps_dir = os.path.join('resources', 'maps')
+        os.makedirs(maps_dir)
+        tileset = pg.Surface((32, 32))
+        tileset.fill(pg.Color('darkgreen'))
+        tileset.fill(pg.Color('gray'), pg.Rect(16, 0, 16, 16))
+        pg.image.save(tileset, os.path.join(maps_dir, 'tiles.png'))
+        write_tmx(os.path.join(maps_dir, 'world.tmx'), 128, 128)
+        write_tmx(os.path.join(maps_dir, 'town.tmx'), 40, 30)
+        regions_dir = os.path.join(maps_dir, 'regions')  # Open world of 4x4 regions
+        os.makedirs(regions_dir)
+        shutil.copy(os.path.join(maps_dir, 'tiles.png'), regions_dir)
+        for column in range(4):
+            for row in range(4):
+                write_tmx(os.path.join(regions_dir, 'world_{}_{}.tmx'.format(column, row)), 32, 32)
+
+    def close(self):
+        os.chdir(self.old_dir)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def world_args(map_name='world'):
+    return {'player_party': None, 'pos_x': 0, 'pos_y': 0, 'map_file': 'resources/maps/{}.tmx'.format(map_name)}
+
+
+@benchmark('world_draw', 20)
+def bench_world_draw(fixture):
+    from GameStates import WorldMapState
+
+    state = WorldMapState(world_args())
+    state.player_party.set_pos(1000, 1000)
+    state.camera.update(state.player_party)
+    return lambda: state.draw(fixture.screen)
+
+
+@benchmark('party_collision', 200)
+def bench_party_collision(fixture):
+    from Player import PlayerParty, Teleport
+    from Spatial import Triggers, Colliders
+
+    rng = rand.Random(1)
+    colliders = Colliders(pg.Rect(rng.randrange(0, 8000), rng.randrange(0, 8000), 32, 32) for _ in range(10000))
+    teleports = Triggers(Teleport(pg.Rect(rng.randrange(0, 8000), rng.randrange(0, 8000), 16, 16), 0, 0, '', 'overworld')
+                         for _ in range(1000))
+    party = PlayerParty(4000, 4000)
+    party.right = party.down = True
+
+    def step():
+        party.update(colliders, teleports, Triggers())
+
+    return step
+
+
+@benchmark('region_crossing', 12)
+def bench_region_crossing(fixture):
+    """
+    Walk open world across region borders, loading and unloading regions without background thread
+    """
+    import Regions
+    from GameStates import OpenWorldMapState
+
+    Regions.BACKGROUND_LOADING = False
+    state = OpenWorldMapState({'player_party': None, 'pos_x': 0, 'pos_y': 0, 'map_file': 'resources/maps/regions'})
+    region = 32 * state.scaled_size
+    route = [(1, 1), (2, 1), (2, 2), (3, 2), (3, 3), (2, 3), (1, 3), (1, 2), (0, 2), (0, 1), (0, 0), (1, 0)]
+    steps = iter(route * 2)
+
+    def cross():
+        column, row = next(steps)
+        state.player_party.set_pos(column * region + region // 2, row * region + region // 2)
+        state.update(16)
+        state.draw(fixture.screen)
+
+    return cross
+
+
+@benchmark('create_colliders', 10)
+def bench_create_colliders(fixture):
+    from GameStates import WorldMapState
+
+    state = WorldMapState(world_args())
+
+    def build():
+        state.nav_grid = state.create_nav_grid()
+        state.create_colliders()
+
+    return build
+
+
+@benchmark('map_load', 20)
+def bench_map_load(fixture):
+    """
+    Load world map from compiled sidecar and build it's navigation grid
+    """
+    import MapCache
+    from Pathfinding import NavGrid
+
+    path = os.path.join('resources', 'maps', 'world.tmx')
+    MapCache.load_map(path)  # Compile sidecar
+
+    def load():
+        NavGrid.from_map(MapCache.load_map(path), 32)
+
+    return load
+
+
+@benchmark('pathfinding', 20)
+def bench_pathfinding(fixture):
+    """
+    Plan path across world map and steer 30 agents to one goal with shared distance field
+    """
+    from GameStates import WorldMapState
+
+    grid = WorldMapState(world_args()).nav_grid
+    rng = rand.Random(1)
+    agents = []
+    while len(agents) < 30:
+        tile = (rng.randrange(1, grid.width - 1), rng.randrange(1, grid.height - 1))
+        if grid.is_walkable(tile):
+            agents.append(tile)
+    goal = (grid.width - 2, grid.height - 2)
+
+    def search():
+        grid.fields.clear()
+        if grid.find_path((1, 1), goal) is None:
+            raise RuntimeError('No path found')
+        for tile in agents:
+            grid.step_towards(tile, goal)
+
+    return search
+
+
+@benchmark('save_load', 20)
+def bench_save_load(fixture):
+    from Game import Game
+    from GameStates import WorldMapState
+    from WorldFlags import DEFEATED
+
+    game = Game(fixture.screen, partial(WorldMapState, world_args()))
+    world = game.state_stack.peek()
+    for identifier in range(100):
+        world.world_flags.set(DEFEATED, identifier)
+    path = os.path.join('saves', 'save_0.sf')
+
+    def round_trip():
+        game.save_game(path)
+        game.load_game(path)
+
+    return round_trip
+
+
+@benchmark('party_window', 50)
+def bench_party_window(fixture):
+    import UI
+    from Player import PlayerParty
+
+    party = PlayerParty(0, 0)
+    return lambda: UI.PartyWindow(100, 100, 440, 320, party)
+
+
+@benchmark('party_reload', 200)
+def bench_party_reload(fixture):
+    from Player import PlayerParty
+
+    party = PlayerParty(0, 0)
+
+    def reload():
+        party.on_load()
+        party.scale_up()
+        party.reset_scale()
+
+    return reload
+
+
+@benchmark('battle_turn', 100)
+def bench_battle_turn(fixture):
+    import RNG
+    from Enums import ActionsEnum as Actions
+    from GameStates import BattleState
+    from Player import PlayerParty
+    from Spatial import Triggers
+
+    party = PlayerParty(0, 0)
+    party.update([], Triggers(), Triggers())  # Select current animation, as map state does before battle
+    party.enter_battle()
+    members = ['FireElemental', 'WaterElemental', 'EarthElemental', 'DarkElemental']
+    state = BattleState({'player_party': party, 'party_members': members, 'bg': 'forest', 'id': 1})
+    state.wait = lambda time_ms: None
+    RNG.seed(1)
+
+    def turn():
+        for npc in list(state.npc_party):
+            state.current_character = npc
+            state.call_ai()
+        for member in party.get_alive():
+            state.current_character = member
+            state.last_action = Actions.Attack
+            state.current_window = state.npc_window
+            state.apply_action(state.npc_party[0])
+        for npc in state.npc_party:
+            npc.HP = npc.MAX_HP
+        for member in party:
+            member.resurrect()
+        evs.bus.clear()
+
+    return turn
+
+
+@benchmark('roster_bulk', 50)
+def bench_roster_bulk(fixture):
+    """
+    Bulk stat updates of simulated battle with 512 active members
+    """
+    from Player import Warrior
+    from Roster import Roster
+
+    roster = Roster(512, 512)
+    for _ in range(512):
+        roster.add(Warrior())
+
+    def battle():
+        roster.stats['HP'][roster.active[::3]] = 0
+        roster.stats['KO'][roster.active[::3]] = True
+        roster.alive()
+        roster.resurrect_all()
+        roster.add_exp(1)
+
+    return battle
+
+
+@benchmark('loot_bulk', 50)
+def bench_loot_bulk(fixture):
+    """
+    Loot of encounter with 1000 enemies of each kind
+    """
+    import NPC
+
+    tables = [archetype.loot for archetype in NPC.enemies.archetypes.values()]
+
+    def roll():
+        loot = {}
+        for table in tables:
+            table.sample_counts(1000, loot)
+
+    return roll
+
+
+@benchmark('battle_draw', 300)
+def bench_battle_draw(fixture):
+    import RNG
+    from GameStates import BattleState
+    from Player import PlayerParty
+    from Spatial import Triggers
+
+    RNG.seed(1)
+    party = PlayerParty(0, 0)
+    party.update([], Triggers(), Triggers())
+    party.enter_battle()
+    members = ['FireElemental', 'WaterElemental', 'EarthElemental', 'DarkElemental']
+    state = BattleState({'player_party': party, 'party_members': members, 'bg': 'forest', 'id': 1})
+
+    def frame():
+        state.update(16)
+        state.draw(fixture.screen)
+
+    return frame
+
+
+@benchmark('particles', 300)
+def bench_particles(fixture):
+    """
+    Update and draw spell particles with all effects running at once
+    """
+    import Particles
+    import RNG
+
+    RNG.seed(1)
+    system = Particles.ParticleSystem()
+
+    def frame():
+        for name in Particles.EFFECTS:
+            if all(e.effect is not Particles.EFFECTS[name] or not e.active for e in system.pool):
+                system.emit(name, (640, 250), (80, 200))
+        system.update(16)
+        system.draw(fixture.screen)
+
+    return frame
+
+
+@benchmark('enemy_create', 500)
+def bench_enemy_create(fixture):
+    import NPC
+
+    members = ['FireElemental', 'WaterElemental', 'EarthElemental', 'DarkElemental']
+    return lambda: [NPC.enemies.create(name) for name in members]
+
+
+@benchmark('inventory_save', 300)
+def bench_inventory_save(fixture):
+    """
+    Pickle and unpickle party inventory holding thousands of items
+    """
+    import Items
+    from Player import PlayerParty
+
+    party = PlayerParty(0, 0)
+    party.add_items([Items.get('HealthPotion')] * 5000 + [Items.get('ManaPotion')] * 2000)
+    return lambda: pic.loads(pic.dumps(party.inventory))
+
+
+@benchmark('event_burst', 50)
+def bench_event_burst(fixture):
+    """
+    Route burst of key events through engine to player control of map state
+    """
+    from Game import Game
+    from GameStates import WorldMapState
+
+    game = Game(fixture.screen, partial(WorldMapState, world_args('town')))
+    keys = (pg.K_w, pg.K_a, pg.K_s, pg.K_d, pg.K_x, pg.K_UP)
+    events = [pg.event.Event(pg.KEYDOWN if i % 2 else pg.KEYUP, key=keys[i % len(keys)]) for i in range(1000)]
+
+    def burst():
+        for event in events:
+            game.dispatcher.dispatch(event)
+
+    return burst
+
+
+@benchmark('message_burst', 50)
+def bench_message_burst(fixture):
+    """
+    Post burst of battle messages, as several characters acting in one turn do, and deliver them through engine
+    """
+    from Enums import BattleEnum as Battle
+    from Game import Game
+
+    game = Game(fixture.screen, GameState)
+    subs = (Battle.StatusUpdate, Battle.CharacterKO, Battle.NextTurn)
+
+    def burst():
+        for i in range(1000):
+            evs.bus.post(evs.BattleEvent, {'sub': subs[i % len(subs)], 'status': ''})
+        game.event_loop()
+
+    return burst
+
+
+@benchmark('npc_ai', 200)
+def bench_npc_ai(fixture):
+    """
+    Frame of 200 roaming NPCs wandering, patrolling and chasing party on world map
+    """
+    import MapAI
+    import RNG
+    from GameStates import WorldMapState
+    from NPC import MapNPC
+
+    state = WorldMapState(world_args())
+    grid = state.nav_grid
+    rng = rand.Random(1)
+    RNG.seed(1)
+    while len(state.npcs) < 200:
+        tile = (rng.randrange(1, grid.width - 1), rng.randrange(1, grid.height - 1))
+        if not grid.is_walkable(tile):
+            continue
+        kind = len(state.npcs) % 3
+        if kind == 0:
+            ai = MapAI.Wander(tile, 4)
+        elif kind == 1:
+            ai = MapAI.Patrol([tile, (tile[0], min(tile[1] + 4, grid.height - 2))])
+        else:
+            ai = MapAI.Chase(tile, 6, 8)
+        x, y = tile[0] * grid.tile_size, tile[1] * grid.tile_size
+        state.npcs.append(MapNPC(x, y, ['FireElemental'], 'forest', 100 + len(state.npcs), ai))
+    state.player_party.set_pos(grid.width * grid.tile_size // 2, grid.height * grid.tile_size // 2)
+    state.camera.update(state.player_party)
+    return lambda: state.update(16)
+
+
+STARTUP_SCRIPT = """
+import time
+started = time.perf_counter()
+import sys
+import pygame as pg
+from Game import Game
+from GameStates import MainMenuState
+pg.display.init()
+pg.font.init()
+game = Game(pg.display.set_mode((800, 640)), MainMenuState)
+game.draw()
+pg.display.update()
+print((time.perf_counter() - started) * 1000)
+print(','.join(m for m in ('Player', 'NPC', 'Spatial', 'Pathfinding', 'MapAI', 'Regions', 'MapCache', 'WorldFlags',
+                            'pytmx', 'pyganim') if m in sys.modules))
+"""
+
+
+@benchmark('startup', 5)
+def bench_startup(fixture):
+    """
+    Time to first main menu frame in fresh interpreter.Fails if map or battle subsystems were imported
+    """
+    env = dict(os.environ, PYTHONPATH=CODE_DIR)
+
+    def start():
+        out = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], cwd=fixture.root, env=env, check=True,
+                             stdout=subprocess.PIPE, universal_newlines=True).stdout.split('\n')
+        if out[-2]:
+            raise RuntimeError('imported at startup: {}'.format(out[-2]))
+
+    return start
+
+
+def run_benchmark(name, rounds, setup):
+    """
+    Set up fixture and time benchmark
+    :return: dict with timings in millis or error description
+    """
+    fixture = Fixture()
+    try:
+        func = setup(fixture)
+        func()  # Warm up
+        times = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            func()
+            times.append((time.perf_counter() - start) * 1000)
+        times.sort()
+        return {'rounds': rounds, 'min': times[0], 'median': times[len(times) // 2], 'mean': sum(times) / rounds}
+    except Exception as e:
+        return {'error': '{}: {}'.format(type(e).__name__, e)}
+    finally:
+        evs.bus.clear()
+        fixture.close()
+
+
+def compare(results, baseline):
+    """
+    Print comparison with baseline
+    :return: list of names of regressed benchmarks
+    """
+    regressed = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if 'error' in result or base is None or 'error' in base:
+            continue
+        ratio = result['median'] / base['median']
+        mark = ''
+        if ratio > REGRESSION_RATIO:
+            mark = '  REGRESSION'
+            regressed.append(name)
+        print('{:<20} {:10.3f} ms  baseline {:10.3f} ms  x{:.2f}{}'.format(name, result['median'], base['median'],
+                                                                          ratio, mark))
+    return regressed
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark engine hot paths')
+    parser.add_argument('names', nargs='*', help='benchmarks to run (all by default)')
+    parser.add_argument('--save', action='store_true', help='write results as new baseline')
+    parser.add_argument('--compare', action='store_true', help='compare with baseline, exit with 1 on regression')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, rounds, setup in BENCHMARKS:
+        if args.names and name not in args.names:
+            continue
+        results[name] = run_benchmark(name, rounds, setup)
+        result = results[name]
+        if 'error' in result:
+            print('{:<20} failed: {}'.format(name, result['error']))
+        else:
+            print('{:<20} median {:10.3f} ms  min {:10.3f} ms'.format(name, result['median'], result['min']))
+
+    if args.compare and os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as f:
+            if compare(results, json.load(f)):
+                sys.exit(1)
+    if args.save:
+        baseline = {}
+        if os.path.exists(BASELINE_FILE):
+            with open(BASELINE_FILE) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -33,6 +33,7 @@ class BattleEnum(Enum):
     AICall = 8  # Raised when ai method on current npc should be called
     SpellSelected = 9
     ItemSelected = 10
+    SpellCast = 11  # Raised when (non) player character casts spell, carries spell, caster and target
 
 
 @unique
@@ -8,4 +8,107 @@ EngineEvent = pg.USEREVENT + 1
 TeleportEvent = pg.USEREVENT + 2
 EncounterEvent = pg.USEREVENT + 3
 BattleEvent = pg.USEREVENT + 4  # Raised when some battle state related event occurs
-MenuQuitEvent = pg.USEREVENT + 5  # Pygame allows only 9 user events.Don't forget about that and create subevents!
+MenuQuitEvent = pg.USEREVENT + 5
+# Event types above are delivered through EventBus below, pygame queue carries OS input only
+
+ANY_EVENT = (None, None, None)  # Dispatcher key of handler which receives events nobody else handled
+
+
+class EventDispatcher:
+    """
+    Routes events to handlers registered by (event type, sub, key).Most specific handler is called first,
+    handler which returns False passes event on to less specific one
+    """
+
+    def __init__(self):
+        self.handlers = {}
+
+    def register(self, event_type, handler, sub=None, key=None):
+        """
+        Subscribe handler to events.Registering same (event type, sub, key) again replaces previous handler
+        :param event_type: pygame event type, None to receive events no other handler took
+        :param handler: function which gets event
+        :param sub: subevent enum, None for any subevent
+        :param key: pygame key code, None for any key
+        """
+        self.handlers[(event_type, sub, key)] = handler
+
+    def dispatch(self, event):
+        """
+        Pass event to registered handler
+        :param event: pygame event
+        :return: bool - True if event was handled
+        """
+        event_type = event.type
+        sub = getattr(event, 'sub', None)
+        key = getattr(event, 'key', None)
+        if sub is not None:
+            if key is not None and self.call((event_type, sub, key), event):
+                return True
+            if self.call((event_type, sub, None), event):
+                return True
+        if key is not None and self.call((event_type, None, key), event):
+            return True
+        return self.call((event_type, None, None), event) or self.call(ANY_EVENT, event)
+
+    def call(self, lookup, event):
+        handler = self.handlers.get(lookup)
+        return handler is not None and handler(event) is not False
+
+
+class Message:
+    """
+    Game internal event.Has same interface as pygame event - type and payload attributes
+    """
+
+    def __init__(self, event_type, attrs):
+        """
+
+        :param event_type: one of user event types defined above
+        :param attrs: dict - payload, accessible as attributes
+        """
+        self.__dict__.update(attrs)
+        self.type = event_type
+
+    def __repr__(self):
+        return '<Message({}, {})>'.format(self.type, {k: v for k, v in self.__dict__.items() if k != 'type'})
+
+
+class EventBus:
+    """
+    In-process queue of game internal events, pygame queue is left for OS input only.Messages are delivered
+    by priority (lower value first), messages with same priority in order they were posted
+    """
+
+    def __init__(self):
+        self.queue = []  # (priority, sequence number, message), sorted when drained
+        self.counter = 0
+
+    def post(self, event_type, attrs=None, priority=0):
+        """
+        Queue message for next frame
+        :param event_type: one of user event types
+        :param attrs: dict - message payload
+        :param priority: int - lower value is delivered earlier
+        """
+        self.queue.append((priority, self.counter, Message(event_type, attrs or {})))
+        self.counter += 1
+
+    def drain(self):
+        """
+        Take all queued messages.Messages posted while these are handled stay queued for next frame,
+        like pygame events posted during event loop
+        :return: list of Message objects in delivery order
+        """
+        queue, self.queue = self.queue, []
+        queue.sort()
+        return [message for _, _, message in queue]
+
+    def clear(self):
+        self.queue = []
+
+    def __len__(self):
+        return len(self.queue)
+
+
+bus = EventBus()  # Shared instance used by engine, game states, UI and characters
@@ -3,9 +3,13 @@
 
 import pygame as pg
 import Events as evs
+import RNG
 from Enums import GameEnum as sub
-from GameStates import StateStack
+from GameStates import StateStack, end_load
+from Profiler import profiler
+from ResourceHelpers import SettingsHelper as Settings
 import pickle as pic
+import time
 
 
 class Game:
@@ -13,11 +17,12 @@ class Game:
     Main engine class responsible for event handling,rendering and running game states
     """
 
-    def __init__(self, screen, start_state):
+    def __init__(self, screen, start_state, started=None):
         """
         Game engine initialization
         :param screen: pygame display
         :param start_state: name of starting state class
+        :param started: float - perf_counter value at process start, used to measure time to first frame
         """
 
         self.finish = False
@@ -26,27 +31,72 @@ class Game:
         self.fps = 60
         self.state_stack = StateStack()
         self.state_stack.push(start_state())
+        self.dispatcher = evs.EventDispatcher()
+        self.register_events()
+        self.started = started
+        settings = Settings()
+        self.profile_dump = settings.get('profiler_dump', 'profile.json')  # Written on exit if profiler was enabled
+        self.startup_budget = settings.get('startup_budget_ms', 1500)
+        if settings.get('profiler', False):
+            profiler.enable()
 
     def event_loop(self):
         """
-        Handles all events
-        """
-        for event in pg.event.get():
-            if event.type is evs.EngineEvent:
-                if event.sub is sub.StateCallEvent:
-                    self.state_stack.push(event.state(event.args))
-                    self.state_stack.set_persistent(event.args)
-                elif event.sub is sub.StateExitEvent:
-                    self.state_stack.pop()
-                    self.state_stack.send_callback(event.args)
-                elif event.sub is sub.StackResetEvent:
-                    self.state_stack.reset()
-                elif event.sub is sub.GameSaveEvent:
-                    self.save_game(event.path)
-                elif event.sub is sub.GameLoadEvent:
-                    self.load_game(event.path)
-            else:
-                self.state_stack.get_event(event)
+        Handles all events - game messages queued during previous frame first, then OS input
+        """
+        for message in self.get_messages():
+            self.dispatcher.dispatch(message)
+        for event in self.get_events():
+            self.dispatcher.dispatch(event)
+
+    def get_messages(self):
+        """
+        Get game internal messages which should be processed this frame
+        :return: list of Message objects
+        """
+        return evs.bus.drain()
+
+    def get_events(self):
+        """
+        Get OS input events which should be processed this frame
+        :return: list of pygame events
+        """
+        return pg.event.get()
+
+    def register_events(self):
+        """
+        Subscribe engine event handlers, all other events are passed to active state
+        """
+        self.dispatcher.register(pg.KEYDOWN, self.toggle_profiler, key=pg.K_F3)
+        self.dispatcher.register(evs.EngineEvent, self.call_state, sub=sub.StateCallEvent)
+        self.dispatcher.register(evs.EngineEvent, self.exit_state, sub=sub.StateExitEvent)
+        self.dispatcher.register(evs.EngineEvent, self.reset_stack, sub=sub.StackResetEvent)
+        self.dispatcher.register(evs.EngineEvent, self.on_save_event, sub=sub.GameSaveEvent)
+        self.dispatcher.register(evs.EngineEvent, self.on_load_event, sub=sub.GameLoadEvent)
+        self.dispatcher.register(None, self.pass_event)
+
+    def toggle_profiler(self, event):
+        profiler.toggle_overlay()
+
+    def call_state(self, event):
+        self.state_stack.push(event.state(event.args))
+        self.state_stack.set_persistent(event.args)
+
+    def exit_state(self, event):
+        self.state_stack.pop()
+        self.state_stack.send_callback(event.args)
+
+    def reset_stack(self, event):
+        self.state_stack.reset()
+
+    def on_save_event(self, event):
+        self.save_game(event.path)
+
+    def on_load_event(self, event):
+        self.load_game(event.path)
+
+    def pass_event(self, event):
+        self.state_stack.get_event(event)
 
     def update(self, dt):
         """
@@ -64,21 +114,24 @@ class Game:
         """
 
         self.state_stack.peek().draw(self.screen)
+        profiler.draw(self.screen)
 
     def save_game(self, path):
         """
         Save current game state in file
         :param path: string - path to game save file
         """
+        for i in self.state_stack.states:
+            i.on_save()
         try:
-            file = open(path, "wb")
-            for i in self.state_stack.states:
-                i.on_save()
-            pic.dump(self.state_stack, file)
+            with open(path, "wb") as file:
+                pic.dump(self.state_stack, file)
+                pic.dump(RNG.streams, file)  # Random streams continue where they were when game is loaded
+        except (IOError, pic.PicklingError) as e:
+            print("Game save error: {}".format(e))
+        finally:
             for i in self.state_stack.states:
                 i.on_load()
-        except IOError or pic.PicklingError as e:
-            print("Game save error: {}".format(e))
 
     def load_game(self, path):
         """
@@ -87,14 +140,30 @@ class Game:
         """
         temp_stack = self.state_stack
         try:
-            file = open(path, 'rb')
-            self.state_stack = pic.load(file)
+            with open(path, 'rb') as file:
+                self.state_stack = pic.load(file)
+                try:
+                    RNG.restore(pic.load(file))
+                except EOFError:  # Saves made before random streams were saved
+                    pass
             for i in self.state_stack.states:
                 i.on_load()
             del temp_stack
-        except IOError or pic.UnpicklingError as e:
+        except (IOError, pic.UnpicklingError) as e:
             print("Game load error: {}".format(e))
             self.state_stack = temp_stack
+        finally:
+            end_load()
+
+    def check_startup(self):
+        """
+        Called after first frame is shown.Reports time since process start if it exceeds startup budget
+        """
+        elapsed = (time.perf_counter() - self.started) * 1000
+        self.started = None
+        profiler.record('startup', elapsed)
+        if elapsed > self.startup_budget:
+            print("Startup took {:.0f} ms, budget is {} ms".format(elapsed, self.startup_budget))
 
     def run(self):
         """
@@ -103,7 +172,17 @@ class Game:
 
         while not self.finish:
             dt = self.clock.tick(self.fps)
-            self.event_loop()
-            self.update(dt)
-            self.draw()
-            pg.display.update()
+            with profiler.span('event_loop'):
+                self.event_loop()
+            with profiler.span('update'):
+                self.update(dt)
+            with profiler.span('draw'):
+                self.draw()
+            with profiler.span('flip'):
+                pg.display.update()
+            profiler.end_frame(dt)
+            if self.started is not None:
+                self.check_startup()
+
+        if profiler.enabled:
+            profiler.dump(self.profile_dump)
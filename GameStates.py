@@ -7,10 +7,41 @@ import pygame as pg
 from Events import *
 from Enums import BattleEnum as Battle, SideEnum as Sides, ActionsEnum as Actions, GameEnum
 from ResourceHelpers import StringsHelper, SettingsHelper, MapsHelper, SpritesHelper
+from Profiler import profiler
 import UI
-from Player import PlayerParty, Camera, Teleport, BaseMember
-from NPC import Test, FireElemental, WaterElemental, EarthElemental, LightElemental, DarkElemental, BaseNPC, MapNPC, MapTrader, MapWizard
-from pytmx import load_pygame
+from Lazy import LazyModule
+
+# Map, battle and NPC subsystems are imported on first use, so main menu is shown without waiting for them
+Player = LazyModule('Player')
+NPC = LazyModule('NPC')
+BattleSprites = LazyModule('BattleSprites')
+Particles = LazyModule('Particles')
+Spatial = LazyModule('Spatial')
+Pathfinding = LazyModule('Pathfinding')
+MapAI = LazyModule('MapAI')
+Regions = LazyModule('Regions')
+MapCache = LazyModule('MapCache')
+WorldFlags = LazyModule('WorldFlags')
+
+CONTROL_KEYS = {pg.K_w: 'up', pg.K_s: 'down', pg.K_a: 'left', pg.K_d: 'right'}  # Key - player party direction flag
+RUN_KEYS = (pg.K_LSHIFT, pg.K_RSHIFT)  # Party runs while held
+LOAD_MEMO = {}  # Objects converted once for all states of save being loaded, cleared by end_load
+
+
+def end_load():
+    """
+    Called when save is loaded, forgets objects converted for it's states
+    """
+    LOAD_MEMO.clear()
+
+
+def load_tiled_map(path):
+    """
+    Load tiled map from it's compiled sidecar, compiling it if TMX file changed
+    :param path: string - map file path
+    :return: MapCache.CompiledMap object
+    """
+    return MapCache.load_map(path)
 
 
 class StateStack:
@@ -81,14 +112,18 @@ class GameState:
         self.screen_width = self.screen_rect.width
         self.screen_height = self.screen_rect.height
         self.persist = persistent
+        self.dispatcher = EventDispatcher()
+        self.dispatcher.register(pg.QUIT, self.on_quit)
 
     def get_event(self, event):
         """
-        Handles passed event.Must be overriden
+        Handles passed event by handlers registered in dispatcher
         :param event: pygame event
         """
-        if event.type == pg.QUIT:
-            self.quit = True
+        self.dispatcher.dispatch(event)
+
+    def on_quit(self, event):
+        self.quit = True
 
     def update(self, dt):
         pass
@@ -123,20 +158,17 @@ class GameState:
         Called when state ends and game should return to previous state
         :param args_dict: dictionary of callback arguments, which will be received by previous state in stack
         """
-        exit_event = pg.event.Event(EngineEvent, {'sub': GameEnum.StateExitEvent, 'state': '', 'args': args_dict})
-        pg.event.post(exit_event)
+        bus.post(EngineEvent, {'sub': GameEnum.StateExitEvent, 'state': '', 'args': args_dict})
 
     def call_state(self, state, args_dict=None):
         event_args = {'sub': GameEnum.StateCallEvent, 'state': state, 'args': args_dict}
-        call_event = pg.event.Event(EngineEvent, event_args)
-        pg.event.post(call_event)
+        bus.post(EngineEvent, event_args)
 
     def reset_states(self):
         """
         Called to clear all states from stack but first one
         """
-        event = pg.event.Event(EngineEvent, {'sub': GameEnum.StackResetEvent})
-        pg.event.post(event)
+        bus.post(EngineEvent, {'sub': GameEnum.StackResetEvent})
 
     def on_return(self, callback):
         """
@@ -156,12 +188,11 @@ class SplashState(GameState):
         self.splash_rect = self.splash.get_rect(center=self.screen_rect.center)
         self.bg = pg.Surface((self.screen_width, self.screen_height))
         self.bg.fill(pg.Color('black'))
+        self.dispatcher.register(pg.KEYDOWN, self.close_splash, key=pg.K_q)
 
-    def get_event(self, event):
-        super().get_event(event)
-        if event.type == pg.KEYDOWN and event.key == pg.K_q:
-            args_dict = {}
-            self.exit(args_dict)
+    def close_splash(self, event):
+        args_dict = {}
+        self.exit(args_dict)
 
     def call_state(self, state, args_dict=None):
         super(SplashState, self).call_state(state, args_dict)
@@ -181,6 +212,11 @@ class MenuState(GameState):
 
     def __init__(self):
         super().__init__()
+        for key in (pg.K_s, pg.K_DOWN):
+            self.dispatcher.register(pg.KEYDOWN, self.on_next_key, key=key)
+        for key in (pg.K_w, pg.K_UP):
+            self.dispatcher.register(pg.KEYDOWN, self.on_prev_key, key=key)
+        self.dispatcher.register(pg.KEYDOWN, self.on_choose_key, key=pg.K_RETURN)
 
     def load_items(self, res_name, y):
         helper = StringsHelper("en")
@@ -204,14 +240,14 @@ class MenuState(GameState):
         for i in self.menu_items:
             surface.blit(i.image, i.rect)
 
-    def get_event(self, event):
-        super().get_event(event)
-        if event.type == pg.KEYDOWN and (event.key == pg.K_s or event.key == pg.K_DOWN):
-            self.next_item()
-        elif event.type == pg.KEYDOWN and (event.key == pg.K_w or event.key == pg.K_UP):
-            self.prev_item()
-        elif event.type == pg.KEYDOWN and event.key == pg.K_RETURN:
-            self.choose_item()
+    def on_next_key(self, event):
+        self.next_item()
+
+    def on_prev_key(self, event):
+        self.prev_item()
+
+    def on_choose_key(self, event):
+        self.choose_item()
 
     def set_cursor(self):
         self.menu_items[self.cursor_pos].set_active()
@@ -239,8 +275,13 @@ class MainMenuState(MenuState):
 
     def choose_item(self):
         if self.cursor_pos == 0:
-            args_dict = {'player_party': None, 'pos_x': 0, 'pos_y': 0, 'map_file': 'resources/maps/world.tmx'}
-            self.call_state(WorldMapState, args_dict)
+            world = MapsHelper.get_world('world')
+            if world is not None:  # World is split to regions
+                args_dict = {'player_party': None, 'pos_x': 0, 'pos_y': 0, 'map_file': world}
+                self.call_state(OpenWorldMapState, args_dict)
+            else:
+                args_dict = {'player_party': None, 'pos_x': 0, 'pos_y': 0, 'map_file': 'resources/maps/world.tmx'}
+                self.call_state(WorldMapState, args_dict)
         elif self.cursor_pos == 1:
             self.call_state(LoadState, {})
         else:
@@ -256,15 +297,16 @@ class LoadState(MenuState):
         super().__init__()
         self.menu = None
         self.load_items("load_menu", 150)
+        self.dispatcher.register(pg.KEYDOWN, self.on_back_key, key=pg.K_BACKSPACE)
 
     def get_event(self, event):
         if self.menu is None:
             super().get_event(event)
-            if event.type == pg.KEYDOWN and event.key == pg.K_BACKSPACE:
-                self.exit(None)
-        else:
-            if event.type == pg.KEYDOWN and event.key == pg.K_q:
-                self.menu = None
+        elif event.type == pg.KEYDOWN and event.key == pg.K_q:  # Message window takes all input while shown
+            self.menu = None
+
+    def on_back_key(self, event):
+        self.exit(None)
 
     def draw(self, surface):
         super().draw(surface)
@@ -275,8 +317,7 @@ class LoadState(MenuState):
         path = 'saves/save_{}.sf'.format(self.cursor_pos)
         if os.path.isfile(path):
             args_dict = {'sub': GameEnum.GameLoadEvent, 'path': path}
-            event = pg.event.Event(EngineEvent, args_dict)
-            pg.event.post(event)
+            bus.post(EngineEvent, args_dict)
         else:
             self.menu = UI.MessageWindow(self.screen_width / 2 - 100, self.screen_height / 2 - 75, 200, 150, "No data in this slot")
             print("h {} w {}".format(self.screen_height, self.screen_width))
@@ -285,83 +326,167 @@ class LoadState(MenuState):
 class MapState(GameState):
     def __init__(self, persistent):
         super().__init__(persistent)
-        self.tiled_map = load_pygame(self.persist['map_file'])
         if self.persist['player_party'] is not None:
             self.player_party = self.persist['player_party']
         else:
-            self.player_party = PlayerParty(450, 450)
-        if 'npc_reg' in self.persist.keys():
-            self.npc_registry = self.persist['npc_reg']
+            self.player_party = Player.PlayerParty(450, 450)
+        if 'world_flags' in self.persist.keys():
+            self.world_flags = self.persist['world_flags']
         else:
-            self.npc_registry = []
-        self.tile_size = self.tiled_map.tilewidth
+            self.world_flags = WorldFlags.WorldFlags()
         self.scale_factor = 2  # Tiles are 16x16,so we must draw them 2 times larger
+        self.load_map(self.persist['map_file'])
+        self.pause_menu = None
+        self.menu = None
+        self.move_path = None  # Path of click-to-move
+        self.path_step = None  # Tile party currently walks to
+        self.npc_ai = MapAI.Scheduler()
+        self.register_events()
+
+    def load_map(self, map_file):
+        """
+        Load tiled map and create colliders, teleports and NPCs of it
+        :param map_file: string - map file path
+        """
+        self.map_file = map_file
+        self.tiled_map = load_tiled_map(map_file)
+        self.tile_size = self.tiled_map.tilewidth
         self.scaled_size = self.tile_size * self.scale_factor
         w = self.tiled_map.width * self.scaled_size
         h = self.tiled_map.height * self.scaled_size
-        self.camera = Camera(w, h)
+        self.camera = Player.Camera(w, h)
+        self.nav_grid = self.create_nav_grid()
         self.colliders = self.create_colliders()
         self.teleports = self.create_teleports()
         self.npcs = self.create_npcs()
-        self.pause_menu = None
-        self.menu = None
+
+    def create_dispatcher(self):
+        """
+        Create dispatcher with event handlers of state, it isn't pickled with state
+        """
+        self.dispatcher = EventDispatcher()
+        self.dispatcher.register(pg.QUIT, self.on_quit)
+        self.register_events()
+
+    def register_events(self):
+        self.dispatcher.register(pg.KEYDOWN, self.on_escape_key, key=pg.K_ESCAPE)
+        self.dispatcher.register(pg.KEYDOWN, self.on_menu_key, key=pg.K_p)
+        self.dispatcher.register(pg.KEYDOWN, self.on_menu_key, key=pg.K_i)
+        self.dispatcher.register(pg.KEYDOWN, self.on_load_save_key, key=pg.K_l)
+        self.dispatcher.register(EncounterEvent, self.on_encounter)
+        self.dispatcher.register(MenuQuitEvent, self.on_menu_quit)
+        self.dispatcher.register(pg.KEYDOWN, self.on_key)
+        self.dispatcher.register(pg.KEYUP, self.on_key)
+        self.dispatcher.register(pg.MOUSEBUTTONDOWN, self.on_click)
 
     def update(self, dt):
-        self.player_party.update(self.colliders, self.teleports, self.npcs)
+        self.follow_path()
+        with profiler.span('collision'):
+            self.player_party.update(self.colliders, self.teleports, self.npcs)
         self.camera.update(self.player_party)
+        with profiler.span('npc_ai'):
+            self.npc_ai.update(dt, self.npcs, self.nav_grid, self.player_party.rect, self.view_rect())
+
+    def view_rect(self):
+        """
+        Get visible area of map
+        :return: pygame rect object in map coordinates
+        """
+        return pg.Rect(-self.camera.state.x, -self.camera.state.y, self.screen_width, self.screen_height)
 
     def draw(self, surface):
         if self.bg:
             surface.blit(self.bg, (0, 0))
 
-    def get_event(self, event):
-        super().get_event(event)
-        if event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:  # Handle pause menu (de)activation
-            self.toggle_pause_menu()
-        elif self.pause_menu is None and event.type == pg.KEYDOWN and event.key == pg.K_p:
+    def on_escape_key(self, event):  # Handle pause menu (de)activation
+        self.toggle_pause_menu()
+
+    def on_menu_key(self, event):
+        if self.pause_menu is not None:
+            return False  # Let the pause menu handle input
+        if event.key == pg.K_p:
             self.toggle_menu(UI.PartyWindow)
-        elif self.pause_menu is None and event.type == pg.KEYDOWN and event.key == pg.K_i:
+        else:
             self.toggle_menu(UI.InventoryWindow)
-        elif self.pause_menu is None and event.type == EncounterEvent and isinstance(event.npc, MapTrader):
+
+    def on_load_save_key(self, event):  # Call game load\save menu
+        self.toggle_menu(UI.LoadSaveWindow)
+
+    def on_encounter(self, event):
+        if isinstance(event.npc, NPC.MapNPC):
+            self.enter_battle(event)
+        elif self.pause_menu is None and isinstance(event.npc, NPC.MapTrader):
             self.toggle_menu(UI.TraderWindow)
-        elif self.pause_menu is None and event.type == EncounterEvent and isinstance(event.npc, MapWizard):
+        elif self.pause_menu is None and isinstance(event.npc, NPC.MapWizard):
             self.toggle_menu(UI.WizardWindow)
-        elif event.type == EncounterEvent and isinstance(event.npc, MapNPC):
-            self.enter_battle(event)
-        elif event.type == MenuQuitEvent and event.window == UI.PauseWindow:
+
+    def on_menu_quit(self, event):
+        if event.window == UI.PauseWindow:
             self.toggle_pause_menu()
-        elif event.type == MenuQuitEvent and event.window is not UI.SelectCharacterWindow:
+        elif event.window is not UI.SelectCharacterWindow:
             self.toggle_menu(event.window)
-        elif event.type == pg.KEYDOWN and event.key == pg.K_l:  # Call game load\save menu
-            self.toggle_menu(UI.LoadSaveWindow)
-        elif self.pause_menu is None and self.menu is None:  # Handle player control only if menu is not active
+
+    def on_key(self, event):
+        if self.pause_menu is None and self.menu is None:  # Handle player control only if menu is not active
             self.player_control(event)
-        elif self.pause_menu is not None and event.type == pg.KEYDOWN:  # Let the pause menu handle input first
-            self.pause_menu.update(event.key)
-        elif self.menu is not None and event.type == pg.KEYDOWN:
-            self.menu.update(event.key)
+        elif event.type == pg.KEYDOWN:
+            if self.pause_menu is not None:  # Let the pause menu handle input first
+                self.pause_menu.update(event.key)
+            else:
+                self.menu.update(event.key)
 
     def player_control(self, event):
         """
         Handle key press events related to player control
         :param event: pygame KEYDOWN or KEYUP event
         """
-        if event.type == pg.KEYDOWN and event.key == pg.K_w:
-            self.player_party.up = True
-        elif event.type == pg.KEYUP and event.key == pg.K_w:
-                self.player_party.up = False
-        elif event.type == pg.KEYDOWN and event.key == pg.K_s:
-            self.player_party.down = True
-        elif event.type == pg.KEYUP and event.key == pg.K_s:
-            self.player_party.down = False
-        elif event.type == pg.KEYDOWN and event.key == pg.K_a:
-            self.player_party.left = True
-        elif event.type == pg.KEYUP and event.key == pg.K_a:
-            self.player_party.left = False
-        elif event.type == pg.KEYDOWN and event.key == pg.K_d:
-            self.player_party.right = True
-        elif event.type == pg.KEYUP and event.key == pg.K_d:
-            self.player_party.right = False
+        if event.key in RUN_KEYS:
+            self.player_party.running = event.type == pg.KEYDOWN
+        direction = CONTROL_KEYS.get(event.key)
+        if direction is not None:
+            if self.move_path is not None:
+                self.stop_path()
+            setattr(self.player_party, direction, event.type == pg.KEYDOWN)
+
+    def on_click(self, event):  # Click-to-move
+        if event.button != 1 or self.pause_menu is not None or self.menu is not None:
+            return
+        goal = self.nav_grid.tile_at(self.camera.to_map(event.pos))
+        if self.nav_grid.is_walkable(goal):
+            self.move_path = Pathfinding.Path(self.nav_grid, goal)
+            self.path_step = None
+
+    def stop_path(self):
+        self.move_path = None
+        self.path_step = None
+        party = self.player_party
+        party.left = party.right = party.up = party.down = False
+        party.max_step = None
+
+    def follow_path(self):
+        """
+        Steer player party along click-to-move path, tile center by tile center
+        """
+        if self.move_path is None:
+            return
+        if self.move_path.grid is not self.nav_grid:  # Map changed
+            self.stop_path()
+            return
+        party = self.player_party
+        if self.path_step is not None:
+            x, y = self.nav_grid.center_of(self.path_step)
+            dx = x - party.rect.centerx
+            dy = y - party.rect.centery
+            if abs(dx) > 1 or abs(dy) > 1:
+                party.left, party.right = dx < -1, dx > 1
+                party.up, party.down = dy < -1, dy > 1
+                party.max_step = (abs(dx), abs(dy))  # Fast party stops at tile center
+                return
+        self.path_step = self.move_path.next_tile(self.nav_grid.tile_at(party.rect.center))
+        if self.path_step is None:
+            self.stop_path()  # Goal reached or unreachable
+        else:
+            self.follow_path()
 
     def toggle_pause_menu(self):
         if self.pause_menu is None:
@@ -393,11 +518,30 @@ class MapState(GameState):
     def on_resume(self):
         self.player_party.resume()
 
-    def on_save(self):
+    def __getstate__(self):
+        # Surfaces, colliders, event handlers and open menus aren't pickled, on_load creates them again
+        state = self.__dict__.copy()
+        for name in ('tiled_map', 'bg', 'colliders', 'dispatcher', 'menu', 'pause_menu'):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        registry = state.pop('npc_registry', None)  # Saves made before world flags kept list of defeated NPCs
+        if registry is not None:
+            state['world_flags'] = WorldFlags.WorldFlags.from_registry(registry, LOAD_MEMO)
+        state.setdefault('map_file', state['persist']['map_file'])  # Saves made before state kept it's map file
+        self.__dict__.update(state)
         self.tiled_map = None
+        self.bg = None
+        self.menu = None
+        self.pause_menu = None
 
     def on_load(self):
-        self.tiled_map = load_pygame(self.persist['map_file'])  # reload tiled map
+        if self.tiled_map is not None:
+            return  # State was saved, not loaded, and keeps everything pickle left out
+        self.tiled_map = load_tiled_map(self.map_file)  # reload tiled map
+        self.colliders = self.create_colliders()
+        self.create_dispatcher()
         self.player_party.on_load()  # reload all sprites
         for i in self.npcs:
             i.on_load()
@@ -405,70 +549,123 @@ class MapState(GameState):
 
     def create_colliders(self):
         """
-        Create rectangles to be used as colliders for collision check
-        :return: list of pygame rect objects
+        Create rectangles to be used as colliders for collision check, adjacent blocked tiles are merged
+        :return: Colliders object
         """
         size = self.scaled_size
-        colliders = []
-        for i in range(0, len(self.tiled_map.layers) - 2):
-            for x, y, image in self.tiled_map.layers[i].tiles():
-                p = self.tiled_map.get_tile_properties(x, y, i)
-                if p['walkable'] == 'false':
-                    rect = pg.Rect(x * size, y * size, self.scaled_size, self.scaled_size)
-                    colliders.append(rect)
-        return colliders
-
-    def create_teleports(self):
+        return Spatial.Colliders(pg.Rect(x * size, y * size, w * size, h * size)
+                         for x, y, w, h in self.nav_grid.blocked_rects())
+
+    def create_nav_grid(self):
+        """
+        Create walkability grid used for path search and colliders
+        :return: NavGrid object
+        """
+        return Pathfinding.NavGrid.from_map(self.tiled_map, self.scaled_size)
+
+    def create_teleports(self, tiled_map=None, offset=(0, 0)):
+        """
+        Create teleports from map objects
+        :param tiled_map: compiled map, current map if None
+        :param offset: (x, y) position of map in world made of several maps, in pixels
+        :return: Triggers object
+        """
+        tiled_map = tiled_map or self.tiled_map
         teleports = []
         size = self.scale_factor
-        for obj in self.tiled_map.get_layer_by_name('teleports'):
-            rect = pg.Rect(int(obj.x) * size, int(obj.y) * size, obj.height, obj.height)  # collision occurs too early if size is not halfed
+        for obj in tiled_map.get_layer_by_name('teleports'):
+            rect = pg.Rect(int(obj.x) * size + offset[0], int(obj.y) * size + offset[1], obj.height, obj.height)  # collision occurs too early if size is not halfed
             p = obj.properties
             pos_x = int(p['pos_x'])
             pos_y = int(p['pos_y'])
             map_f = MapsHelper.get_map(p['map_f'])
             world = p['world']
-            tp = Teleport(rect, pos_x, pos_y, map_f, world)
+            tp = Player.Teleport(rect, pos_x, pos_y, map_f, world)
             teleports.append(tp)
 
-        return teleports
+        return Spatial.Triggers(teleports)
 
-    def create_npcs(self):
+    def create_npcs(self, tiled_map=None, offset=(0, 0)):
+        """
+        Create NPCs from map objects, skipping defeated ones
+        :param tiled_map: compiled map, current map if None
+        :param offset: (x, y) position of map in world made of several maps, in pixels
+        :return: Triggers object
+        """
+        tiled_map = tiled_map or self.tiled_map
         npcs = []
-        for obj in self.tiled_map.get_layer_by_name('npc'):
+        for obj in tiled_map.get_layer_by_name('npc'):
             p = obj.properties
             name = p['npc']  # Reserved - Trader, Wizard
-            x = int(obj.x) * self.scale_factor
-            y = int(obj.y) * self.scale_factor
+            x = int(obj.x) * self.scale_factor + offset[0]
+            y = int(obj.y) * self.scale_factor + offset[1]
             if name == 'trader':
-                npc = MapTrader(x, y)
+                npc = NPC.MapTrader(x, y)
             elif name == 'wizard':
-                npc = MapWizard(x, y)
+                npc = NPC.MapWizard(x, y)
             else:
                 party = p['party_members'].split(',') if 'party_members' in p.keys() else None
                 bg = p['bg'] if 'bg' in p.keys() else None
                 identifier = int(p['nid']) if 'nid' in p.keys() else None
-                if identifier is not None and self.npc_registry.count(identifier) == 0:
-                    npc = MapNPC(x, y, party, bg, identifier)
+                if identifier is not None and not self.world_flags.is_set(WorldFlags.DEFEATED, identifier):
+                    ai = MapAI.create_behaviour(p, self.nav_grid.tile_at((x, y)))
+                    speed = int(p['speed']) if 'speed' in p.keys() else MapAI.DEFAULT_SPEED
+                    npc = NPC.MapNPC(x, y, party, bg, identifier, ai, speed)
                 else:
                     continue
             npcs.append(npc)
 
-        return npcs
+        return Spatial.Triggers(npcs)
 
     def enter_battle(self, event):
         self.player_party.enter_battle()
         args_dict = {'player_party': self.player_party, 'party_members': event.npc.party, 'bg': event.npc.bg, 'id': event.npc.id}
         self.call_state(BattleState, args_dict)
 
+    def on_battle_return(self, callback):
+        """
+        Apply result of battle with map NPC
+        :param callback: dict - loot, gold, experience and NPC id of won battle or flee flag
+        """
+        self.player_party.exit_battle()
+        if 'flee' in callback.keys():  # Player escaped from battle
+            self.player_party.set_pos(*self.flee_pos())
+        else:
+            self.player_party.add_loot(callback['loot'])
+            self.player_party.add_exp(callback['exp'])
+            self.player_party.gold += callback['gold']
+            self.remove_npc(callback['id'])
+
+    def flee_pos(self):
+        """
+        Get position party is moved to after escaping from battle, away from NPC it met
+        :return: (x, y) tuple
+        """
+        return self.persist['pos_x'], self.persist['pos_y']
+
+    def remove_npc(self, identifier):
+        for i in self.npcs:
+            if hasattr(i, 'id') and i.id == identifier:
+                if i.id == 8:  # Killed world boss
+                    self.reset_states()
+                else:
+                    self.npcs.remove(i)
+                    self.world_flags.set(WorldFlags.DEFEATED, identifier)
+
 
 class WorldMapState(MapState):
     def __init__(self, persistent):
         super().__init__(persistent)
         self.bg = None
         self.draw_colliders = False
+        self.entry_pos = self.player_party.rect.topleft  # Where party came to world map, it flees there from battle
         self.set_bg()
 
+    def register_events(self):
+        super().register_events()
+        self.dispatcher.register(TeleportEvent, self.on_teleport)
+        self.dispatcher.register(pg.KEYDOWN, self.on_colliders_key, key=pg.K_c)
+
     def set_bg(self):
         settings = SettingsHelper()
         detailed_water = settings.get('world_water_tiled', False)
@@ -482,55 +679,243 @@ class WorldMapState(MapState):
     def draw(self, surface):
         super().draw(surface)
         size = self.scaled_size
-        for layer in self.tiled_map.visible_layers:
-            if layer.name == 'water' and self.bg is not None:
-                continue
-            for x, y, image in layer.tiles():
-                scaled_image = pg.transform.scale(image, (size, size))
-                surface.blit(scaled_image, self.camera.apply(pg.Rect(x * size, y * size, size, size)))
-            surface.blit(self.player_party.image, self.camera.apply(self.player_party.rect))
+        with profiler.span('tiles'):
+            for layer in self.tiled_map.visible_layers:
+                if layer.name == 'water' and self.bg is not None:
+                    continue
+                for x, y, image in layer.tiles():
+                    scaled_image = pg.transform.scale(image, (size, size))
+                    surface.blit(scaled_image, self.camera.apply(pg.Rect(x * size, y * size, size, size)))
+                surface.blit(self.player_party.image, self.camera.apply(self.player_party.rect))
+        self.draw_overlays(surface)
+
+    def draw_overlays(self, surface):
+        """
+        Draw everything above map tiles - roaming NPCs, debug colliders and menus
+        :param surface: pygame surface
+        """
+        with profiler.span('npcs'):
+            for i in self.npcs:
+                if getattr(i, 'ai', None) is not None:  # Standing NPCs of world map are hidden encounters
+                    surface.blit(i.image, self.camera.apply(i.rect))
 
         if self.draw_colliders:
-            col_fill = pg.Surface((self.tile_size * 2, self.tile_size * 2))
-            col_fill.fill(pg.Color('black'))
-            for rect in self.colliders:
-                surface.blit(col_fill, self.camera.apply(rect))
-        if self.menu is not None:
-            self.menu.draw(surface)
-        if self.pause_menu is not None:
-            self.pause_menu.draw(surface)
+            with profiler.span('colliders'):
+                color = pg.Color('black')
+                for rect in self.colliders.query(self.view_rect()):
+                    surface.fill(color, self.camera.apply(rect))
+        with profiler.span('ui'):
+            if self.menu is not None:
+                self.menu.draw(surface)
+            if self.pause_menu is not None:
+                self.pause_menu.draw(surface)
             
     def exit(self, args_dict=None):
         super(WorldMapState, self).exit(args_dict)
 
     def on_return(self, callback):
-        self.tiled_map = load_pygame(callback['map_f'])
-        self.colliders = self.create_colliders()
-        self.teleports = self.create_teleports()
-        self.npcs = self.create_npcs()
+        if 'map_f' not in callback.keys():  # Battle with roaming NPC
+            self.on_battle_return(callback)
+            return
+        self.load_map(callback['map_f'])
         self.player_party = callback['player_party']
         self.player_party.set_pos(callback['pos_x'], callback['pos_y'])
-        self.npc_registry = callback['npc_reg']
+        self.entry_pos = (callback['pos_x'], callback['pos_y'])
+        self.world_flags = callback['world_flags']
         self.player_party.reset_scale()  # Reset player party's rect scale after local map
 
-    def get_event(self, event):
-        super().get_event(event)
-        if event.type == TeleportEvent and event.teleport.world == 'localworld':
+    def flee_pos(self):
+        return self.entry_pos
+
+    def on_teleport(self, event):
+        if event.teleport.world == 'localworld':
             tp = event.teleport
-            args_dict = {'player_party': self.player_party, 'npc_reg': self.npc_registry, 'pos_x': tp.pos_x, 'pos_y': tp.pos_y, 'map_file': tp.map_f}
+            args_dict = {'player_party': self.player_party, 'world_flags': self.world_flags, 'pos_x': tp.pos_x, 'pos_y': tp.pos_y, 'map_file': tp.map_f}
             self.call_state(LocalMapState, args_dict)
-        if event.type == pg.KEYDOWN and event.key == pg.K_c:
-            self.draw_colliders = not self.draw_colliders
+
+    def on_colliders_key(self, event):
+        self.draw_colliders = not self.draw_colliders
+        return False  # Key is passed on to player control and menus as well
+
+
+class OpenWorldMapState(WorldMapState):
+    """
+    World map made of grid of region maps.Regions around player party are loaded in background and far ones
+    are unloaded, colliders, teleports and NPCs of loaded regions are joined into one map
+    """
+
+    def load_map(self, map_file):
+        """
+        Start streaming regions of world
+        :param map_file: string - path of world directory with region maps
+        """
+        self.tiled_map = None
+        self.layout = Regions.RegionLayout(map_file)
+        self.tile_size = self.layout.tile_size
+        self.scaled_size = self.tile_size * self.scale_factor
+        width = self.layout.columns * self.layout.width
+        height = self.layout.rows * self.layout.height
+        self.camera = Player.Camera(width * self.scaled_size, height * self.scaled_size)
+        self.nav_grid = Pathfinding.NavGrid(width, height, self.scaled_size)
+        self.nav_grid.set_area(0, 0, width, height)  # Not loaded parts of world are blocked
+        self.colliders = Spatial.Colliders()
+        self.teleports = Spatial.Triggers()
+        self.npcs = Spatial.Triggers()
+        self.region_objects = {}  # region - (colliders, teleports, NPCs)
+        self.scaled_tiles = {}  # region - dict of tile gid - scaled tile image
+        self.center = None  # Region player party is in
+        self.radius = SettingsHelper().get('region_radius', 1)
+        self.streamer = None
+        self.start_streaming()
+
+    def start_streaming(self):
+        self.streamer = Regions.RegionStreamer(self.layout, load_tiled_map, self.radius)
+        self.streamer.start()
+        self.stream_regions(wait=True)
+
+    def set_bg(self):
+        self.bg = pg.Surface((self.screen_width, self.screen_height))
+        self.bg.fill(pg.Color(self.layout.background_color))
+
+    def player_region(self):
+        return self.layout.region_of(self.nav_grid.tile_at(self.player_party.rect.center))
+
+    def update(self, dt):
+        super().update(dt)
+        with profiler.span('streaming'):
+            self.stream_regions()
+
+    def stream_regions(self, wait=False):
+        """
+        Add regions loaded by streamer and remove unloaded ones
+        :param wait: bool - load regions around player immediately
+        """
+        center = self.player_region()
+        loaded = self.streamer.load_now(center) if wait else []
+        new, unloaded = self.streamer.update(center)
+        for key in unloaded:
+            self.remove_region(key)
+        for key in loaded + new:
+            self.add_region(key)
+        if loaded or new or unloaded or center != self.center:
+            self.center = center
+            self.colliders = self.create_colliders()
+
+    def add_region(self, key):
+        tiled_map = self.streamer.regions[key]
+        width, height = self.layout.width, self.layout.height
+        x, y = self.layout.origin(key)
+        self.nav_grid.set_area(x, y, width, height, tiled_map.walkable)
+        size = self.scaled_size
+        colliders = [pg.Rect((x + tx) * size, (y + ty) * size, w * size, h * size)
+                     for tx, ty, w, h in self.nav_grid.blocked_rects(x, y, width, height)]
+        offset = (x * size, y * size)
+        teleports = list(self.create_teleports(tiled_map, offset))
+        npcs = list(self.create_npcs(tiled_map, offset))
+        for i in teleports:
+            self.teleports.append(i)
+        for i in npcs:
+            self.npcs.append(i)
+        self.region_objects[key] = (colliders, teleports, npcs)
+
+    def remove_region(self, key):
+        x, y = self.layout.origin(key)
+        self.nav_grid.set_area(x, y, self.layout.width, self.layout.height)
+        _, teleports, npcs = self.region_objects.pop(key)
+        for i in teleports:
+            self.teleports.remove(i)
+        for i in npcs:
+            if i in self.npcs.items:  # Defeated NPCs are already removed
+                self.npcs.remove(i)
+        self.scaled_tiles.pop(key, None)
+
+    def create_colliders(self):
+        """
+        Join colliders of loaded regions.Regions around player which aren't loaded yet are blocked as a whole
+        :return: Colliders object
+        """
+        colliders = []
+        for region_colliders, _, _ in self.region_objects.values():
+            colliders.extend(region_colliders)
+        width = self.layout.width * self.scaled_size
+        height = self.layout.height * self.scaled_size
+        column, row = self.player_region()
+        for c in range(column - self.radius, column + self.radius + 1):
+            for r in range(row - self.radius, row + self.radius + 1):
+                if (c, r) not in self.region_objects:
+                    colliders.append(pg.Rect(c * width, r * height, width, height))
+        return Spatial.Colliders(colliders)
+
+    def draw(self, surface):
+        if self.bg:
+            surface.blit(self.bg, (0, 0))
+        size = self.scaled_size
+        view = self.view_rect()
+        with profiler.span('tiles'):
+            for key, tiled_map in self.streamer.regions.items():
+                ox, oy = self.layout.origin(key)
+                x0 = max(view.left // size - ox, 0)
+                x1 = min((view.right - 1) // size - ox + 1, self.layout.width)
+                y0 = max(view.top // size - oy, 0)
+                y1 = min((view.bottom - 1) // size - oy + 1, self.layout.height)
+                if x0 >= x1 or y0 >= y1:
+                    continue
+                cache = self.scaled_tiles.setdefault(key, {})
+                for layer in tiled_map.visible_layers:
+                    if not hasattr(layer, 'data') or (layer.name == 'water' and self.bg is not None):
+                        continue
+                    for y in range(y0, y1):
+                        row = layer.data[y]
+                        for x in range(x0, x1):
+                            gid = row[x]
+                            if not gid:
+                                continue
+                            image = cache.get(gid)
+                            if image is None:
+                                image = pg.transform.scale(tiled_map.get_tile_image_by_gid(gid), (size, size))
+                                cache[gid] = image
+                            surface.blit(image, ((ox + x) * size - view.x, (oy + y) * size - view.y))
+            surface.blit(self.player_party.image, self.camera.apply(self.player_party.rect))
+        self.draw_overlays(surface)
+
+    def on_return(self, callback):
+        if 'map_f' not in callback.keys():  # Battle with roaming NPC
+            self.on_battle_return(callback)
+            return
+        self.player_party = callback['player_party']
+        self.player_party.set_pos(callback['pos_x'], callback['pos_y'])
+        self.world_flags = callback['world_flags']
+        self.player_party.reset_scale()  # Reset player party's rect scale after local map
+        self.entry_pos = (callback['pos_x'], callback['pos_y'])
+        self.stream_regions(wait=True)
+
+    def on_save(self):
+        self.streamer.stop()
+        for key in list(self.region_objects):
+            self.remove_region(key)
+        self.colliders = Spatial.Colliders()
+        self.streamer = None
+
+    def on_load(self):
+        self.create_dispatcher()
+        self.colliders = Spatial.Colliders()
+        self.player_party.on_load()
+        self.start_streaming()
+        self.set_bg()
 
 
 class LocalMapState(MapState):
     def __init__(self, persistent):
         super().__init__(persistent)
         self.player_party.set_pos(persistent['pos_x'], persistent['pos_y'])
-        self.npc_registry = persistent['npc_reg']
+        self.world_flags = persistent['world_flags']
         self.set_bg()
         self.player_party.scale_up()  # Player party's sprite is 2-x scaled on local map
 
+    def register_events(self):
+        super().register_events()
+        self.dispatcher.register(TeleportEvent, self.on_teleport)
+
     def set_bg(self):
         self.bg = pg.Surface((self.screen_width, self.screen_height))
         self.bg.fill(pg.Color(self.tiled_map.background_color))
@@ -538,54 +923,35 @@ class LocalMapState(MapState):
     def draw(self, surface):
         super().draw(surface)
         size = self.scaled_size
-        scaled_party = self.player_party.get_scaled()  # Sprite changes every frame,so it has to be scaled every time
-        for layer in self.tiled_map.visible_layers:
-            for x, y, image in layer.tiles():
-                scaled_image = pg.transform.scale(image, (size, size))
-                surface.blit(scaled_image, self.camera.apply(pg.Rect(x * size, y * size, size, size)))
-            surface.blit(scaled_party, self.camera.apply(self.player_party.rect))
+        with profiler.span('tiles'):
+            for layer in self.tiled_map.visible_layers:
+                for x, y, image in layer.tiles():
+                    scaled_image = pg.transform.scale(image, (size, size))
+                    surface.blit(scaled_image, self.camera.apply(pg.Rect(x * size, y * size, size, size)))
+                surface.blit(self.player_party.image, self.camera.apply(self.player_party.rect))
         # Draw NPCs
-        for i in self.npcs:
-            surface.blit(i.image, self.camera.apply(i.rect))
-
-        if self.menu is not None:
-            self.menu.draw(surface)
-        if self.pause_menu is not None:
-            self.pause_menu.draw(surface)
-
-    def get_event(self, event):
-        super().get_event(event)
-        if event.type == TeleportEvent and event.teleport.world == 'overworld':
+        with profiler.span('npcs'):
+            for i in self.npcs:
+                surface.blit(i.image, self.camera.apply(i.rect))
+
+        with profiler.span('ui'):
+            if self.menu is not None:
+                self.menu.draw(surface)
+            if self.pause_menu is not None:
+                self.pause_menu.draw(surface)
+
+    def on_teleport(self, event):
+        if event.teleport.world == 'overworld':
             tp = event.teleport
-            callback_args = {'player_party': self.player_party, 'npc_reg': self.npc_registry, 'pos_x': tp.pos_x, 'pos_y': tp.pos_y, 'map_f': tp.map_f}
+            callback_args = {'player_party': self.player_party, 'world_flags': self.world_flags, 'pos_x': tp.pos_x, 'pos_y': tp.pos_y, 'map_f': tp.map_f}
             self.exit(callback_args)
-        elif event.type == TeleportEvent and event.teleport.world == 'localworld':
+        elif event.teleport.world == 'localworld':
             tp = event.teleport
-            self.tiled_map = load_pygame(tp.map_f)
+            self.load_map(tp.map_f)
             self.player_party.set_pos(tp.pos_x, tp.pos_y)
-            self.colliders = self.create_colliders()
-            self.teleports = self.create_teleports()
-            self.npcs = self.create_npcs()
 
     def on_return(self, callback):
-        self.player_party.exit_battle()
-        if 'flee' in callback.keys():  # Player escaped from battle
-            self.player_party.set_pos(self.persist['pos_x'], self.persist['pos_y'])
-        else:
-            self.player_party.add_items(callback['loot'])
-            self.player_party.add_exp(callback['exp'])
-            self.player_party.gold += callback['gold']
-            self.remove_npc(callback['id'])
-
-
-    def remove_npc(self, identifier):
-        for i in self.npcs:
-            if hasattr(i, 'id') and i.id == identifier:
-                if i.id == 8:  # Killed world boss
-                    self.reset_states()
-                else:
-                    self.npcs.remove(i)
-                    self.npc_registry.append(identifier)
+        self.on_battle_return(callback)
 
 
 class BattleState(GameState):
@@ -606,10 +972,13 @@ class BattleState(GameState):
         self.current_character = None
         self.current_window = None
         self.spell_anim = None
-        self.loot = []
+        self.loot = {}  # Item - count
         self.gold = 0  # Total amount of gold party gets for battle
         self.experience = 0  # Total amount of experience every member get for battle
-        self.sprites = []
+        self.field = None  # BattleField with sprites of all characters
+        self.particles = Particles.ParticleSystem()
+        self.particles_rect = None  # Area particles were drawn on last frame
+        self.overlays = None  # Dialog and pause menu drawn over field on last frame
         self.windows = []
         self.dialog_width = self.screen_width * 0.3
         self.dialog_height = self.screen_height * 0.298
@@ -621,33 +990,42 @@ class BattleState(GameState):
         self.set_ui()
         self.choose_player_character()
         self.surface = None
+        self.register_events()
+
+    def register_events(self):
+        self.dispatcher.register(BattleEvent, self.on_action_selected, sub=Battle.ActionSelected)
+        self.dispatcher.register(BattleEvent, self.on_target_selected, sub=Battle.TargetSelected)
+        self.dispatcher.register(BattleEvent, self.on_character_ko, sub=Battle.CharacterKO)
+        self.dispatcher.register(BattleEvent, self.on_next_turn, sub=Battle.NextTurn)
+        self.dispatcher.register(BattleEvent, self.on_game_over, sub=Battle.GameOver)
+        self.dispatcher.register(BattleEvent, self.on_battle_won, sub=Battle.BattleWon)
+        self.dispatcher.register(BattleEvent, self.on_status_update, sub=Battle.StatusUpdate)
+        self.dispatcher.register(BattleEvent, self.on_ai_call, sub=Battle.AICall)
+        self.dispatcher.register(BattleEvent, self.on_spell_selected, sub=Battle.SpellSelected)
+        self.dispatcher.register(BattleEvent, self.on_item_selected, sub=Battle.ItemSelected)
+        self.dispatcher.register(BattleEvent, self.on_spell_cast, sub=Battle.SpellCast)
+        self.dispatcher.register(MenuQuitEvent, self.on_menu_quit)
+        self.dispatcher.register(pg.KEYDOWN, self.on_escape_key, key=pg.K_ESCAPE)
+        self.dispatcher.register(pg.KEYDOWN, self.on_cancel_key, key=pg.K_q)
+        self.dispatcher.register(pg.KEYDOWN, self.on_key)
 
     def update(self, dt):
         super().update(dt)
-        if self.spell_anim is not None:
-            self.update_anim()
+        self.update_effects(dt)
+        if self.spell_anim is not None and self.spell_anim.is_finished():
+            self.spell_anim = None
         if self.pause_menu is not None:
             if self.pause_menu.quit:
                 self.pause_menu = None
                 self.on_resume()
 
-    def update_anim(self):
+    def update_effects(self, dt):
         """
-        move animation projectile
+        Update battle sprites and spell particles
+        :param dt: time in millis since last frame
         """
-        xvel = 10
-        yvel = 1
-
-        if self.spell_anim['rect'].x < self.spell_anim['target_rect'].x:
-            self.spell_anim['rect'].x += xvel
-        elif self.spell_anim['rect'].x > self.spell_anim['target_rect'].x:
-            self.spell_anim['rect'].x -= xvel
-        if self.spell_anim['rect'].y < self.spell_anim['target_rect'].y:
-            self.spell_anim['rect'].y += yvel
-        elif self.spell_anim['rect'].y > self.spell_anim['target_rect'].y:
-            self.spell_anim['rect'].y -= yvel
-        if self.spell_anim['rect'].colliderect(self.spell_anim['target_rect']):
-            self.spell_anim = None
+        self.field.update(dt)
+        self.particles.update(dt)
 
     def load_npc(self):
         """
@@ -658,23 +1036,25 @@ class BattleState(GameState):
         members = self.persist['party_members']
 
         for i in members:
-            self.npc_party.append(eval(i)())
+            self.npc_party.append(NPC.enemies.create(i))
 
         self.npc_iter = iter(self.npc_party)
 
     def calculate_loot(self):
         """
-        Calculate loot and experince for npc's
+        Calculate loot and experince for npc's.Loot table of every kind of enemy is rolled for all of them at once
         """
-
+        rolls = {}  # LootTable - number of enemies
         for i in self.npc_party:
-            self.loot.extend(i.get_loot())
+            rolls[i.archetype.loot] = rolls.get(i.archetype.loot, 0) + 1
             self.gold += i.gold
             self.experience += i.EXP
+        for table, count in rolls.items():
+            table.sample_counts(count, self.loot)
 
     def load_sprites(self):
         """
-        Loads sprites of player and npc characters and places them on screen, appends to sprites list
+        Loads sprites of player and npc characters and places them on battle field
         """
         helper = SpritesHelper()
         image = pg.image.load(helper.get_bg(self.persist['bg']))
@@ -683,23 +1063,24 @@ class BattleState(GameState):
         rect.width = self.screen_width
         image = pg.transform.scale(image, (self.screen_width, self.screen_height))
         self.bg = (image, rect)
+        self.field = BattleSprites.BattleField(image)
 
         x = self.screen_width * 0.1
         y = self.screen_height * 0.3
 
         for i in self.npc_party:
-            i.rect.x = x
-            i.rect.y = y
-            self.sprites.append((i.image, i.rect))
-            y += i.rect.height + 10
+            i.view.rect.x = x
+            i.view.rect.y = y
+            self.field.add_character(i, i.view.image, i.view.rect, 1, remove_on_ko=True)
+            y += i.view.rect.height + 10
 
         y = self.screen_height * 0.3
         x = self.screen_width * 0.8
         for i in self.player_party:
-            i.battle_rect.x = x
-            i.battle_rect.y = y
-            self.sprites.append((i.battle_image, i.battle_rect))
-            y += i.battle_rect.height + 10
+            i.view.rect.x = x
+            i.view.rect.y = y
+            self.field.add_character(i, i.view.image, i.view.rect, -1)
+            y += i.view.rect.height + 10
 
     def set_ui(self):
         self.party_window = UI.PartyInfoWindow(self.screen_width * 0.498, self.screen_height * 0.698, self.screen_width * 0.5, self.screen_height * 0.3, self.player_party)
@@ -711,66 +1092,82 @@ class BattleState(GameState):
 
     def draw(self, surface):
         self.surface = surface
-        surface.blit(*self.bg)
-        for i in self.npc_party:
-            surface.blit(i.image, i.rect)
-        for i in self.player_party.get_battle_sprites():
-            surface.blit(*i)
-        if self.spell_anim is not None:
-            surface.blit(self.spell_anim['image'], self.spell_anim['rect'])
-        for i in self.windows:
-            i.draw(surface)
-        if self.dialog is not None:
-            self.dialog.draw(surface)
-        if self.pause_menu is not None:
-            self.pause_menu.draw(surface)
+        overlays = (self.dialog, self.pause_menu)
+        if overlays != self.overlays:  # Area under closed window has to be restored
+            self.field.repaint()
+            self.overlays = overlays
+        with profiler.span('sprites'):
+            if self.particles_rect is not None:  # Particles moved, area under them is restored from background
+                self.field.repaint_rect(self.particles_rect)
+            self.field.draw(surface)
+        with profiler.span('particles'):
+            self.particles_rect = self.particles.draw(surface)
+        with profiler.span('ui'):
+            for i in self.windows:
+                i.draw(surface)
+            if self.dialog is not None:
+                self.dialog.draw(surface)
+            if self.pause_menu is not None:
+                self.pause_menu.draw(surface)
+
+    def on_action_selected(self, event):
+        self.take_action(event.action)
+
+    def on_target_selected(self, event):
+        self.apply_action(event.npc)
+
+    def on_character_ko(self, event):
+        self.knock_out(event.pc)
+
+    def on_next_turn(self, event):
+        if hasattr(event, 'status'):
+            self.status_bar.set_status(event.status)
+        self.next_turn()
 
-    def get_event(self, event):
-        super().get_event(event)
-        if event.type is BattleEvent:
-            self.handle_battle_events(event)
-        if event.type is MenuQuitEvent:
-            self.pause_menu = None
-        if event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:  # Handle pause menu (de)activation
-            self.toggle_pause_menu()
-        if event.type == pg.KEYDOWN and event.key == pg.K_q:
-            self.cancel_action()
-        elif self.pause_menu is not None and event.type == pg.KEYDOWN:  # Let the pause menu handle input first
+    def on_game_over(self, event):
+        self.game_over()
+
+    def on_battle_won(self, event):
+        self.win_battle()
+
+    def on_status_update(self, event):
+        self.status_bar.set_status(event.status)
+
+    def on_ai_call(self, event):
+        self.call_ai()
+        self.wait(1000)
+
+    def on_spell_selected(self, event):
+        self.dialog = None
+        self.last_action_func = event.spell
+        self.functor_target()
+
+    def on_item_selected(self, event):
+        self.dialog = None
+        self.last_action_func = event.item
+        self.functor_target()
+
+    def on_spell_cast(self, event):
+        if Particles.has_effect(event.spell.name):
+            self.particles.emit(event.spell.name, self.field.center_of(event.caster), self.field.center_of(event.target))
+
+    def on_menu_quit(self, event):
+        self.pause_menu = None
+
+    def on_escape_key(self, event):  # Handle pause menu (de)activation
+        self.toggle_pause_menu()
+
+    def on_cancel_key(self, event):
+        self.cancel_action()
+
+    def on_key(self, event):
+        if self.pause_menu is not None:  # Let the pause menu handle input first
             self.pause_menu.update(event.key)
-        elif self.dialog is not None and event.type == pg.KEYDOWN:
+        elif self.dialog is not None:
             self.dialog.update(event.key)
-        elif self.current_window is not None and event.type == pg.KEYDOWN:
+        elif self.current_window is not None:
             self.current_window.update(event.key)
 
-    def handle_battle_events(self, event):
-        if event.sub == Battle.ActionSelected:
-            self.take_action(event.action)
-        if event.sub == Battle.TargetSelected:
-            self.apply_action(event.npc)
-        if event.sub == Battle.CharacterKO:
-            self.knock_out(event.pc)
-        if event.sub is Battle.NextTurn:
-            if hasattr(event, 'status'):
-                self.status_bar.set_status(event.status)
-            self.next_turn()
-        if event.sub is Battle.GameOver:
-            self.game_over()
-        if event.sub is Battle.BattleWon:
-            self.win_battle()
-        if event.sub is Battle.StatusUpdate:
-            self.status_bar.set_status(event.status)
-        if event.sub is Battle.AICall:
-            self.call_ai()
-            self.wait(1000)
-        if event.sub is Battle.SpellSelected:
-            self.dialog = None
-            self.last_action_func = event.spell
-            self.functor_target()
-        if event.sub is Battle.ItemSelected:
-            self.dialog = None
-            self.last_action_func = event.item
-            self.functor_target()
-
     def toggle_pause_menu(self):
         if self.pause_menu is None:
             self.on_pause()
@@ -858,6 +1255,7 @@ class BattleState(GameState):
         :param npc: target npc
         """
         if self.last_action == Actions.Attack:
+            self.field.play(self.current_character, BattleSprites.ATTACK)
             dmg = self.current_character.DMG
             npc.apply_damage(dmg)
             status = '{} dealt {} DMG to {}'.format(self.current_character.name, dmg, npc.name)
@@ -880,7 +1278,8 @@ class BattleState(GameState):
         if self.current_character.MP >= self.last_action_func.mp:
             if self.last_action_func.check_appliable(npc):
                 self.current_character.cast_spell(self.last_action_func, npc)
-                if isinstance(npc, BaseNPC):# Only on enemies
+                self.field.play(self.current_character, BattleSprites.ATTACK)
+                if isinstance(npc, NPC.BaseNPC) and not Particles.has_effect(self.last_action_func.name):  # Only on enemies
                     self.animate_spell(npc)  # Animation magic starts here
                     while self.spell_anim is not None: # TOTALLY FUCKED UP SHIT
                         self.update(50)
@@ -905,11 +1304,9 @@ class BattleState(GameState):
         helper = SpritesHelper()
         image = pg.image.load(helper.get_sprite(self.last_action_func.name, "projectile"))
         image.set_colorkey(pg.Color("#7bd5fe"))
-        rect = image.get_rect()
-        rect.x = self.current_character.battle_rect.x
-        rect.y = self.current_character.battle_rect.y
-        target_rect = target.rect
-        self.spell_anim = {'image': image,'rect': rect, 'target_rect': target_rect}
+        pos = self.current_character.view.rect.topleft
+        self.spell_anim = BattleSprites.Projectile(image, pos, target.view.rect)
+        self.field.add(self.spell_anim)
 
     def action_item(self, npc):
         if self.last_action_func.check_appliable(npc):
@@ -952,26 +1349,26 @@ class BattleState(GameState):
         """
         self.npc_window.disable()
         self.npc_window.set_current(self.current_character)
+        self.field.play(self.current_character, BattleSprites.ATTACK)
         self.current_character.decide(self.player_party, self.npc_party)
         for i in self.windows:
             if i is not self.status_bar:
                 i.update_items()
 
     def raise_event(self, subevent):
-        event = pg.event.Event(BattleEvent, {'sub': subevent})
-        pg.event.post(event)
+        bus.post(BattleEvent, {'sub': subevent})
 
     def knock_out(self, character):
         """
         Remove character from battle if it's NPC, block in UI and change sprite if player
         :param character: BaseNPC or BaseMember instance
         """
-        if isinstance(character, BaseNPC):
+        if isinstance(character, NPC.BaseNPC):
             self.npc_party.remove(character)
             self.npc_window.refresh_items()
             if len(self.npc_party) == 0:
                 self.raise_event(Battle.BattleWon)
-        elif isinstance(character, BaseMember):
+        elif isinstance(character, Player.BaseMember):
             if len(self.player_party.get_alive()) == 0:
                 self.raise_event(Battle.GameOver)
 
@@ -993,7 +1390,7 @@ class BattleState(GameState):
         """
         Called when player wants to escape battle.Possible only if all members are alive
         """
-        if len(self.player_party.get_alive()) == 4:
+        if len(self.player_party.get_alive()) == len(self.player_party):
             self.exit({'flee': True})
         else:
             self.status_bar.set_status("Cannot flee: you have KO'ed members")
@@ -1001,7 +1398,17 @@ class BattleState(GameState):
 
     def wait(self, time):
         """
-        waits specified amount of time (in millis).Blocks UI thread!!!
+        waits specified amount of time (in millis), battle sprites keep animating.Blocks UI thread!!!
         :param time: time (in milliseconds)
         """
+        step = 20
+        while time > 0:
+            self.sleep(min(step, time))
+            self.update_effects(min(step, time))
+            if self.surface is not None:
+                self.draw(self.surface)
+                pg.display.update()
+            time -= step
+
+    def sleep(self, time):
         pg.time.delay(time)
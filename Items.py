@@ -2,31 +2,49 @@
 
 # -*- coding: utf-8 -*-
 
+from Enums import SideEnum
+from ResourceHelpers import Catalogue
+
 
 class BaseItem:
     """
-    Represents basic inventory item class
+    Represents basic inventory item class.Items are definitions shared by all inventories,
+    so they can't be changed and are pickled as catalogue id
     """
 
-    def __init__(self, name, cost, info):
+    __slots__ = ('id', 'name', 'cost', 'info')
+
+    def __init__(self, id, name, cost, info):
+        self.id = id
         self.name = name
         self.cost = int(cost)
         self.info = info
 
+    def __setattr__(self, key, value):
+        if hasattr(self, key):
+            raise AttributeError('Item {} is immutable'.format(self.id))
+        super().__setattr__(key, value)
+
+    def __reduce__(self):
+        return get, (self.id,)
+
 
 class Weapon(BaseItem):
     """
     Represents weapon item class for inventory
     """
 
-    def __init__(self, name, dmg, cost, info):
+    __slots__ = ('dmg',)
+
+    def __init__(self, id, name, dmg, cost, info):
         """
 
+        :param id: string - catalogue id
         :param name: string - weapon name
         :param dmg: int - weapon damage (will be added to owner's physical damage)
         :param cost: int - weapon cost
         """
-        super().__init__(name, cost, info)
+        super().__init__(id, name, cost, info)
         self.dmg = dmg
 
     def __str__(self):
@@ -38,22 +56,45 @@ class Armor(BaseItem):
     Represents armor item class for inventory
     """
 
-    def __init__(self, name, defence, cost, info):
-        super().__init__(name, cost, info)
+    __slots__ = ('defence',)
+
+    def __init__(self, id, name, defence, cost, info):
+        super().__init__(id, name, cost, info)
         self.defence = defence
 
     def __str__(self):
         return '{} (+{})'.format(self.name, self.defence)
 
 
+# Effect name - (function applying effect with amount to target, function checking if effect is appliable)
+USABLE_EFFECTS = {
+    'heal': (lambda target, amount: target.heal(amount),
+             lambda target: target.KO is not True and target.HP < target.MAX_HP),
+    'restore_mana': (lambda target, amount: target.restore_mana(amount),
+                     lambda target: target.KO is not True and target.MP < target.MAX_MP),
+    'resurrect': (lambda target, amount: target.resurrect(),
+                  lambda target: target.KO is True),
+}
+
+
 class Usable(BaseItem):
     """
     Represents usable item like potion, which applies some effect to user
     """
 
-    def __init__(self, name, cost, info, side):
-        super().__init__(name, cost, info)
+    __slots__ = ('side', 'effect', 'amount')
+
+    def __init__(self, id, name, cost, info, side, effect, amount):
+        """
+
+        :param side: SideEnum - party item is used on
+        :param effect: string - key of USABLE_EFFECTS
+        :param amount: int - effect strength (HP, MP)
+        """
+        super().__init__(id, name, cost, info)
         self.side = side
+        self.effect = effect
+        self.amount = amount
 
     def __str__(self):
         return '{} ({} G)'.format(self.name, self.cost)
@@ -63,67 +104,112 @@ class Usable(BaseItem):
         apply item effect on it's target
         :param target: player or enemy party member
         """
-        pass
+        USABLE_EFFECTS[self.effect][0](target, self.amount)
 
     def check_appliable(self, target):
-        pass
+        return USABLE_EFFECTS[self.effect][1](target)
 
 
-class ManaPotion(Usable):
+def create_item(id, data):
+    """
+    Create item definition from data file entry
+    :param id: string - catalogue id
+    :param data: dict of item data
+    :return: BaseItem object
+    """
+    kind = data['type']
+    if kind == 'weapon':
+        return Weapon(id, data['name'], int(data['dmg']), data['cost'], data['info'])
+    if kind == 'armor':
+        return Armor(id, data['name'], int(data['defence']), data['cost'], data['info'])
+    if kind == 'usable':
+        if data['effect'] not in USABLE_EFFECTS:
+            raise ValueError('Item {}: unknown effect {}'.format(id, data['effect']))
+        return Usable(id, data['name'], data['cost'], data['info'], SideEnum[data['side']], data['effect'],
+                      int(data['amount']))
+    raise ValueError('Item {}: unknown type {}'.format(id, kind))
 
-    def __init__(self):
-        super().__init__('Mana potion', 50, 'Restores 20 MP', 1)
 
-    def apply_effect(self, target):
-        target.restore_mana(20)
+catalogue = Catalogue('items.json', create_item)
 
-    def check_appliable(self, target):
-        if target.KO is not True and target.MP < target.MAX_MP:
-            return True
-        else:
-            return False
 
+def get(id):
+    """
+    Get item definition
+    :param id: string - catalogue id
+    :return: BaseItem object
+    """
+    return catalogue.get(id)
 
-class HealthPotion(Usable):
 
-    def __init__(self):
-        super().__init__('Health potion', 50, 'Restores 20 HP', 1)
+class Inventory:
+    """
+    Items kept as stacks of [item id, count] in order they were first added, so thousands of
+    potions take one stack
+    """
 
-    def apply_effect(self, target):
-        target.heal(20)
+    def __init__(self, items=()):
+        """
 
-    def check_appliable(self, target):
-        if target.KO is not True and target.HP < target.MAX_HP:
-            return True
+        :param items: iterable of BaseItem objects
+        """
+        self.stacks = []
+        self.extend(items)
+
+    def find(self, item):
+        for i, stack in enumerate(self.stacks):
+            if stack[0] == item.id:
+                return i
+        return -1
+
+    def add(self, item, count=1):
+        i = self.find(item)
+        if i < 0:
+            self.stacks.append([item.id, count])
         else:
-            return False
-
-
-class PhoenixDown(Usable):
+            self.stacks[i][1] += count
 
-    def __init__(self):
-        super().__init__('Phoenix Down', 300, 'Resurrects party member', 1)
+    def extend(self, items):
+        for item in items:
+            self.add(item)
 
-    def apply_effect(self, target):
-        target.resurrect()
+    def remove(self, item, count=1):
+        """
+        Remove items from stack, stack is removed when it's empty
+        :param item: BaseItem object
+        :param count: int - number of items to remove
+        """
+        i = self.find(item)
+        if i < 0 or self.stacks[i][1] < count:
+            raise ValueError('Not enough {} in inventory'.format(item.id))
+        self.stacks[i][1] -= count
+        if self.stacks[i][1] == 0:
+            del self.stacks[i]
 
-    def check_appliable(self, target):
-        if target.KO is True:
-            return True
-        else:
-            return False
+    def count(self, item):
+        i = self.find(item)
+        return self.stacks[i][1] if i >= 0 else 0
 
+    def count_at(self, index):
+        return self.stacks[index][1]
 
-class FireBlade(Weapon):
-    """
-    Drops from fire elemental
-    """
+    def label(self, index):
+        """
+        Get text of stack for menus
+        :param index: int - stack index
+        :return: string
+        """
+        item, count = self[index], self.count_at(index)
+        return str(item) if count == 1 else '{} x{}'.format(item, count)
 
-    def __init__(self):
-        super().__init__('Fire blade', 10, 85, 'Blade made of elemental fire')
+    def __getitem__(self, index):
+        return get(self.stacks[index][0])
 
+    def __iter__(self):
+        return (get(stack[0]) for stack in self.stacks)
 
-class StoneArmor(Armor):
+    def __len__(self):
+        return len(self.stacks)
 
-    def __init__(self):
-        super().__init__('Stone armor', 25, 100, 'Perfect stone armor')
+    def __contains__(self, item):
+        return self.find(item) >= 0
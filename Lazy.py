@@ -0,0 +1,36 @@
+#!usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+import importlib
+import sys
+
+
+class LazyModule:
+    """
+    Module proxy which imports real module on first attribute access.Used to keep heavy subsystems
+    (maps, battle, NPCs) out of startup path until game actually needs them
+    """
+
+    def __init__(self, name):
+        """
+
+        :param name: string - module name
+        """
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, item):
+        return getattr(self._load(), item)
+
+    def is_loaded(self):
+        """
+        Check if module was imported (by this proxy or anyone else)
+        :return: bool
+        """
+        return self._name in sys.modules
@@ -0,0 +1,188 @@
+#!usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+import RNG
+
+BULK_MIN = 32  # Smaller number of rolls is sampled one by one
+
+
+class AliasTable:
+    """
+    Walker alias table built by Vose's method.Picks one of weighted outcomes with one random number in constant time
+    """
+
+    def __init__(self, weights):
+        """
+
+        :param weights: list of non-negative numbers, at least one positive
+        """
+        n = len(weights)
+        total = float(sum(weights))
+        scaled = [w * n / total for w in weights]
+        prob = [1.0] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] -= 1 - scaled[s]
+            if scaled[l] < 1:
+                small.append(l)
+            else:
+                large.append(l)
+        # Outcomes left are 1 up to rounding errors
+        self.prob = tuple(prob)
+        self.alias = tuple(alias)
+        self.prob_array = np.array(prob)
+        self.alias_array = np.array(alias, np.intp)
+
+    def pick(self, u):
+        """
+        Pick outcome
+        :param u: float - uniform random number in [0, 1)
+        :return: int - index of outcome
+        """
+        n = len(self.prob)
+        u *= n
+        i = min(int(u), n - 1)  # u close to 1 may round up to n
+        return i if u - i < self.prob[i] else self.alias[i]
+
+    def pick_many(self, count, rng):
+        """
+        Pick outcomes at once
+        :param count: int
+        :param rng: numpy Generator
+        :return: numpy array of outcome indexes
+        """
+        i = rng.integers(len(self.prob), size=count)
+        return np.where(rng.random(count) < self.prob_array[i], i, self.alias_array[i])
+
+
+class LootTable:
+    """
+    Compiled drop table of enemy.Guaranteed drops are always given, independent drops are rolled each with it's own
+    chance and one of exclusive outcomes is picked by alias table.Drop is item or nested LootTable, which is rolled
+    when it drops
+    """
+
+    def __init__(self, always=(), independent=(), exclusive=()):
+        """
+
+        :param always: list of drops
+        :param independent: list of (drop, chance) tuples
+        :param exclusive: list of (tuple of drops, weight) tuples, empty tuple of drops is outcome without loot
+        """
+        self.always = tuple(always)
+        self.independent = tuple(independent)
+        self.outcomes = tuple(drops for drops, weight in exclusive)
+        weights = [weight for drops, weight in exclusive]
+        self.alias = AliasTable(weights) if sum(weights) > 0 else None
+
+    def roll(self, loot, rng=None):
+        """
+        Roll table once and count drops
+        :param loot: dict of BaseItem - count, drops are added to it
+        :param rng: random.Random object, loot stream by default
+        """
+        if rng is None:
+            rng = RNG.get(RNG.LOOT)
+        for drop in self.always:
+            add_drop(loot, drop, 1, rng)
+        for drop, chance in self.independent:
+            if rng.random() < chance:
+                add_drop(loot, drop, 1, rng)
+        if self.alias is not None:
+            for drop in self.outcomes[self.alias.pick(rng.random())]:
+                add_drop(loot, drop, 1, rng)
+
+    def sample(self, rng=None):
+        """
+        Roll table once
+        :param rng: random.Random object, loot stream by default
+        :return: list of BaseItem objects
+        """
+        loot = {}
+        self.roll(loot, rng)
+        return [item for item, count in loot.items() for _ in range(count)]
+
+    def sample_counts(self, rolls, loot, rng=None, bulk_rng=None):
+        """
+        Roll table many times, e.g. for all enemies of the same kind.Large number of rolls is sampled at once
+        by numpy generator
+        :param rolls: int - number of rolls
+        :param loot: dict of BaseItem - count, drops are added to it
+        :param rng: random.Random object, loot stream by default
+        :param bulk_rng: numpy Generator, bulk loot stream by default
+        """
+        if rng is None:
+            rng = RNG.get(RNG.LOOT)
+        if rolls < BULK_MIN:
+            for _ in range(rolls):
+                self.roll(loot, rng)
+            return
+        if bulk_rng is None:
+            bulk_rng = RNG.get_bulk(RNG.LOOT)
+        for drop in self.always:
+            add_drop(loot, drop, rolls, rng, bulk_rng)
+        for drop, chance in self.independent:
+            add_drop(loot, drop, int(bulk_rng.binomial(rolls, chance)), rng, bulk_rng)
+        if self.alias is not None:
+            counts = np.bincount(self.alias.pick_many(rolls, bulk_rng), minlength=len(self.outcomes))
+            for drops, count in zip(self.outcomes, counts.tolist()):
+                for drop in drops:
+                    add_drop(loot, drop, count, rng, bulk_rng)
+
+
+def add_drop(loot, drop, count, rng, bulk_rng=None):
+    if count == 0:
+        return
+    if isinstance(drop, LootTable):
+        drop.sample_counts(count, loot, rng, bulk_rng)
+    else:
+        loot[drop] = loot.get(drop, 0) + count
+
+
+def compile_table(data, resolve):
+    """
+    Compile loot table from enemy data.List of {item, rate} entries is loot table of old data files - one number
+    is rolled for enemy and every entry with rate not above it drops, so it's compiled into exclusive outcomes.
+    Dict may have 'always' list of entries, 'independent' list of entries with 'chance' and 'exclusive' list of
+    entries with 'weight', entry without item or table drops nothing
+    :param data: list or dict
+    :param resolve: function returning item for item id
+    :return: LootTable object
+    """
+    if isinstance(data, list):
+        entries = sorted(((min(max(float(i['rate']), 0.0), 1.0), resolve(i['item'])) for i in data),
+                         key=lambda entry: entry[0])
+        exclusive = []
+        previous = 0.0
+        for n, (rate, item) in enumerate(entries):
+            exclusive.append((tuple(entry[1] for entry in entries[:n]), rate - previous))
+            previous = rate
+        exclusive.append((tuple(entry[1] for entry in entries), 1.0 - previous))
+        return LootTable(exclusive=exclusive)
+
+    def entry_drops(entry):
+        if 'item' in entry:
+            return resolve(entry['item']),
+        if 'table' in entry:
+            return compile_table(entry['table'], resolve),
+        return ()
+
+    always = [drop for entry in data.get('always', []) for drop in entry_drops(entry)]
+    independent = [(drop, float(entry['chance'])) for entry in data.get('independent', [])
+                   for drop in entry_drops(entry)]
+    exclusive = [(entry_drops(entry), float(entry['weight'])) for entry in data.get('exclusive', [])]
+    for drop, chance in independent:
+        if not 0.0 <= chance <= 1.0:
+            raise ValueError('Loot chance {} of {} is not in [0, 1]'.format(chance, drop))
+    if any(weight < 0 for drops, weight in exclusive):
+        raise ValueError('Negative loot weight')
+    return LootTable(always, independent, exclusive)
@@ -0,0 +1,170 @@
+#!usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+import time
+
+import RNG
+from Pathfinding import Path
+
+TIME_BUDGET_MS = 2.0  # Time per frame for NPC decisions, None to limit only by MAX_THINKS
+MAX_THINKS = 32  # Max number of NPC decisions per frame
+THINK_INTERVALS = (150, 500, 2000)  # Millis between decisions of NPC on screen, near screen and far from it
+NEAR_MARGIN = 320  # Distance in pixels from screen edge within which NPC is considered near
+DEFAULT_SPEED = 60  # Movement speed in pixels per second
+
+
+def distance(a, b):
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+def create_behaviour(properties, home):
+    """
+    Create NPC behaviour from TMX object properties:
+    'ai' - wander, patrol or chase; 'radius' - wander radius in tiles; 'sight' - chase distance in tiles;
+    'route' - patrol tiles as 'x,y;x,y;...'
+    :param properties: dict of TMX object properties
+    :param home: (x, y) tile where NPC is placed
+    :return: Behaviour object or None for standing NPC
+    """
+    ai = properties.get('ai')
+    radius = int(properties.get('radius', 4))
+    if ai == 'wander':
+        return Wander(home, radius)
+    if ai == 'patrol':
+        route = [tuple(int(c) for c in point.split(',')) for point in properties['route'].split(';')]
+        return Patrol(route)
+    if ai == 'chase':
+        return Chase(home, radius, int(properties.get('sight', 5)))
+    return None
+
+
+class Behaviour:
+    """
+    Base class of roaming NPC decisions.Decision gives NPC new path, NPC walks it by itself between decisions
+    """
+
+    def think(self, npc, grid, player_tile):
+        """
+        Make decision
+        :param npc: MapNPC object
+        :param grid: NavGrid object of current map
+        :param player_tile: (x, y) tile player party stands on
+        """
+        pass
+
+
+class Wander(Behaviour):
+    """
+    Walk to random places around home tile
+    """
+
+    def __init__(self, home, radius):
+        self.home = home
+        self.radius = radius
+
+    def think(self, npc, grid, player_tile):
+        if npc.path is not None and not npc.path.is_finished():
+            return
+        x, y = self.home
+        rng = RNG.get(RNG.MAP)
+        for _ in range(4):  # Few tries to find walkable tile
+            goal = (x + rng.randint(-self.radius, self.radius), y + rng.randint(-self.radius, self.radius))
+            if grid.is_walkable(goal):
+                npc.set_path(Path(grid, goal))
+                return
+
+
+class Patrol(Behaviour):
+    """
+    Walk route of tiles in a loop
+    """
+
+    def __init__(self, route):
+        self.route = route
+        self.index = 0
+
+    def think(self, npc, grid, player_tile):
+        if npc.path is None or npc.path.is_finished():
+            if npc.path is not None:
+                self.index = (self.index + 1) % len(self.route)
+            npc.set_path(Path(grid, self.route[self.index]))
+
+
+class Chase(Wander):
+    """
+    Wander until player party comes in sight, then follow it while it's not too far from home
+    """
+
+    def __init__(self, home, radius, sight):
+        super().__init__(home, radius)
+        self.sight = sight
+        self.chasing = False
+
+    def think(self, npc, grid, player_tile):
+        tile = grid.tile_at(npc.rect.center)
+        in_sight = distance(tile, player_tile) <= self.sight and distance(self.home, player_tile) <= self.radius + self.sight
+        if in_sight:
+            if self.chasing and npc.path is not None:
+                npc.path.set_goal(player_tile)  # Usually player moved by a tile or two, path is just extended
+            else:
+                npc.set_path(Path(grid, player_tile))
+            self.chasing = True
+        else:
+            if self.chasing:
+                npc.set_path(None)
+            self.chasing = False
+            super().think(npc, grid, player_tile)
+
+
+class Scheduler:
+    """
+    Runs roaming NPCs of map.Decisions are spread across frames in round robin order under time budget,
+    NPCs far from screen decide less often.Movement along chosen paths is updated every frame
+    """
+
+    def __init__(self):
+        self.time = 0  # Game time in millis
+        self.cursor = 0  # Index of NPC which decides first on next frame
+
+    def update(self, dt, npcs, grid, player_rect, view):
+        """
+        Update roaming NPCs
+        :param dt: time in millis since last frame
+        :param npcs: Triggers object of map NPCs, NPCs without behaviour are skipped
+        :param grid: NavGrid object of map
+        :param player_rect: pygame rect of player party
+        :param view: pygame rect of visible map area
+        """
+        self.time += dt
+        agents = [n for n in npcs if getattr(n, 'ai', None) is not None]
+        if not agents:
+            return
+        self.think(agents, grid, grid.tile_at(player_rect.center), view)
+        for npc in agents:
+            if npc.move(dt, grid):
+                npcs.move(npc)
+
+    def think(self, agents, grid, player_tile, view):
+        start = time.perf_counter()
+        count = len(agents)
+        thinks = 0
+        for i in range(count):
+            npc = agents[(self.cursor + i) % count]
+            if npc.next_think > self.time:
+                continue
+            npc.ai.think(npc, grid, player_tile)
+            npc.next_think = self.time + self.think_interval(npc.rect, view)
+            thinks += 1
+            if thinks >= MAX_THINKS or \
+                    (TIME_BUDGET_MS is not None and (time.perf_counter() - start) * 1000 > TIME_BUDGET_MS):
+                self.cursor = (self.cursor + i + 1) % count  # Continue from next NPC on next frame
+                return
+
+    @staticmethod
+    def think_interval(rect, view):
+        if view.colliderect(rect):
+            return THINK_INTERVALS[0]
+        if view.inflate(NEAR_MARGIN * 2, NEAR_MARGIN * 2).colliderect(rect):
+            return THINK_INTERVALS[1]
+        return THINK_INTERVALS[2]
@@ -0,0 +1,541 @@
+#!usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+"""
+Compiled TMX maps.
+
+Each map is compiled once into sidecar file next to it (<map>.tmxc) with tile GID arrays of layers,
+walkability grid, object tables and tileset references.Sidecar is memory-mapped when map is loaded, so layers
+and walkability are read from it without parsing XML.Sidecar is compiled again when TMX file or one of it's
+external tilesets changes.
+
+Compile all maps ahead:  python MapCache.py [resources/maps]
+"""
+
+import base64
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+from bisect import bisect_right
+import xml.etree.ElementTree as ElementTree
+
+import pygame as pg
+
+SIDECAR_SUFFIX = 'c'  # world.tmx - world.tmxc
+MAGIC = b'TMXC'
+VERSION = 1
+HEADER = struct.Struct('<4sHxxI')  # magic, version, metadata length
+GID_MASK = 0x0FFFFFFF  # Upper bits of GID are flip flags
+FLIP_X = 0x80000000
+FLIP_Y = 0x40000000
+FLIP_DIAGONAL = 0x20000000
+PROPERTY_TYPES = {'int': int, 'float': float, 'bool': lambda value: value == 'true'}
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return [path, stat.st_mtime_ns, stat.st_size]
+
+
+def parse_properties(node):
+    """
+    Read custom properties of TMX element, typed properties are converted
+    :param node: ElementTree element
+    :return: dict of property name - value
+    """
+    properties = {}
+    for p in node.iterfind('properties/property'):
+        value = p.get('value')
+        if value is None:
+            value = p.text or ''  # Multiline strings are stored as text
+        convert = PROPERTY_TYPES.get(p.get('type'))
+        properties[p.get('name')] = convert(value) if convert else value
+    return properties
+
+
+def read_gids(node, width, height):
+    """
+    Decode tile layer data
+    :param node: ElementTree element of layer
+    :param width: int - layer width in tiles
+    :param height: int - layer height in tiles
+    :return: array of width * height GIDs row by row
+    """
+    data = node.find('data')
+    encoding = data.get('encoding')
+    if data.find('chunk') is not None:
+        raise ValueError('Infinite maps are not supported')
+    if encoding == 'csv':
+        gids = array('I', (int(v) for v in data.text.split(',')))
+    elif encoding == 'base64':
+        raw = base64.b64decode(data.text.strip())
+        compression = data.get('compression')
+        if compression in ('zlib', 'gzip'):
+            raw = zlib.decompress(raw, 47)  # Detects zlib or gzip header
+        elif compression:
+            raise ValueError('Unsupported layer compression {}'.format(compression))
+        gids = array('I')
+        gids.frombytes(raw)
+        if sys.byteorder == 'big':
+            gids.byteswap()  # TMX stores little-endian GIDs
+    else:
+        gids = array('I', (int(t.get('gid', 0)) for t in data.iterfind('tile')))
+    if len(gids) != width * height:
+        raise ValueError('Layer {} has {} tiles instead of {}'.format(node.get('name'), len(gids), width * height))
+    return gids
+
+
+def read_tileset(node, map_dir, sources, tile_properties):
+    """
+    Read tileset reference, external tileset files are added to sources
+    :param node: ElementTree element of tileset
+    :param map_dir: string - directory of map file
+    :param sources: list of file stamps compiled map depends on
+    :param tile_properties: dict of GID - properties to add tileset's tile properties to
+    :return: dict of tileset metadata
+    """
+    firstgid = int(node.get('firstgid'))
+    directory = map_dir
+    if node.get('source') is not None:
+        path = os.path.join(map_dir, node.get('source'))
+        sources.append(file_stamp(path))
+        node = ElementTree.parse(path).getroot()
+        directory = os.path.dirname(path)
+    image = node.find('image')
+    if image is None:
+        raise ValueError('Tileset {} has no image, image collections are not supported'.format(node.get('name')))
+    tilewidth = int(node.get('tilewidth'))
+    tileheight = int(node.get('tileheight'))
+    margin = int(node.get('margin', 0))
+    spacing = int(node.get('spacing', 0))
+    columns = node.get('columns')
+    if columns is None:  # Old Tiled versions don't write columns
+        columns = (int(image.get('width')) - 2 * margin + spacing) // (tilewidth + spacing)
+    for tile in node.iterfind('tile'):
+        properties = parse_properties(tile)
+        if properties:
+            tile_properties[firstgid + int(tile.get('id'))] = properties
+    return {'firstgid': firstgid, 'name': node.get('name'),
+            'image': os.path.relpath(os.path.join(directory, image.get('source')), map_dir),
+            'trans': image.get('trans'), 'tilewidth': tilewidth, 'tileheight': tileheight,
+            'margin': margin, 'spacing': spacing, 'columns': int(columns)}
+
+
+def read_objects(node):
+    objects = []
+    for obj in node.iterfind('object'):
+        objects.append({'id': int(obj.get('id', 0)), 'name': obj.get('name'),
+                        'type': obj.get('type', obj.get('class')), 'gid': int(obj.get('gid', 0)),
+                        'x': float(obj.get('x', 0)), 'y': float(obj.get('y', 0)),
+                        'width': float(obj.get('width', 0)), 'height': float(obj.get('height', 0)),
+                        'properties': parse_properties(obj)})
+    return objects
+
+
+def is_blocking(properties):
+    return properties is not None and properties.get('walkable') in ('false', False)
+
+
+def compile_map(path):
+    """
+    Compile TMX map into sidecar contents.Tile with 'walkable' property set to false in any tile layer
+    blocks it's place
+    :param path: string - TMX file path
+    :return: bytes
+    """
+    sources = [file_stamp(path)]
+    root = ElementTree.parse(path).getroot()
+    if root.get('infinite') == '1':
+        raise ValueError('Infinite maps are not supported')
+    width = int(root.get('width'))
+    height = int(root.get('height'))
+    map_dir = os.path.dirname(path) or os.curdir
+    tile_properties = {}
+    tilesets = [read_tileset(node, map_dir, sources, tile_properties) for node in root.iterfind('tileset')]
+    blocking = {gid for gid, properties in tile_properties.items() if is_blocking(properties)}
+
+    layers = []
+    arrays = []
+    walkable = bytearray([1]) * (width * height)
+    for node in root:
+        visible = node.get('visible', '1') != '0'
+        if node.tag == 'layer':
+            gids = read_gids(node, width, height)
+            if blocking:
+                for i, gid in enumerate(gids):
+                    if gid & GID_MASK in blocking:
+                        walkable[i] = 0
+            layers.append({'kind': 'tiles', 'name': node.get('name'), 'visible': visible,
+                           'properties': parse_properties(node)})
+            arrays.append(gids)
+        elif node.tag == 'objectgroup':
+            layers.append({'kind': 'objects', 'name': node.get('name'), 'visible': visible,
+                           'properties': parse_properties(node), 'objects': read_objects(node)})
+
+    meta = {'sources': [[os.path.relpath(p, map_dir), mtime, size] for p, mtime, size in sources],
+            'byteorder': sys.byteorder, 'width': width, 'height': height,
+            'tilewidth': int(root.get('tilewidth')), 'tileheight': int(root.get('tileheight')),
+            'background_color': root.get('backgroundcolor'), 'properties': parse_properties(root),
+            'tilesets': tilesets, 'layers': layers,
+            'tile_properties': {str(gid): properties for gid, properties in tile_properties.items()}}
+    data = json.dumps(meta).encode('utf-8')
+    data += b' ' * (-(HEADER.size + len(data)) % 4)  # GID arrays are aligned, so they can be cast in place
+    parts = [HEADER.pack(MAGIC, VERSION, len(data)), data]
+    parts.extend(gids.tobytes() for gids in arrays)
+    parts.append(bytes(walkable))
+    return b''.join(parts)
+
+
+def read_meta(buffer):
+    """
+    Read metadata of compiled map
+    :param buffer: sidecar contents
+    :return: dict, None if buffer isn't compiled map of current version
+    """
+    if len(buffer) < HEADER.size:
+        return None
+    magic, version, length = HEADER.unpack_from(buffer)
+    if magic != MAGIC or version != VERSION:
+        return None
+    return json.loads(bytes(buffer[HEADER.size:HEADER.size + length]).decode('utf-8'))
+
+
+def is_fresh(meta, path):
+    """
+    Check if compiled map matches TMX file and tilesets it was compiled from
+    :param meta: dict of compiled map metadata
+    :param path: string - TMX file path
+    :return: bool
+    """
+    if meta is None or meta['byteorder'] != sys.byteorder:
+        return False
+    map_dir = os.path.dirname(path)
+    for source, mtime, size in meta['sources']:
+        try:
+            stamp = file_stamp(os.path.join(map_dir, source))
+        except OSError:
+            return False
+        if stamp[1:] != [mtime, size]:
+            return False
+    return True
+
+
+def open_sidecar(path):
+    """
+    Memory-map sidecar file
+    :param path: string - sidecar file path
+    :return: mmap object, None if there's no sidecar
+    """
+    try:
+        with open(path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):  # Missing or empty file
+        return None
+
+
+def write_sidecar(path, data):
+    """
+    Write sidecar atomically, so map loaded at the same time in other thread or process never reads part of it
+    :param path: string - sidecar file path
+    :param data: bytes
+    :return: bool - False if sidecar couldn't be written (read-only game directory)
+    """
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmxc_', dir=os.path.dirname(path) or '.')
+    except OSError:
+        return False
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return True
+    except OSError:
+        return False
+    finally:
+        if os.path.exists(tmp_path):  # Write or replace failed
+            os.remove(tmp_path)
+
+
+def load_map(path):
+    """
+    Load map from it's sidecar, compiling TMX file first if sidecar is missing or outdated.If sidecar can't be
+    written, compiled map is kept in memory only
+    :param path: string - TMX file path
+    :return: CompiledMap object
+    """
+    sidecar = path + SIDECAR_SUFFIX
+    buffer = open_sidecar(sidecar)
+    meta = None
+    if buffer is not None:
+        try:
+            meta = read_meta(buffer)
+        except ValueError:  # Broken metadata
+            meta = None
+    if not is_fresh(meta, path):
+        if buffer is not None:
+            buffer.close()
+        buffer = compile_map(path)
+        if write_sidecar(sidecar, buffer):
+            buffer = open_sidecar(sidecar) or buffer
+        meta = read_meta(buffer)
+    return CompiledMap(path, buffer, meta)
+
+
+class TileAtlas:
+    """
+    Tileset image cut into tiles on demand.Atlases are shared by all maps using the same tileset,
+    so regions of open world don't load tiles again
+    """
+
+    def __init__(self, path, tileset):
+        """
+
+        :param path: string - tileset image path
+        :param tileset: dict of tileset metadata
+        """
+        self.path = path
+        self.tilewidth = tileset['tilewidth']
+        self.tileheight = tileset['tileheight']
+        self.margin = tileset['margin']
+        self.spacing = tileset['spacing']
+        self.columns = tileset['columns']
+        self.trans = tileset['trans']
+        self.sheet = None
+        self.tiles = {}  # tile id - surface
+
+    def load(self):
+        sheet = pg.image.load(self.path)
+        if pg.display.get_surface() is not None:  # Converted tiles blit faster, conversion needs display
+            if self.trans:
+                sheet = sheet.convert()
+            elif sheet.get_flags() & pg.SRCALPHA:
+                sheet = sheet.convert_alpha()
+            else:
+                sheet = sheet.convert()
+        if self.trans:
+            sheet.set_colorkey(pg.Color('#' + self.trans.lstrip('#')))
+        self.sheet = sheet
+
+    def get_tile(self, tile_id):
+        tile = self.tiles.get(tile_id)
+        if tile is None:
+            if self.sheet is None:
+                self.load()
+            column, row = tile_id % self.columns, tile_id // self.columns
+            rect = pg.Rect(self.margin + column * (self.tilewidth + self.spacing),
+                           self.margin + row * (self.tileheight + self.spacing), self.tilewidth, self.tileheight)
+            tile = self.sheet.subsurface(rect)
+            self.tiles[tile_id] = tile
+        return tile
+
+
+atlases = {}  # (image path, tile size, margin, spacing, trans) - TileAtlas
+
+
+def get_atlas(path, tileset):
+    key = (os.path.normpath(os.path.abspath(path)), tileset['tilewidth'], tileset['tileheight'], tileset['margin'],
+           tileset['spacing'], tileset['trans'])
+    atlas = atlases.get(key)
+    if atlas is None:
+        atlas = TileAtlas(path, tileset)
+        atlases[key] = atlas
+    return atlas
+
+
+class LayerRows:
+    """
+    Rows of tile layer GIDs, indexed as data[y][x]
+    """
+
+    def __init__(self, gids, width):
+        self.gids = gids
+        self.width = width
+
+    def __getitem__(self, y):
+        if not 0 <= y < len(self):
+            raise IndexError('Row {} is out of layer'.format(y))
+        return self.gids[y * self.width:(y + 1) * self.width]
+
+    def __len__(self):
+        return len(self.gids) // self.width
+
+
+class TileLayer:
+    def __init__(self, parent, name, visible, properties, gids):
+        """
+
+        :param parent: CompiledMap object
+        :param name: string - layer name
+        :param visible: bool
+        :param properties: dict of layer properties
+        :param gids: memoryview of width * height GIDs row by row
+        """
+        self.parent = parent
+        self.name = name
+        self.visible = visible
+        self.properties = properties
+        self.gids = gids
+        self.data = LayerRows(gids, parent.width)
+
+    def tiles(self):
+        """
+        Get images of non-empty tiles
+        :return: generator of (x, y, image) tuples
+        """
+        images = self.parent.images
+        get_image = self.parent.get_tile_image_by_gid
+        width = self.parent.width
+        for i, gid in enumerate(self.gids):
+            if gid:
+                image = images.get(gid)
+                if image is None:
+                    image = get_image(gid)
+                yield i % width, i // width, image
+
+
+class MapObject:
+    def __init__(self, data):
+        self.id = data['id']
+        self.name = data['name']
+        self.type = data['type']
+        self.gid = data['gid']
+        self.x = data['x']
+        self.y = data['y']
+        self.width = data['width']
+        self.height = data['height']
+        self.properties = data['properties']
+
+
+class ObjectLayer(list):
+    def __init__(self, name, visible, properties, objects):
+        super().__init__(MapObject(data) for data in objects)
+        self.name = name
+        self.visible = visible
+        self.properties = properties
+
+    def tiles(self):
+        return iter(())  # Objects aren't drawn as tiles
+
+
+class CompiledMap:
+    """
+    Map loaded from sidecar.Provides the part of pytmx TiledMap interface used by game, with walkability
+    grid of map in addition
+    """
+
+    def __init__(self, path, buffer, meta):
+        """
+
+        :param path: string - TMX file path
+        :param buffer: sidecar contents (mmap or bytes), kept open while map is used
+        :param meta: dict of compiled map metadata
+        """
+        self.filename = path
+        self.buffer = buffer
+        self.width = meta['width']
+        self.height = meta['height']
+        self.tilewidth = meta['tilewidth']
+        self.tileheight = meta['tileheight']
+        self.background_color = meta['background_color']
+        self.properties = meta['properties']
+        self.tile_properties = {int(gid): p for gid, p in meta['tile_properties'].items()}
+        map_dir = os.path.dirname(path)
+        self.tilesets = meta['tilesets']
+        self.firstgids = [t['firstgid'] for t in self.tilesets]
+        self.atlases = [get_atlas(os.path.join(map_dir, t['image']), t) for t in self.tilesets]
+        self.images = {}  # GID - surface
+
+        view = memoryview(buffer)
+        offset = HEADER.size + HEADER.unpack_from(buffer)[2]
+        size = self.width * self.height
+        self.layers = []
+        for layer in meta['layers']:
+            if layer['kind'] == 'tiles':
+                gids = view[offset:offset + size * 4].cast('I')
+                offset += size * 4
+                self.layers.append(TileLayer(self, layer['name'], layer['visible'], layer['properties'], gids))
+            else:
+                self.layers.append(ObjectLayer(layer['name'], layer['visible'], layer['properties'],
+                                               layer['objects']))
+        self.walkable = view[offset:offset + size]  # 1 - walkable, 0 - blocked, row by row
+        self.layer_names = {layer.name: layer for layer in self.layers}
+
+    @property
+    def visible_layers(self):
+        return (layer for layer in self.layers if layer.visible)
+
+    def get_layer_by_name(self, name):
+        try:
+            return self.layer_names[name]
+        except KeyError:
+            raise ValueError('Layer "{}" not found'.format(name))
+
+    def get_tile_image_by_gid(self, gid):
+        """
+        Get tile image, flipped tiles are made on first use
+        :param gid: int - GID with flip flags
+        :return: pygame surface, None for empty tile
+        """
+        image = self.images.get(gid)
+        if image is None and gid:
+            base = gid & GID_MASK
+            i = bisect_right(self.firstgids, base) - 1
+            if i < 0:
+                raise ValueError('GID {} has no tileset'.format(base))
+            image = self.atlases[i].get_tile(base - self.firstgids[i])
+            if gid & FLIP_DIAGONAL:
+                image = pg.transform.flip(pg.transform.rotate(image, 270), True, False)
+            if gid & (FLIP_X | FLIP_Y):
+                image = pg.transform.flip(image, bool(gid & FLIP_X), bool(gid & FLIP_Y))
+            self.images[gid] = image
+        return image
+
+    def get_tile_properties_by_gid(self, gid):
+        return self.tile_properties.get(gid & GID_MASK)
+
+    def get_tile_properties(self, x, y, layer):
+        """
+        Get properties of tile at place
+        :param x: int - tile column
+        :param y: int - tile row
+        :param layer: int - index of tile layer
+        :return: dict of properties, None if tile has none
+        """
+        return self.get_tile_properties_by_gid(self.layers[layer].data[y][x])
+
+
+def compile_all(directory):
+    """
+    Compile all outdated maps in directory and it's subdirectories
+    :param directory: string - maps directory
+    :return: int - number of compiled maps
+    """
+    compiled = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith('.tmx'):
+                continue
+            path = os.path.join(root, name)
+            sidecar = open_sidecar(path + SIDECAR_SUFFIX)
+            fresh = False
+            if sidecar is not None:
+                try:
+                    fresh = is_fresh(read_meta(sidecar), path)
+                except ValueError:  # Broken metadata
+                    fresh = False
+                sidecar.close()
+            if not fresh:
+                write_sidecar(path + SIDECAR_SUFFIX, compile_map(path))
+                compiled += 1
+    return compiled
+
+
+if __name__ == '__main__':
+    maps_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join('resources', 'maps')
+    print('Compiled {} maps'.format(compile_all(maps_dir)))
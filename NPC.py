@@ -2,56 +2,109 @@
 
 # -*- coding: utf-8 -*-
 
+import json
+
 import pygame as pg
 
+import Items
+import Loot
+import MapAI
+import RNG
 import Spells
-from ResourceHelpers import SpritesHelper
+from ResourceHelpers import SpritesHelper, DataHelper, animation_library
 from Enums import BattleEnum as Battle
-from Events import BattleEvent
-import random as rand
-from Items import *
+from Events import BattleEvent, bus
+from BattleSprites import CharacterView
 
 
 def action(func):  # Decorator for NPC actions, posts NextTurn event so NPC can't take several actions at once
     def wrapped(*args, **kwargs):
         status = func(*args, **kwargs)
-        event = pg.event.Event(BattleEvent, {'sub': Battle.NextTurn, 'status': status})
-        pg.event.post(event)
+        bus.post(BattleEvent, {'sub': Battle.NextTurn, 'status': status})
 
     return wrapped
 
 
-class MapNPC:
+class MapObject:
+    """
+    Base of NPCs, traders and wizards placed on map.Image isn't pickled, it's loaded again by on_load
+    """
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('image', None)
+        return state
+
+
+class MapNPC(MapObject):
     """
     Defines NPC for map state
     """
 
-    def __init__(self, x, y, party, bg, id):
+    def __init__(self, x, y, party, bg, id, ai=None, speed=MapAI.DEFAULT_SPEED):
         """
 
-        :param party: list of npc party members (turned to objects by eval function)
+        :param party: list of npc party members (names of enemy archetypes)
         :param bg: name of battle background file
         :param id: unique party id (for quests etc.)
+        :param ai: MapAI behaviour of roaming NPC, None if NPC stands still
+        :param speed: movement speed in pixels per second
         """
         self.party = party
         self.bg = bg
         self.id = id
         self.x = x
         self.y = y
+        self.ai = ai
+        self.speed = speed
+        self.path = None  # Path chosen by behaviour
+        self.step = None  # Tile NPC currently walks to
+        self.next_think = 0  # Game time of next behaviour decision
         self.create_map_image()
 
     def create_map_image(self):
-        member = eval(self.party[0])
-        self.image = member.load_map_sprite(member)
+        self.image = enemies.get(self.party[0]).map_image()
         self.rect = self.image.get_rect()
         self.rect.x = self.x
         self.rect.y = self.y
 
     def on_load(self):
-        self.create_map_image()
+        self.image = enemies.get(self.party[0]).map_image()  # Rect keeps position NPC walked to
 
+    def set_path(self, path):
+        self.path = path
+        self.step = None
 
-class MapTrader:
+    def move(self, dt, grid):
+        """
+        Walk along path towards center of next tile
+        :param dt: time in millis since last frame
+        :param grid: NavGrid object of map
+        :return: bool - True if NPC moved
+        """
+        if self.step is None:
+            if self.path is None:
+                return False
+            self.step = self.path.next_tile(grid.tile_at(self.rect.center))
+            if self.step is None:
+                if not self.path.is_finished():
+                    self.path = None  # Goal is unreachable, let behaviour choose another one
+                return False
+        tx, ty = grid.center_of(self.step)
+        cx, cy = self.x + self.rect.width / 2, self.y + self.rect.height / 2
+        dist = self.speed * dt / 1000
+        if cx != tx:  # Path is 4-connected, so NPC goes along one axis at a time
+            self.x += max(-dist, min(dist, tx - cx))
+        else:
+            self.y += max(-dist, min(dist, ty - cy))
+        self.rect.x = round(self.x)
+        self.rect.y = round(self.y)
+        if self.x + self.rect.width / 2 == tx and self.y + self.rect.height / 2 == ty:
+            self.step = None
+        return True
+
+
+class MapTrader(MapObject):
     """
     Defines trader for map state
     """
@@ -63,7 +116,7 @@ class MapTrader:
 
     def load_sprite(self):
         helper = SpritesHelper()
-        self.image = pg.transform.scale(pg.image.load(helper.get_sprite('trader', 'map')), (30, 38))
+        self.image = animation_library.get_image(helper.get_sprite('trader', 'map'), (30, 38))
         self.image.set_colorkey(pg.Color("#7bd5fe"))
         self.rect = self.image.get_rect()
         self.rect.x = self.x
@@ -72,7 +125,7 @@ class MapTrader:
     def on_load(self):
         self.load_sprite()
 
-class MapWizard:
+class MapWizard(MapObject):
     """
     Defines wizard for map state
     """
@@ -84,7 +137,7 @@ class MapWizard:
 
     def load_sprite(self):
         helper = SpritesHelper()
-        self.image = pg.transform.scale(pg.image.load(helper.get_sprite('wizard', 'map')), (30, 38))
+        self.image = animation_library.get_image(helper.get_sprite('wizard', 'map'), (30, 38))
         self.image.set_colorkey(pg.Color("#7bd5fe"))
         self.rect = self.image.get_rect()
         self.rect.x = self.x
@@ -94,13 +147,15 @@ class MapWizard:
         self.load_sprite()
 
 
-class BaseNPC(pg.sprite.Sprite):
+class BaseNPC:
     """
     Defines basic NPC class for battle state
     """
 
+    __slots__ = ('name', 'spells', '_res_name', 'HP', 'MAX_HP', 'MP', 'MAX_MP', 'DMG', '_loot', 'EXP', 'gold', 'view')
+
     def __init__(self, res_name, hp, mp, dmg, exp, gold, loot, spells):
-        super().__init__()
+        self.view = None  # CharacterView with sprites, created by load_sprites
         self.spells = spells  # List of spell objects which NPC can cast
         self._res_name = res_name
         self.HP = hp
@@ -108,7 +163,7 @@ class BaseNPC(pg.sprite.Sprite):
         self.MP = mp
         self.MAX_MP = mp
         self.DMG = dmg
-        self._loot = loot  # list of Item,Drop Rate dicts
+        self._loot = loot  # LootTable object
         self.load_sprites()
         self.EXP = exp  # Experience points which every player character gets for defeating this NPC
         self.gold = gold  # Gold for defeating this NPC
@@ -143,8 +198,7 @@ class BaseNPC(pg.sprite.Sprite):
         if dmg >= self.HP:
             self.HP = 0
             args_dict = {'sub': Battle.CharacterKO, 'pc': self}
-            event = pg.event.Event(BattleEvent, args_dict)
-            pg.event.post(event)
+            bus.post(BattleEvent, args_dict)
         else:
             self.HP -= dmg
 
@@ -167,6 +221,7 @@ class BaseNPC(pg.sprite.Sprite):
         """
         spell.apply(target)
         self.MP -= spell.mp
+        bus.post(BattleEvent, {'sub': Battle.SpellCast, 'spell': spell, 'caster': self, 'target': target})
         status = '{} casted {} on {}'.format(self.name, spell, target.name)
         return status
 
@@ -175,13 +230,7 @@ class BaseNPC(pg.sprite.Sprite):
         Generate loot for this NPC
         :return: list of Item objects
         """
-        loot = []
-        chance = rand.random()
-        for i in self._loot:
-            if chance >= i['rate']:
-                loot.append(i['item']())
-
-        return loot
+        return self._loot.sample()
 
     def post_status(self, status):
         """
@@ -189,241 +238,141 @@ class BaseNPC(pg.sprite.Sprite):
         :param status: string - action description
         """
         args_dict = {'status': status, 'sub': Battle.StatusUpdate}
-        event = pg.event.Event(BattleEvent, args_dict)
-        pg.event.post(event)
+        bus.post(BattleEvent, args_dict)
 
 
-class Test(BaseNPC):
+class Enemy(BaseNPC):
     """
-    Test NPC
+    Battle NPC made from archetype of enemy registry
     """
-    Counter = 0
 
-    def __init__(self):
-        loot = [{'item': ManaPotion, 'rate': 0.25}]
-        super().__init__('test', 100, 0, 5, 15, 30, loot, [])
-        self.name = 'Test NPC {}'.format(Test.Counter + 1)
-        Test.Counter += 1
+    __slots__ = ('archetype',)
 
-    def __del__(self):
-        Test.Counter -= 1
-
-    def load_sprites(self):
-        helper = SpritesHelper()
-        self.image = pg.transform.scale(pg.image.load(helper.get_sprite('test', 'battle_idle')), (30, 38))
-        self.image.set_colorkey(pg.Color("#7bd5fe"))
-        self.rect = self.image.get_rect()
-
-    def load_map_sprite(self):
-        helper = SpritesHelper()
-        image = pg.transform.scale(pg.image.load(helper.get_sprite('test', 'map')), (30, 38))
-        image.set_colorkey(pg.Color("#7bd5fe"))
-
-        return image
-
-    def decide(self, player_party, npc_party):
-        alive = player_party.get_alive()
-        if len(alive) > 0:
-            self.attack(alive[0])
-
-
-class FireElemental(BaseNPC):
-    """
-    Fire elemental NPC.Targets player with smallest amount of health first
-    """
+    def __init__(self, archetype):
+        """
 
-    Counter = 0
+        :param archetype: EnemyArchetype object
+        """
+        self.archetype = archetype
+        spells = list(archetype.spells)
+        super().__init__(archetype.sprite, archetype.hp, archetype.mp, archetype.dmg, archetype.exp, archetype.gold,
+                         archetype.loot, spells)
+        self.name = archetype.next_name()
 
-    def __init__(self):
-        loot = [{'item': FireBlade, 'rate': 0.1}]
-        spells = [Spells.FireBreath()]
-        super(FireElemental, self).__init__('fire_elem', 50, 20, 5, 10, 30, loot, spells)
-        self.name = 'Fire elemental {}'.format(FireElemental.Counter + 1 if FireElemental.Counter > 1 else "")
-        FireElemental.Counter += 1
+    def __del__(self):
+        self.archetype.counter -= 1
 
     def load_sprites(self):
-        helper = SpritesHelper()
-        self.image = pg.transform.scale(pg.image.load(helper.get_sprite('fire_elem', 'battle_idle')), (24, 36))
-        self.image.set_colorkey(pg.Color("#fec5c5"))
-        self.rect = self.image.get_rect()
+        self.view = CharacterView(self.archetype.battle_image())
 
     def load_map_sprite(self):
-        helper = SpritesHelper()
-        image = pg.transform.scale(pg.image.load(helper.get_sprite('fire_elem', 'map')), (24, 36))
-        image.set_colorkey(pg.Color("#fec5c5"))
-
-        return image
+        return self.archetype.map_image()
 
     def decide(self, player_party, npc_party):
         """
-        Choose player with smallest amount of health.Cast fire breath if enough MP
+        Choose target by archetype's policy.Cast first spell on it if policy allows and there is enough MP
         """
-        if len(player_party.get_alive()) > 0:
-            min_member = player_party.get_alive()[0]
-            for i in player_party.get_alive():
-                if i.HP < min_member.HP:
-                    min_member = i
-            if self.MP >= self.spells[0].mp:
-                self.cast_spell(self.spells[0], min_member)
+        alive = player_party.get_alive()
+        if len(alive) > 0:
+            target = TARGET_POLICIES[self.archetype.target](alive)
+            if self.archetype.cast and self.spells and self.MP >= self.spells[0].mp:
+                self.cast_spell(self.spells[0], target)
             else:
-                self.attack(min_member)
-
-
-class WaterElemental(BaseNPC):
-    """
-    Fire elemental NPC.Targets random player
-    """
-
-    Counter = 0
-
-    def __init__(self):
-        super(WaterElemental, self).__init__('water_elem', 40, 0, 20, 10, 10, [], [])
-        self.name = 'Water elemental {}'.format(WaterElemental.Counter + 1 if WaterElemental.Counter > 1 else "")
-        WaterElemental.Counter += 1
-
-    def __del__(self):
-        WaterElemental.Counter -= 1
-
-    def load_sprites(self):
-        helper = SpritesHelper()
-        self.image = pg.transform.scale(pg.image.load(helper.get_sprite('water_elem', 'battle_idle')), (24, 36))
-        self.image.set_colorkey(pg.Color("#fec5c5"))
-        self.rect = self.image.get_rect()
+                self.attack(target)
 
-    def load_map_sprite(self):
-        helper = SpritesHelper()
-        image = pg.transform.scale(pg.image.load(helper.get_sprite('water_elem', 'map')), (24, 36))
-        image.set_colorkey(pg.Color("#fec5c5"))
-
-        return image
 
-    def decide(self, player_party, npc_party):
-        """
-        Choose random player
-        """
-        if len(player_party.get_alive()) > 0:
-            self.attack(rand.choice(player_party.get_alive()))
+TARGET_POLICIES = {
+    'first': lambda alive: alive[0],
+    'weakest': lambda alive: min(alive, key=lambda member: member.HP),  # First of members with smallest HP
+    'strongest': lambda alive: max(alive, key=lambda member: member.HP),
+    'random': lambda alive: RNG.get(RNG.AI).choice(alive),
+}
 
 
-class EarthElemental(BaseNPC):
+class EnemyArchetype:
     """
-    Earth elemental NPC.Targets strongest player
+    Compiled enemy definition.Names of items, spells and policies are resolved once when registry is loaded
     """
 
-    Counter = 0
-
-    def __init__(self):
-        super(EarthElemental, self).__init__('earth_elem', 35, 0, 25, 15, 25, [], [])
-        self.name = 'Earth elemental {}'.format(EarthElemental.Counter + 1 if EarthElemental.Counter > 1 else "")
-        EarthElemental.Counter += 1
-
-    def __del__(self):
-        EarthElemental.Counter -= 1
-
-    def load_sprites(self):
-        helper = SpritesHelper()
-        self.image = pg.transform.scale(pg.image.load(helper.get_sprite('earth_elem', 'battle_idle')), (24, 36))
-        self.image.set_colorkey(pg.Color("#fec5c5"))
-        self.rect = self.image.get_rect()
-
-    def load_map_sprite(self):
-        helper = SpritesHelper()
-        image = pg.transform.scale(pg.image.load(helper.get_sprite('earth_elem', 'map')), (24, 36))
-        image.set_colorkey(pg.Color("#fec5c5"))
+    def __init__(self, id, data):
+        """
 
+        :param id: string - archetype name used in maps
+        :param data: dict - enemy definition from data file
+        """
+        self.id = id
+        self.name = data['name']
+        self.sprite = data['sprite']
+        self.size = tuple(data['size'])
+        self.colorkey = pg.Color(data.get('colorkey', '#7bd5fe'))
+        self.hp = int(data['hp'])
+        self.mp = int(data['mp'])
+        self.dmg = int(data['dmg'])
+        self.exp = int(data['exp'])
+        self.gold = int(data['gold'])
+        self.loot = Loot.compile_table(data.get('loot', []), lambda key: self.resolve(Items, key))
+        self.spells = [self.resolve(Spells, key) for key in data.get('spells', [])]
+        ai = data.get('ai', {})
+        self.target = ai.get('target', 'first')
+        self.cast = bool(ai.get('cast', False))
+        if self.target not in TARGET_POLICIES:
+            raise ValueError('Enemy {}: unknown AI target policy {}'.format(id, self.target))
+        self.counter = 0  # Number of enemies of this archetype alive
+
+    def resolve(self, module, key):
+        try:
+            return module.get(key)
+        except KeyError:
+            raise ValueError('Enemy {}: unknown {} {}'.format(self.id, module.__name__, key))
+
+    def create(self):
+        return Enemy(self)
+
+    def next_name(self):
+        self.counter += 1
+        return '{} {}'.format(self.name, self.counter if self.counter > 2 else "")
+
+    def battle_image(self):
+        image = animation_library.get_image(SpritesHelper().get_sprite(self.sprite, 'battle_idle'), self.size)
+        image.set_colorkey(self.colorkey)
         return image
 
-    def decide(self, player_party, npc_party):
-        """
-        Choose player with largest amount of health
-        """
-        if len(player_party.get_alive()) > 0:
-            max_member = player_party.get_alive()[0]
-            for i in player_party.get_alive():
-                if i.HP > max_member.HP:
-                    max_member = i
-            self.attack(max_member)
+    def map_image(self):
+        image = animation_library.get_image(SpritesHelper().get_sprite(self.sprite, 'map'), self.size)
+        image.set_colorkey(self.colorkey)
+        return image
 
 
-class LightElemental(BaseNPC):
+class EnemyRegistry:
     """
-     Light elemental NPC.Targets player with smallest amount of health first
+    Enemy archetypes by name, loaded from data file
     """
 
-    Counter = 0
-
-    def __init__(self):
-        loot = []
-        spells = []
-        super(LightElemental, self).__init__('light_elem', 250, 0, 25, 30, 400, loot, spells)
-        self.name = 'Light elemental {}'.format(LightElemental.Counter + 1 if LightElemental.Counter > 1 else "")
-        LightElemental.Counter += 1
-
-    def __del__(self):
-        LightElemental.Counter -= 1
-
-    def load_sprites(self):
-        helper = SpritesHelper()
-        self.image = pg.transform.scale(pg.image.load(helper.get_sprite('light_elem', 'battle_idle')), (24, 36))
-        self.image.set_colorkey(pg.Color("#fec5c5"))
-        self.rect = self.image.get_rect()
+    def __init__(self, path):
+        """
 
-    def load_map_sprite(self):
-        helper = SpritesHelper()
-        image = pg.transform.scale(pg.image.load(helper.get_sprite('light_elem', 'map')), (24, 36))
-        image.set_colorkey(pg.Color("#fec5c5"))
+        :param path: string - path to JSON file with enemy definitions
+        """
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        self.archetypes = {name: EnemyArchetype(name, definition) for name, definition in data.items()}
 
-        return image
+    def get(self, name):
+        try:
+            return self.archetypes[name]
+        except KeyError:
+            raise KeyError('Unknown enemy {}'.format(name))
 
-    def decide(self, player_party, npc_party):
+    def create(self, name):
         """
-        Choose player with smallest amount of health.Cast fire breath if enough MP
+        Create battle NPC
+        :param name: string - archetype name
+        :return: Enemy object
         """
-        if len(player_party.get_alive()) > 0:
-            min_member = player_party.get_alive()[0]
-            for i in player_party.get_alive():
-                if i.HP < min_member.HP:
-                    min_member = i
-            self.attack(min_member)
+        return self.get(name).create()
 
+    def __contains__(self, name):
+        return name in self.archetypes
 
-class DarkElemental(BaseNPC):
-    """
-     Darkness elemental NPC.Very hard to beat
-    """
 
-    Counter = 0
-
-    def __init__(self):
-        loot = [{'item': StoneArmor, 'rate': 0.3}]
-        spells = []
-        super(DarkElemental, self).__init__('dark_elem', 500, 0, 25, 60, 1000, loot, spells)
-        self.name = 'Dark elemental {}'.format(DarkElemental.Counter + 1 if DarkElemental.Counter > 1 else "")
-        DarkElemental.Counter += 1
-
-    def __del__(self):
-        DarkElemental.Counter -= 1
-
-    def load_sprites(self):
-        helper = SpritesHelper()
-        self.image = pg.transform.scale(pg.image.load(helper.get_sprite('dark_elem', 'battle_idle')), (24, 36))
-        self.image.set_colorkey(pg.Color("#fec5c5"))
-        self.rect = self.image.get_rect()
-
-    def load_map_sprite(self):
-        helper = SpritesHelper()
-        image = pg.transform.scale(pg.image.load(helper.get_sprite('dark_elem', 'map')), (24, 36))
-        image.set_colorkey(pg.Color("#fec5c5"))
-
-        return image
-
-    def decide(self, player_party, npc_party):
-        """
-        Choose player with smallest amount of health
-        """
-        if len(player_party.get_alive()) > 0:
-            min_member = player_party.get_alive()[0]
-            for i in player_party.get_alive():
-                if i.HP < min_member.HP:
-                    min_member = i
-            self.attack(min_member)
\ No newline at end of file
+enemies = EnemyRegistry(DataHelper.get_path('enemies.json'))
@@ -0,0 +1,219 @@
+#!usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+import math
+
+import numpy as np
+import pygame as pg
+
+import RNG
+
+MAX_PARTICLES = 4096  # Particles over this number are not spawned
+MAX_EMITTERS = 16  # Size of emitter pool, effects over this number are not started
+PARTICLE_SIZE = 2  # Width and height of particle in pixels
+
+# Spell name - effect parameters:
+# 'duration' - millis emitter spawns particles; 'rate' - particles per second; 'travel' - emitter moves from caster
+# to target during duration, otherwise it stays on caster; 'line' - particles spawn along line from caster to target;
+# 'aim' - particles fly towards target within 'spread' radians, otherwise in any direction;
+# 'speed' and 'life' - (min, max) in pixels per second and millis; 'gravity' - pixels per second squared;
+# 'colors' - RGB tuples picked randomly; 'burst' - particles spawned at once when emitter finishes
+EFFECTS = {
+    'Fireball': {'duration': 450, 'rate': 500, 'travel': True, 'line': False, 'aim': False, 'spread': math.pi,
+                 'speed': (10, 50), 'life': (200, 450), 'gravity': -80,
+                 'colors': ((255, 220, 80), (255, 140, 20), (220, 60, 10)), 'burst': 160},
+    'Lightning': {'duration': 200, 'rate': 2500, 'travel': False, 'line': True, 'aim': False, 'spread': math.pi,
+                  'speed': (5, 40), 'life': (80, 250), 'gravity': 0,
+                  'colors': ((255, 255, 255), (180, 220, 255), (120, 160, 255)), 'burst': 60},
+    'Fire breath': {'duration': 600, 'rate': 900, 'travel': False, 'line': False, 'aim': True, 'spread': 0.35,
+                    'speed': (180, 320), 'life': (250, 600), 'gravity': -40,
+                    'colors': ((255, 200, 60), (255, 110, 0), (180, 30, 0)), 'burst': 0},
+}
+
+
+def has_effect(spell_name):
+    return spell_name in EFFECTS
+
+
+class Emitter:
+    """
+    Spawns particles of one effect.Emitters are pooled by ParticleSystem and reused
+    """
+
+    def __init__(self):
+        self.effect = None
+        self.source = (0, 0)
+        self.target = (0, 0)
+        self.time = 0  # Millis since start
+        self.pending = 0.0  # Fraction of particle carried to next update
+        self.active = False
+
+    def start(self, effect, source, target):
+        """
+        Start effect, emitter must not be active
+        :param effect: dict of effect parameters
+        :param source: (x, y) position of caster
+        :param target: (x, y) position of target
+        """
+        self.effect = effect
+        self.source = source
+        self.target = target
+        self.time = 0
+        self.pending = 0.0
+        self.active = True
+
+    def position(self):
+        if not self.effect['travel']:
+            return self.source
+        t = min(self.time / self.effect['duration'], 1.0)
+        return (self.source[0] + (self.target[0] - self.source[0]) * t,
+                self.source[1] + (self.target[1] - self.source[1]) * t)
+
+    def is_finished(self):
+        return not self.active
+
+
+class ParticleSystem:
+    """
+    Fixed size pool of particles.State of all particles is kept in preallocated NumPy arrays, live particles
+    are packed at the start of arrays and updated and drawn in vectorized steps
+    """
+
+    def __init__(self, capacity=MAX_PARTICLES, emitters=MAX_EMITTERS):
+        """
+
+        :param capacity: int - max number of live particles
+        :param emitters: int - max number of running effects
+        """
+        self.capacity = capacity
+        self.count = 0  # Number of live particles
+        self.pos = np.zeros((capacity, 2), np.float32)
+        self.vel = np.zeros((capacity, 2), np.float32)
+        self.life = np.zeros(capacity, np.float32)  # Remaining millis
+        self.max_life = np.ones(capacity, np.float32)
+        self.gravity = np.zeros(capacity, np.float32)
+        self.color = np.zeros((capacity, 3), np.float32)
+        self.pool = [Emitter() for _ in range(emitters)]
+        self.rng = RNG.get_bulk(RNG.PARTICLES)
+
+    def emit(self, name, source, target):
+        """
+        Start spell effect
+        :param name: string - spell name, key of EFFECTS
+        :param source: (x, y) position of caster
+        :param target: (x, y) position of target
+        :return: Emitter object, None if all emitters are busy
+        """
+        for emitter in self.pool:
+            if not emitter.active:
+                emitter.start(EFFECTS[name], source, target)
+                return emitter
+        return None
+
+    def is_active(self):
+        return self.count > 0 or any(e.active for e in self.pool)
+
+    def spawn(self, emitter, n):
+        """
+        Spawn particles of emitter's effect, particles over capacity are dropped
+        :param emitter: Emitter object
+        :param n: int - number of particles
+        """
+        n = min(n, self.capacity - self.count)
+        if n <= 0:
+            return
+        effect = emitter.effect
+        rng = self.rng
+        s = slice(self.count, self.count + n)
+        sx, sy = emitter.source
+        tx, ty = emitter.target
+        if effect['line']:
+            t = rng.random(n, np.float32)
+            self.pos[s, 0] = sx + (tx - sx) * t + rng.normal(0, 3, n)
+            self.pos[s, 1] = sy + (ty - sy) * t + rng.normal(0, 3, n)
+        else:
+            self.pos[s] = emitter.position()
+        if effect['aim']:
+            base = math.atan2(ty - sy, tx - sx)
+            angle = base + rng.uniform(-effect['spread'], effect['spread'], n)
+        else:
+            angle = rng.uniform(-math.pi, math.pi, n)
+        speed = rng.uniform(*effect['speed'], n) / 1000  # Pixels per milli
+        self.vel[s, 0] = np.cos(angle) * speed
+        self.vel[s, 1] = np.sin(angle) * speed
+        self.life[s] = rng.uniform(*effect['life'], n)
+        self.max_life[s] = self.life[s]
+        self.gravity[s] = effect['gravity'] / 1000000  # Pixels per milli squared
+        colors = np.array(effect['colors'], np.float32)
+        self.color[s] = colors[rng.integers(0, len(colors), n)]
+        self.count += n
+
+    def update(self, dt):
+        """
+        Run emitters and move particles
+        :param dt: time in millis since last frame
+        """
+        for emitter in self.pool:
+            if emitter.active:
+                self.update_emitter(emitter, dt)
+        n = self.count
+        if n == 0:
+            return
+        life = self.life[:n]
+        life -= dt
+        self.vel[:n, 1] += self.gravity[:n] * dt
+        self.pos[:n] += self.vel[:n] * dt
+        alive = life > 0
+        k = int(np.count_nonzero(alive))
+        if k < n:  # Pack live particles to the start of arrays
+            for array in (self.pos, self.vel, self.life, self.max_life, self.gravity, self.color):
+                array[:k] = array[:n][alive]
+            self.count = k
+
+    def update_emitter(self, emitter, dt):
+        effect = emitter.effect
+        duration = effect['duration']
+        step = min(dt, duration - emitter.time)
+        emitter.pending += effect['rate'] * step / 1000
+        count = int(emitter.pending)
+        emitter.pending -= count
+        emitter.time += dt
+        if emitter.time >= duration:
+            emitter.time = duration
+            count += effect['burst']
+            emitter.active = False
+        self.spawn(emitter, count)
+
+    def clear(self):
+        self.count = 0
+        for emitter in self.pool:
+            emitter.active = False
+
+    def draw(self, surface):
+        """
+        Draw particles, each particle lightens pixels under it with it's color fading over lifetime
+        :param surface: pygame surface with 24 or 32 bits per pixel
+        :return: pygame rect of drawn area, None if nothing was drawn
+        """
+        n = self.count
+        if n == 0:
+            return None
+        width, height = surface.get_size()
+        xs = self.pos[:n, 0].astype(np.intp)
+        ys = self.pos[:n, 1].astype(np.intp)
+        inside = (xs >= 0) & (xs < width - PARTICLE_SIZE) & (ys >= 0) & (ys < height - PARTICLE_SIZE)
+        if not inside.any():
+            return None
+        xs = xs[inside]
+        ys = ys[inside]
+        fade = self.life[:n][inside] / self.max_life[:n][inside]
+        colors = (self.color[:n][inside] * fade[:, None]).astype(np.uint8)
+        pixels = pg.surfarray.pixels3d(surface)
+        for dx in range(PARTICLE_SIZE):
+            for dy in range(PARTICLE_SIZE):
+                px, py = xs + dx, ys + dy
+                pixels[px, py] = np.maximum(pixels[px, py], colors)
+        del pixels  # Unlock surface
+        left, top = int(xs.min()), int(ys.min())
+        return pg.Rect(left, top, int(xs.max()) - left + PARTICLE_SIZE, int(ys.max()) - top + PARTICLE_SIZE)
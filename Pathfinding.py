@@ -0,0 +1,299 @@
+#!usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+import heapq
+from collections import OrderedDict, deque
+
+MAX_EXPANSIONS = 5000  # A* gives up after expanding this many tiles, so one far request can't stall a frame
+FIELD_CACHE_SIZE = 16  # Number of distance fields kept per navigation grid
+NEIGHBOURS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+class NavGrid:
+    """
+    Walkability grid of map used for path search.Tiles are addressed by (x, y), positions on map are in pixels
+    """
+
+    def __init__(self, width, height, tile_size):
+        """
+
+        :param width: int - map width in tiles
+        :param height: int - map height in tiles
+        :param tile_size: int - size of tile in pixels as drawn on map
+        """
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.walkable = bytearray([1]) * (width * height)
+        self.version = 0  # Increased on every change, so paths know they have to be checked
+        self.fields = OrderedDict()  # goal tile - distance field, least recently used first
+
+    @staticmethod
+    def from_map(tiled_map, tile_size):
+        """
+        Build grid from walkability compiled with TMX map
+        :param tiled_map: compiled map
+        :param tile_size: int - size of tile in pixels as drawn on map
+        :return: NavGrid object
+        """
+        grid = NavGrid(tiled_map.width, tiled_map.height, tile_size)
+        grid.walkable[:] = tiled_map.walkable
+        return grid
+
+    def is_walkable(self, tile):
+        x, y = tile
+        return 0 <= x < self.width and 0 <= y < self.height and self.walkable[y * self.width + x] == 1
+
+    def set_walkable(self, tile, walkable):
+        """
+        Change tile walkability (opened doors, moved obstacles).Invalidates cached distance fields
+        :param tile: (x, y) tuple
+        :param walkable: bool
+        """
+        x, y = tile
+        self.walkable[y * self.width + x] = 1 if walkable else 0
+        self.version += 1
+        self.fields.clear()
+
+    def set_area(self, x, y, width, height, walkable=None):
+        """
+        Overwrite walkability of rectangular area at once (loaded or unloaded part of world)
+        :param x: int - left tile
+        :param y: int - top tile
+        :param width: int - area width in tiles
+        :param height: int - area height in tiles
+        :param walkable: bytearray of width * height values row by row, None to block whole area
+        """
+        for row in range(height):
+            start = (y + row) * self.width + x
+            if walkable is None:
+                self.walkable[start:start + width] = bytes(width)
+            else:
+                self.walkable[start:start + width] = walkable[row * width:(row + 1) * width]
+        self.version += 1
+        self.fields.clear()
+
+    def blocked(self):
+        """
+        Get all blocked tiles
+        :return: generator of (x, y) tuples
+        """
+        for i, value in enumerate(self.walkable):
+            if not value:
+                yield i % self.width, i // self.width
+
+    def blocked_rects(self, x=0, y=0, width=None, height=None):
+        """
+        Cover blocked tiles of area with few rectangles.Greedy meshing - each run of blocked tiles in a row is
+        extended down while the same run is blocked in next rows, covered tiles aren't used again
+        :param x: int - left tile
+        :param y: int - top tile
+        :param width: int - area width in tiles, whole grid if None
+        :param height: int - area height in tiles, whole grid if None
+        :return: list of (x, y, width, height) tuples in tiles, relative to area's top left tile
+        """
+        width = self.width if width is None else width
+        height = self.height if height is None else height
+        area = bytearray()
+        for row in range(height):
+            start = (y + row) * self.width + x
+            area += self.walkable[start:start + width]
+        rects = []
+        for row in range(height):
+            row_end = (row + 1) * width
+            left = area.find(0, row * width, row_end)
+            while left >= 0:
+                right = area.find(1, left, row_end)
+                if right < 0:
+                    right = row_end
+                bottom = row + 1
+                while bottom < height and area.find(1, left + (bottom - row) * width,
+                                                    right + (bottom - row) * width) < 0:
+                    bottom += 1
+                for i in range(bottom - row):
+                    area[left + i * width:right + i * width] = bytes([1]) * (right - left)  # Mark covered
+                rects.append((left - row * width, row, right - left, bottom - row))
+                left = area.find(0, right, row_end)
+        return rects
+
+    def tile_at(self, pos):
+        """
+        Get tile under map position
+        :param pos: (x, y) position in pixels
+        :return: (x, y) tile tuple
+        """
+        return int(pos[0]) // self.tile_size, int(pos[1]) // self.tile_size
+
+    def center_of(self, tile):
+        """
+        Get map position of tile center
+        :param tile: (x, y) tuple
+        :return: (x, y) position in pixels
+        """
+        half = self.tile_size // 2
+        return tile[0] * self.tile_size + half, tile[1] * self.tile_size + half
+
+    def neighbours(self, tile):
+        x, y = tile
+        for dx, dy in NEIGHBOURS:
+            n = (x + dx, y + dy)
+            if self.is_walkable(n):
+                yield n
+
+    def find_path(self, start, goal, max_expansions=MAX_EXPANSIONS):
+        """
+        Search shortest path with A*
+        :param start: (x, y) start tile
+        :param goal: (x, y) goal tile
+        :param max_expansions: int - search limit
+        :return: list of tiles from first step to goal (empty if start is goal), None if goal is unreachable
+        """
+        if not self.is_walkable(goal):
+            return None
+        gx, gy = goal
+        came_from = {start: None}
+        cost = {start: 0}
+        h = abs(start[0] - gx) + abs(start[1] - gy)
+        heap = [(h, h, 0, start)]  # Ties of estimated cost are broken towards goal
+        expansions = 0
+        while heap:
+            _, _, g, tile = heapq.heappop(heap)
+            if tile == goal:
+                return self.build_path(came_from, goal)
+            if g > cost[tile]:
+                continue  # Outdated heap entry
+            expansions += 1
+            if expansions > max_expansions:
+                return None
+            g += 1
+            for n in self.neighbours(tile):
+                if g < cost.get(n, g + 1):
+                    cost[n] = g
+                    came_from[n] = tile
+                    h = abs(n[0] - gx) + abs(n[1] - gy)
+                    heapq.heappush(heap, (g + h, h, g, n))
+        return None
+
+    @staticmethod
+    def build_path(came_from, goal):
+        path = []
+        tile = goal
+        while came_from[tile] is not None:
+            path.append(tile)
+            tile = came_from[tile]
+        path.reverse()
+        return path
+
+    def distance_field(self, goal):
+        """
+        Get distances of all tiles to goal, computed once and shared by all agents heading to the same tile
+        :param goal: (x, y) tile
+        :return: list of distances indexed by y * width + x, -1 for unreachable tiles
+        """
+        field = self.fields.get(goal)
+        if field is not None:
+            self.fields.move_to_end(goal)
+            return field
+        field = [-1] * (self.width * self.height)
+        if self.is_walkable(goal):
+            field[goal[1] * self.width + goal[0]] = 0
+            queue = deque([goal])
+            while queue:
+                tile = queue.popleft()
+                d = field[tile[1] * self.width + tile[0]] + 1
+                for n in self.neighbours(tile):
+                    i = n[1] * self.width + n[0]
+                    if field[i] < 0:
+                        field[i] = d
+                        queue.append(n)
+        self.fields[goal] = field
+        if len(self.fields) > FIELD_CACHE_SIZE:
+            self.fields.popitem(last=False)
+        return field
+
+    def step_towards(self, tile, goal):
+        """
+        Get next tile on shortest path using distance field of goal
+        :param tile: (x, y) current tile
+        :param goal: (x, y) goal tile
+        :return: (x, y) next tile, None if goal is reached or unreachable
+        """
+        field = self.distance_field(goal)
+        best = None
+        best_d = field[tile[1] * self.width + tile[0]] if self.is_walkable(tile) else -1
+        for n in self.neighbours(tile):
+            d = field[n[1] * self.width + n[0]]
+            if d >= 0 and (best_d < 0 or d < best_d):
+                best, best_d = n, d
+        return best
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['fields'] = OrderedDict()  # Cache is rebuilt on demand
+        return state
+
+
+class Path:
+    """
+    Path of one agent.Kept up to date when goal moves or grid changes, replanning only when needed
+    """
+
+    def __init__(self, grid, goal):
+        """
+
+        :param grid: NavGrid object
+        :param goal: (x, y) goal tile
+        """
+        self.grid = grid
+        self.goal = goal
+        self.tiles = None  # Remaining tiles to goal, None until planned
+        self.version = grid.version
+
+    def plan(self, start):
+        self.tiles = self.grid.find_path(start, self.goal)
+        self.version = self.grid.version
+
+    def set_goal(self, goal):
+        """
+        Change goal.Path is extended or shortened by one tile if goal moved to neighbour tile, otherwise replanned
+        :param goal: (x, y) tile
+        """
+        if goal == self.goal:
+            return
+        old_goal, self.goal = self.goal, goal
+        if not self.tiles or abs(goal[0] - old_goal[0]) + abs(goal[1] - old_goal[1]) != 1:
+            self.tiles = None
+        elif len(self.tiles) > 1 and self.tiles[-2] == goal:
+            self.tiles.pop()
+        elif self.grid.is_walkable(goal):
+            self.tiles.append(goal)
+        else:
+            self.tiles = None
+
+    def is_valid(self):
+        if self.version == self.grid.version:
+            return True
+        if all(self.grid.is_walkable(t) for t in self.tiles):
+            self.version = self.grid.version
+            return True
+        return False
+
+    def next_tile(self, current):
+        """
+        Get tile agent should move to
+        :param current: (x, y) tile agent stands on
+        :return: (x, y) tile, None if goal is reached or unreachable
+        """
+        if self.tiles is None or not self.is_valid():
+            self.plan(current)
+            if self.tiles is None:
+                return None
+        while self.tiles and self.tiles[0] == current:
+            self.tiles.pop(0)
+        if self.tiles and abs(self.tiles[0][0] - current[0]) + abs(self.tiles[0][1] - current[1]) > 1:
+            self.plan(current)  # Agent was pushed off the path
+        return self.tiles[0] if self.tiles else None
+
+    def is_finished(self):
+        return self.tiles is not None and not self.tiles
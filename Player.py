@@ -3,16 +3,22 @@
 # -*- coding: utf-8 -*-
 
 import pygame as pg
-from ResourceHelpers import SettingsHelper as Settings, SpritesHelper as Sprites
-from Events import TeleportEvent, EncounterEvent, BattleEvent
-from Enums import BattleEnum as Battle
+from bisect import bisect_right
+from ResourceHelpers import SettingsHelper as Settings, SpritesHelper as Sprites, animation_library
+from Events import TeleportEvent, EncounterEvent, BattleEvent, bus
+from Enums import BattleEnum as Battle, CharacterEnum as Character
+from Roster import Roster, Stat, STATS
+from BattleSprites import CharacterView
 import Items
 import Spells
-import random as rand
-import pyganim
+import RNG
 
 P_HEIGHT = 18
 P_WIDTH = 15
+P_COLORKEY = '#7bd5fe'
+ANIM_DELAY = 0.15  # Delay between walk animation frames in seconds
+WALK_SPEED = 2  # Default party speed in pixels per update
+RUN_FACTOR = 2  # Party speed is multiplied by this while running
 
 
 class KOError(Exception):
@@ -32,6 +38,11 @@ class PlayerParty(pg.sprite.Sprite):
     Class used to represent player characters' party on world and location map
     """
 
+    speed = WALK_SPEED  # Defaults for games saved before speed could be changed
+    running = False
+    max_step = None
+    turn = -1
+
     def __init__(self, x, y):
         """
 
@@ -39,33 +50,50 @@ class PlayerParty(pg.sprite.Sprite):
         :param y: party's start y coordinate
         """
         pg.sprite.Sprite.__init__(self)
-        self.image = pg.Surface((P_WIDTH, P_HEIGHT))
         self.rect = pg.Rect(x, y, P_WIDTH, P_HEIGHT)
+        self.scale = 1  # Sprite scale factor of current map
         self.iter = 0
         self.xvel = 0
         self.yvel = 0
-        self.iter_index = 0
         self.up = self.down = self.left = self.right = False
-        self.set_animations()
+        self.speed = Settings().get('party_speed', WALK_SPEED)
+        self.running = False
+        self.max_step = None  # (x, y) max distance party moves in update, so click-to-move doesn't overshoot
         self.current_anim = None
         self.paused = False
-        item = Items.HealthPotion()
-        sitem = Items.Weapon('BFG', 228, 228, 'Instant kill')
-        self.inventory = [item, sitem]  # content of common inventory
+        self.set_animations()
+        self.inventory = Items.Inventory([Items.get('HealthPotion'), Items.get('BFG')])  # content of common inventory
         self.gold = 1000  # Starting gold amount
         self.create_party()
-        self.current_alive = self.get_alive()
-        self.alive_iter = iter(self.current_alive)
+        self.alive = ()  # Not KOed members in party order, updated when member is KOed or resurrected
+        self.turn = -1  # Index of member which had last turn in current battle round, -1 before first
+        self.update_alive()
 
     def create_party(self):
         """
         Create party members for a new game
         """
-        self.warrior = Warrior()
-        self.mage = Mage()
-        self.healer = Healer()
-        self.ranger = Ranger()
-        self.members = {0: self.warrior, 1: self.mage, 2: self.healer, 3: self.ranger}
+        self.roster = Roster()
+        for member in (Warrior(), Mage(), Healer(), Ranger()):
+            self.recruit(member)
+
+    def recruit(self, member):
+        """
+        Add member to party, member goes to reserve if party is full
+        :param member: BaseMember object
+        """
+        member.party = self
+        self.roster.add(member)
+        self.update_alive()
+
+    def swap(self, member, reserve_member):
+        """
+        Replace active member with member from reserve
+        :param member: active BaseMember object
+        :param reserve_member: BaseMember object from reserve
+        """
+        self.roster.swap(member, reserve_member)
+        self.update_alive()
 
     def set_pos(self, x, y):
         self.rect.x = x
@@ -75,88 +103,70 @@ class PlayerParty(pg.sprite.Sprite):
         """
         Called when game state is loaded (to avoid dead pygame surfaces)
         """
-        self.image = pg.Surface((P_WIDTH, P_HEIGHT))
         self.set_animations()
-        for i in self:
+        self.current_anim = self.anim_down
+        if 'roster' not in self.__dict__:  # Saves made before roster kept members in dict
+            self.roster = Roster()
+            for member in self.__dict__.pop('members').values():
+                member.party = self
+                self.roster.add(member)
+        for i in self.roster.all_members():
             i.load_sprites()
+        self.update_alive()
 
     def set_animations(self):
         """
-        Load and initialize animations for player actions
-        """
-        anim_delay = 0.15
-        self.init_animations(anim_delay, *self.load_animations())
-
-    def init_animations(self, anim_delay, anim_down_f, anim_idle_f, anim_left_f, anim_right_f, anim_up_f):
-        """
-        Initialize animations loaded form sprite files
-        :param anim_delay: delay between animation frames
-        :param anim_down_f: tuple of down walk animation frame file paths
-        :param anim_idle_f: idle sprite
-        :param anim_left_f: tuple of left walk animation frame file paths
-        :param anim_right_f: tuple of right walk animation frame file paths
-        :param anim_up_f: tuple of up walk animation frame file paths
-        """
-        anim = []
-        for a in anim_up_f:
-            anim.append((a, anim_delay))
-        self.anim_up = pyganim.PygAnimation(anim)
-        self.anim_up.play()
-        anim.clear()
-        for a in anim_down_f:
-            anim.append((a, anim_delay))
-        self.anim_down = pyganim.PygAnimation(anim)
-        self.anim_down.play()
-        anim.clear()
-        for a in anim_left_f:
-            anim.append((a, anim_delay))
-        self.anim_left = pyganim.PygAnimation(anim)
-        self.anim_left.play()
-        anim.clear()
-        for a in anim_right_f:
-            anim.append((a, anim_delay))
-        self.anim_right = pyganim.PygAnimation(anim)
-        self.anim_right.play()
-        self.anim_idle = pyganim.PygAnimation(anim_idle_f)
-        self.anim_idle.play()
+        Take shared walk animations for current scale and create party image they are drawn on
+        """
+        cycle = animation_library.get_walk_cycle('warrior', ANIM_DELAY, self.scale)
+        self.anim_up = cycle['up']
+        self.anim_down = cycle['down']
+        self.anim_left = cycle['left']
+        self.anim_right = cycle['right']
+        self.anim_idle = cycle['idle']
+        if self.current_anim is not None:
+            self.current_anim = self.anim_down  # Animation of direction is picked again on next update
+        self.image = pg.Surface((P_WIDTH * self.scale, P_HEIGHT * self.scale))
+        self.image.set_colorkey(pg.Color(P_COLORKEY))
         self.anim_idle.blit(self.image, (0, 0))
 
-    def load_animations(self):
-        """
-        Get all player animations paths
-        :return: all player animations
-        """
-        helper = Sprites()
-        anim_up_f = helper.get_animation('warrior', 'up')
-        anim_down_f = helper.get_animation('warrior', 'down')
-        anim_left_f = helper.get_animation('warrior', 'left')
-        anim_right_f = helper.get_animation('warrior', 'right')
-        anim_idle_f = [(anim_down_f[1], 0.1)]
-        bg_color = "#7bd5fe"
-        self.image.set_colorkey(pg.Color(bg_color))
-        return anim_down_f, anim_idle_f, anim_left_f, anim_right_f, anim_up_f
+    def __getstate__(self):
+        # Surfaces and animations can't be pickled, they are restored by on_load
+        state = self.__dict__.copy()
+        for name in ('image', 'anim_up', 'anim_down', 'anim_left', 'anim_right', 'anim_idle',
+                     'iter_index', 'current_alive', 'alive_iter'):  # Alive iteration state of old saves
+            state.pop(name, None)
+        state['current_anim'] = None
+        state['paused'] = False  # Menu game is saved from isn't saved, so loaded party can move
+        return state
 
     def update(self, colliders, teleports, npcs):
-        defvel = 2
+        """
+        Move party in pressed directions, sliding along colliders
+        :param colliders: Colliders object
+        :param teleports: Triggers object of teleports
+        :param npcs: Triggers object of NPCs
+        """
+        speed = self.speed * RUN_FACTOR if self.running else self.speed
 
         if not self.paused:
             if self.left:
-                self.xvel = -defvel
+                self.xvel = -speed
                 self.anim_left.blit(self.image, (0, 0))
                 self.current_anim = self.anim_left
 
             if self.right:
-                self.xvel = defvel
+                self.xvel = speed
                 self.anim_right.blit(self.image, (0, 0))
                 self.current_anim = self.anim_right
 
             if self.up:
-                self.yvel = -defvel
+                self.yvel = -speed
                 self.anim_up.blit(self.image, (0, 0))
                 self.current_anim = self.anim_up
 
             if self.down:
-                self.yvel = defvel
+                self.yvel = speed
                 self.anim_down.blit(self.image, (0, 0))
                 self.current_anim = self.anim_down
 
@@ -170,9 +180,11 @@ class PlayerParty(pg.sprite.Sprite):
                 self.anim_idle.blit(self.image, (0, 0))
                 self.current_anim = self.anim_down
 
-            self.rect.x += self.xvel
+            if self.max_step is not None:
+                self.xvel = max(-self.max_step[0], min(self.xvel, self.max_step[0]))
+                self.yvel = max(-self.max_step[1], min(self.yvel, self.max_step[1]))
+
             self.collide_x(colliders)
-            self.rect.y += self.yvel
             self.collide_y(colliders)
 
             self.collide_teleport(teleports)
@@ -183,6 +195,7 @@ class PlayerParty(pg.sprite.Sprite):
         Stop player animation and movement (called on state pause)
         """
         self.left = self.right = self.up = self.down = False
+        self.running = False
         self.current_anim.pause()
         self.paused = True
 
@@ -195,53 +208,68 @@ class PlayerParty(pg.sprite.Sprite):
 
     def enter_battle(self):
         self.pause()
-        self.current_alive = self.get_alive()
-        self.alive_iter = iter(self.current_alive)
+        self.turn = -1
 
     def exit_battle(self):
-        for i in self:
-            i.resurrect()
-        self.current_alive = None
-        self.alive_iter = None
+        self.roster.resurrect_all()
+        self.update_alive()
+        self.turn = -1
         self.resume()
 
     def collide_x(self, colliders):
         """
-        Handles player party's collisions on x axis
-        :param colliders: list of pygame rect objects to check collision on
-        """
-        for c in colliders:
-            if self.rect.colliderect(c):
-                self.rect.x -= self.xvel
-                self.xvel = 0
+        Move party on x axis until it touches first collider in it's way (swept AABB), so any speed can't pass
+        through walls.Colliders party already overlaps don't block it, so it can walk out of them
+        :param colliders: Colliders object to check collision on
+        """
+        dx = self.xvel
+        if dx == 0:
+            return
+        rect = self.rect
+        for c in colliders.query(rect.union(rect.move(dx, 0))):
+            if dx > 0 and c.left >= rect.right:
+                dx = min(dx, c.left - rect.right)
+            elif dx < 0 and c.right <= rect.left:
+                dx = max(dx, c.right - rect.left)
+        rect.x += dx
+        self.xvel = dx
 
     def collide_y(self, colliders):
         """
-        Handles player party's collisions on x axis
-        :param colliders: list of pygame rect objects to check collision on
-        """
-        for c in colliders:
-            if self.rect.colliderect(c):
-                self.rect.y -= self.yvel
-                self.yvel = 0
+        Move party on y axis until it touches first collider in it's way, see collide_x
+        :param colliders: Colliders object to check collision on
+        """
+        dy = self.yvel
+        if dy == 0:
+            return
+        rect = self.rect
+        for c in colliders.query(rect.union(rect.move(0, dy))):
+            if dy > 0 and c.top >= rect.bottom:
+                dy = min(dy, c.top - rect.bottom)
+            elif dy < 0 and c.bottom <= rect.top:
+                dy = max(dy, c.bottom - rect.top)
+        rect.y += dy
+        self.yvel = dy
 
     def collide_teleport(self, teleports):
         """
-        Handles player party's collision on teleports,
-        :param teleports: list of pygame rect object of teleport tiles to check on
+        Handles player party's collision on teleports, event is raised only when party steps on teleport
+        :param teleports: Triggers object of teleports to check on
         """
-        for t in teleports:
-            if self.rect.colliderect(t.rect):
-                event_args = {'teleport': t}
-                tp_event = pg.event.Event(TeleportEvent, event_args)
-                pg.event.post(tp_event)
+        entered, _ = teleports.update(self.rect)
+        for t in entered:
+            event_args = {'teleport': t}
+            bus.post(TeleportEvent, event_args)
 
     def collide_npc(self, npcs):
-        for n in npcs:
-            if self.rect.colliderect(n.rect):
-                event_args = {'npc': n}
-                npc_event = pg.event.Event(EncounterEvent, event_args)
-                pg.event.post(npc_event)
+        """
+        Handles player party's collision on NPCs, event is raised only when party meets NPC
+        :param npcs: Triggers object of map NPCs to check on
+        """
+        entered, _ = npcs.update(self.rect)
+        for n in entered:
+            event_args = {'npc': n}
+            bus.post(EncounterEvent, event_args)
 
     def scale_up(self):
         """
@@ -249,14 +277,14 @@ class PlayerParty(pg.sprite.Sprite):
         """
         self.rect.width *= 2
         self.rect.height *= 2
-
-    def get_scaled(self):
-        return pg.transform.scale(self.image, (P_WIDTH * 2, P_HEIGHT * 2))
+        self.scale = 2
+        self.set_animations()
 
     def reset_scale(self):
         self.rect.width = P_WIDTH
         self.rect.height = P_HEIGHT
-        self.image = pg.transform.scale(self.image, (P_WIDTH, P_HEIGHT))
+        self.scale = 1
+        self.set_animations()
 
     def add_items(self, items):
         """
@@ -265,6 +293,14 @@ class PlayerParty(pg.sprite.Sprite):
         """
         self.inventory.extend(items)
 
+    def add_loot(self, loot):
+        """
+        Add battle loot to inventory
+        :param loot: dict of Item object - count
+        """
+        for item, count in loot.items():
+            self.inventory.add(item, count)
+
     def remove_item(self, item):
         """
         Remove item from inventory
@@ -274,41 +310,32 @@ class PlayerParty(pg.sprite.Sprite):
 
     def add_exp(self, exp):
         """
-        Add experience to all party members
+        Add experience to all active party members
         :param exp: int - added experience
         """
-        for i in self:
-            i.add_exp(exp)
+        self.roster.add_exp(exp)
 
     def add_spells(self, *spells):
-        spells = list(spells)
+        """
+        Teach spells to members of their character class, including reserve
+        :param spells: Spell objects
+        """
         for s in spells:
-            if s.char.value in self.members.keys():
-                self.members[s.char.value].add_spells(s)
+            for member in self.roster.all_members():
+                if member.char == s.char:
+                    member.add_spells(s)
 
     def draw(self, surface):
         surface.blit(self.image, self.rect)
 
     def __getitem__(self, item):
-        if item in self.members.keys():
-            return self.members[item]
-        else:
-            raise IndexError
+        return self.roster[item]
 
     def __len__(self):
-        return 4
+        return len(self.roster)
 
     def __iter__(self):
-        return self
-
-    def __next__(self):
-        try:
-            item = self[self.iter_index]
-            self.iter_index += 1
-            return item
-        except IndexError:
-            self.iter_index = 0
-            raise StopIteration
+        return iter(self.roster)
 
     def get_index(self, character):
         """
@@ -316,47 +343,37 @@ class PlayerParty(pg.sprite.Sprite):
         :param character: BaseMember object
         :return: int - index
         """
-        for key, val in self.members.items():
-            if character is val:
-                return key
-
-        raise TypeError('parameter is not a party member object')
+        try:
+            return self.roster.index(character)
+        except ValueError:
+            raise TypeError('parameter is not a party member object')
 
-    def get_battle_sprites(self):
+    def update_alive(self):
         """
-        Returns list of tuples with battle sprites of each not KOed member
-        :return: list of tuples
+        Rebuild alive members, called by members when they are KOed or resurrected
         """
-        sprites = []
-        alive = self.get_alive()
-        for i in alive:
-            pair = (i.battle_image, i.battle_rect)
-            sprites.append(pair)
-
-        return sprites
+        self.alive = self.roster.alive()
 
     def get_alive(self):
         """
-        Returns list of not KOed characters
-        :return: list of BaseMember objects
+        Returns not KOed characters.Tuple is shared until alive members change, so it must not be kept
+        :return: tuple of BaseMember objects
         """
-        return [i for i in self if not i.KO]
+        return self.alive
 
     def get_next_alive(self):
         """
-        Returns next alive party member,which stands in order after prev parameter.
-        Raises StopIteration if prev was last in order or there are no more alive members
+        Returns next alive party member, which stands in order after the one which had last turn.
+        Raises StopIteration if last turn was the last in order or there are no more alive members,
+        next call starts new round
         :return: BaseMember object
         """
-        if len(self.current_alive) != len(self.get_alive()):
-            self.current_alive = self.get_alive()
-            self.alive_iter = iter(self.current_alive)
-        try:
-            return next(self.alive_iter)
-        except StopIteration:
-            self.current_alive = self.get_alive()
-            self.alive_iter = iter(self.current_alive)
-            raise StopIteration
+        for i in range(self.turn + 1, len(self)):
+            if not self.roster[i].KO:
+                self.turn = i
+                return self.roster[i]
+        self.turn = -1
+        raise StopIteration
 
     def get_usable_items(self):
         return [i for i in self.inventory if isinstance(i, Items.Usable)]
@@ -410,6 +427,14 @@ class Camera:
         """
         return target.move(self.state.topleft)
 
+    def to_map(self, pos):
+        """
+        Convert screen position to map position
+        :param pos: (x, y) position on screen
+        :return: (x, y) position on map
+        """
+        return pos[0] - self.state.x, pos[1] - self.state.y
+
     def update(self, target):
         """
          Called to update camera's position related to target
@@ -439,18 +464,84 @@ class Teleport:
         self.world = world
 
 
+PROGRESSIONS = {}  # (exp multiplier, max level) - Progression object shared by members of the same class
+
+
+class Progression:
+    """
+    Experience thresholds of all levels of class.Member reaches next level when it's EXP reaches threshold of it's
+    level, so level for any amount of experience is found by one search in the table
+    """
+
+    def __init__(self, exp_multiplier, max_lvl):
+        """
+
+        :param exp_multiplier: int - threshold of level is level * exp_multiplier
+        :param max_lvl: int
+        """
+        self.max_lvl = max_lvl
+        self.thresholds = tuple(lvl * exp_multiplier for lvl in range(1, max_lvl + 1))  # Index is level - 1
+
+    @staticmethod
+    def get(exp_multiplier, max_lvl):
+        key = (exp_multiplier, max_lvl)
+        progression = PROGRESSIONS.get(key)
+        if progression is None:
+            progression = Progression(exp_multiplier, max_lvl)
+            PROGRESSIONS[key] = progression
+        return progression
+
+    def level(self, exp):
+        """
+        Get level reached with experience
+        :param exp: int - total experience
+        :return: int
+        """
+        return min(bisect_right(self.thresholds, exp) + 1, self.max_lvl)
+
+    def up_exp(self, lvl):
+        """
+        Get experience needed to leave level
+        :param lvl: int
+        :return: int
+        """
+        return self.thresholds[lvl - 1]
+
+
 class BaseMember:
     """
-    Represents base game class to be derived by actual classes like Warrior
+    Represents base game class to be derived by actual classes like Warrior.Stats used in battle are kept
+    in arrays of party roster
     """
 
+    HP = Stat('HP')
+    MAX_HP = Stat('MAX_HP')
+    MP = Stat('MP')
+    MAX_MP = Stat('MAX_MP')
+    DMG = Stat('DMG')
+    DEF = Stat('DEF')
+    EVS = Stat('EVS')
+    KO = Stat('KO')
+    EXP = Stat('EXP')
+    UP_EXP = Stat('UP_EXP')
+    char = None  # CharacterEnum of class, determines spells member can learn
+    __slots__ = ('name', 'LVL', 'MAX_LVL', 'spells', 'armor', 'weapon', 'party', 'roster', 'slot', 'own_stats',
+                 'INT', 'STR', 'DEX', 'DUR', 'INT_INC', 'STR_INC', 'DEX_INC', 'DUR_INC', 'hp_multiplier',
+                 'mp_multiplier', 'dmg_multiplier', 'defence_multiplier', 'exp_multiplier', 'base_evs', '_res_name',
+                 'view')
+
     def __init__(self):
+        self.roster = None  # Roster object keeping member's stats
+        self.slot = None  # Index of member in roster arrays
+        self.own_stats = {}  # Stats of member which isn't in roster
+        self.view = None  # CharacterView with sprites, created by load_sprites
         self.LVL = 1  # Starting level is 1
         self.MAX_LVL = 25
         self.spells = []  # List of spell objects which Warrior can cast
-        self.armor = Items.Armor('Coat', 2, 10, 'coat')  # Armor item
-        self.weapon = Items.Weapon('Knife', 2, 8, 'knife')  # Weapon item
-        self.KO = False  # Knocked out
+        self.armor = Items.get('Coat')  # Armor item
+        self.weapon = Items.get('Knife')  # Weapon item
+        self.KO = False  # Knocked out, changed by set_ko
+        self.party = None  # PlayerParty object member belongs to
         self.EXP = 0  # Starting experience
         self.UP_EXP = 0
         self.INT = 0
@@ -479,15 +570,20 @@ class BaseMember:
 
     def lvl_up(self):
         """
-        Called when member reaches maximum experience for current level.Counts new base stats values
+        Called when member reaches maximum experience for current level.Member gets next level and all levels
+        above it it's experience is enough for, base stats grow by increments of every level and derived stats
+        are counted once
         """
         if self.LVL < self.MAX_LVL:
-            self.LVL += 1
-            self.UP_EXP = self.LVL * self.exp_multiplier
-            self.INT += self.INT_INC
-            self.STR += self.STR_INC
-            self.DEX += self.DEX_INC
-            self.DUR += self.DUR_INC
+            progression = Progression.get(self.exp_multiplier, self.MAX_LVL)
+            lvl = max(self.LVL + 1, progression.level(self.EXP))
+            levels = lvl - self.LVL
+            self.LVL = lvl
+            self.UP_EXP = progression.up_exp(lvl)
+            self.INT += self.INT_INC * levels
+            self.STR += self.STR_INC * levels
+            self.DEX += self.DEX_INC * levels
+            self.DUR += self.DUR_INC * levels
             self.recalculate_stats()
 
     def set_weapon(self, weapon):
@@ -503,9 +599,18 @@ class BaseMember:
         self.MP = self.MAX_MP
         
     def resurrect(self):
-        self.KO = False
+        self.set_ko(False)
         self.regenerate()
 
+    def set_ko(self, ko):
+        """
+        Change knocked out state, party is notified to update it's alive members
+        :param ko: bool
+        """
+        self.KO = ko
+        if self.party is not None:
+            self.party.update_alive()
+
     def recalculate_stats(self):
         self.MAX_HP = self.DUR * self.hp_multiplier  # Maximal health points
         self.HP = self.MAX_HP  # Current HP, always regenerates to maximum when not in battle
@@ -527,19 +632,31 @@ class BaseMember:
     def load_sprites(self):
         helper = Sprites()
         portrait_path = helper.get_sprite(self._res_name, 'portrait')
-        portrait_image = pg.image.load(portrait_path)
-        self.portrait = (portrait_image, portrait_image.get_rect())
+        portrait_image = animation_library.get_image(portrait_path)
 
         battle_path = helper.get_sprite(self._res_name, 'battle_idle')
-        self.battle_image = pg.transform.scale(pg.image.load(battle_path), (30, 38))
+        battle_image = animation_library.get_image(battle_path, (30, 38))
         bg_color = "#7bd5fe"
-        self.battle_image.set_colorkey(pg.Color(bg_color))
-        self.battle_rect = self.battle_image.get_rect()
+        battle_image.set_colorkey(pg.Color(bg_color))
+        self.view = CharacterView(battle_image, (portrait_image, portrait_image.get_rect()))
+
+    def __getstate__(self):
+        # Sprites can't be pickled, view is created again by load_sprites
+        return {name: getattr(self, name) for name in BaseMember.__slots__ if name != 'view' and hasattr(self, name)}
+
+    def __setstate__(self, state):
+        self.roster = None
+        self.slot = None
+        self.own_stats = {}
+        self.view = None
+        for name, value in state.items():
+            if name in STATS or name in BaseMember.__slots__:  # Sprites of old saves are skipped
+                setattr(self, name, value)
 
     def add_spells(self, *spells):
         sp = list(spells)
         for s in sp:
-            if not any(isinstance(x, s.__class__) for x in self.spells):
+            if s not in self.spells:
                 self.spells.append(s)
 
     def apply_damage(self, dmg):
@@ -549,7 +666,7 @@ class BaseMember:
         :return: bool - True if damage wasn't dodged
         """
         if not self.KO:
-            if rand.random() < self.EVS:  # Damage was dodged
+            if RNG.get(RNG.COMBAT).random() < self.EVS:  # Damage was dodged
                 return False
             else:
                 damage = dmg - self.DEF
@@ -560,7 +677,7 @@ class BaseMember:
                     return True
                 else:  # damage is enough to knock out
                     self.HP = 0
-                    self.KO = True
+                    self.set_ko(True)
                     self.raise_event(Battle.CharacterKO)
                     return True
         else:
@@ -575,7 +692,7 @@ class BaseMember:
                 self.HP -= damage
             else:
                 self.HP = 0
-                self.KO = True
+                self.set_ko(True)
                 self.raise_event(Battle.CharacterKO)
         else:
             raise KOError(self)
@@ -591,6 +708,7 @@ class BaseMember:
             if self.MP >= spell.mp:
                 spell.apply(target)
                 self.MP -= spell.mp
+                bus.post(BattleEvent, {'sub': Battle.SpellCast, 'spell': spell, 'caster': self, 'target': target})
                 return True
                 # KOed players (except for revive spells)
             else:
@@ -630,8 +748,7 @@ class BaseMember:
         :param subevent: BattleEnum - related event
         """
         args_dict = {'sub': subevent, 'pc': self}
-        event = pg.event.Event(BattleEvent, args_dict)
-        pg.event.post(event)
+        bus.post(BattleEvent, args_dict)
 
 
 class Warrior(BaseMember):
@@ -639,6 +756,9 @@ class Warrior(BaseMember):
     Represents warrior game class, with it's stats,sprites etc.
     """
 
+    char = Character.Warrior
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
         self.name = 'Cid'
@@ -668,6 +788,9 @@ class Mage(BaseMember):
     Represents Mage game class, with it's stats, sprites etc.
     """
 
+    char = Character.Mage
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
         self.name = 'Karos'
@@ -687,7 +810,7 @@ class Mage(BaseMember):
         self._res_name = 'mage'
         self.recalculate_stats()
         self.load_sprites()
-        self.spells.append(Spells.Fireball())
+        self.spells.append(Spells.get('Fireball'))
 
     def __str__(self):
         return 'Mage'
@@ -698,6 +821,9 @@ class Healer(BaseMember):
     Class that represents Healer game class.
     """
 
+    char = Character.Healer
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
         self.name = 'Rilay'
@@ -717,7 +843,7 @@ class Healer(BaseMember):
         self._res_name = 'healer'
         self.recalculate_stats()
         self.load_sprites()
-        self.spells.append(Spells.Heal())
+        self.spells.append(Spells.get('Heal'))
 
     def __str__(self):
         return 'Healer'
@@ -728,6 +854,9 @@ class Ranger(BaseMember):
     Class that represents Ranger game class
     """
 
+    char = Character.Ranger
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
         self.name = 'Jaden'
@@ -0,0 +1,186 @@
+#!usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+import csv
+import json
+import time
+from collections import deque
+
+import pygame as pg
+
+WINDOW_SIZE = 300  # Number of last samples used for percentiles (5 seconds at 60 FPS)
+OVERLAY_REFRESH = 30  # Overlay text is re-rendered once per this many frames
+
+
+class Span:
+    """
+    Context manager which measures time spent inside 'with' block and reports it to profiler
+    """
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.profiler.push(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        elapsed = (time.perf_counter() - self.start) * 1000
+        self.profiler.pop(elapsed)
+        return False
+
+
+class NullSpan:
+    """
+    Span which does nothing, returned while profiler is disabled
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class FrameProfiler:
+    """
+    Collects frame and per-phase timings, keeps rolling percentiles and draws them as overlay
+    """
+
+    def __init__(self, window=WINDOW_SIZE):
+        """
+
+        :param window: int - number of last samples kept for every span
+        """
+        self.enabled = False
+        self.overlay = False
+        self.window = window
+        self.samples = {}  # span path - deque of last timings (ms)
+        self.counts = {}  # span path - total number of samples
+        self.totals = {}  # span path - total time spent (ms)
+        self.stack = []  # paths of currently opened spans
+        self.frames = 0
+        self.font = None
+        self.lines = []
+
+    def enable(self):
+        self.enabled = True
+
+    def toggle_overlay(self):
+        """
+        Show or hide on-screen statistics.Profiler is enabled when overlay is shown
+        """
+        self.overlay = not self.overlay
+        if self.overlay:
+            self.enabled = True
+            self.lines = []
+
+    def span(self, name):
+        """
+        Get context manager which times nested block of code
+        :param name: string - span name, prefixed with names of enclosing spans
+        :return: Span or NullSpan object
+        """
+        if self.enabled:
+            return Span(self, name)
+        return NULL_SPAN
+
+    def push(self, name):
+        if self.stack:
+            name = '{}/{}'.format(self.stack[-1], name)
+        self.stack.append(name)
+
+    def pop(self, elapsed):
+        self.record(self.stack.pop(), elapsed)
+
+    def record(self, name, elapsed):
+        """
+        Add timing sample
+        :param name: string - span path
+        :param elapsed: float - time in millis
+        """
+        if name not in self.samples:
+            self.samples[name] = deque(maxlen=self.window)
+            self.counts[name] = 0
+            self.totals[name] = 0.0
+        self.samples[name].append(elapsed)
+        self.counts[name] += 1
+        self.totals[name] += elapsed
+
+    def end_frame(self, dt):
+        """
+        Called once per frame by game engine
+        :param dt: time in millis since last frame
+        """
+        if self.enabled:
+            self.record('frame', dt)
+            self.frames += 1
+
+    def percentiles(self, name):
+        """
+        Get rolling percentiles of span
+        :param name: string - span path
+        :return: dict with p50, p95, p99 and max values
+        """
+        values = sorted(self.samples[name])
+        last = len(values) - 1
+        return {'p50': values[int(last * 0.5)], 'p95': values[int(last * 0.95)], 'p99': values[int(last * 0.99)],
+                'max': values[last]}
+
+    def get_stats(self):
+        """
+        Get statistics of all spans
+        :return: list of dicts sorted by span path
+        """
+        stats = []
+        for name in sorted(self.samples.keys()):
+            row = {'span': name, 'count': self.counts[name], 'mean': self.totals[name] / self.counts[name]}
+            row.update(self.percentiles(name))
+            stats.append(row)
+        return stats
+
+    def draw(self, surface):
+        """
+        Draw overlay with statistics on surface
+        :param surface: pygame surface
+        """
+        if not self.overlay:
+            return
+        if self.font is None:
+            self.font = pg.font.Font(None, 18)
+        if not self.lines or self.frames % OVERLAY_REFRESH == 0:
+            self.lines = []
+            for row in self.get_stats():
+                text = '{span:<24} p50 {p50:6.2f}  p95 {p95:6.2f}  p99 {p99:6.2f} ms'.format(**row)
+                self.lines.append(self.font.render(text, True, pg.Color('yellow'), pg.Color('black')))
+        y = 2
+        for line in self.lines:
+            surface.blit(line, (2, y))
+            y += line.get_height()
+
+    def dump(self, path):
+        """
+        Save statistics to file.Format is chosen by extension - JSON for .json, CSV otherwise
+        :param path: string - path to file
+        """
+        stats = self.get_stats()
+        try:
+            with open(path, 'w', newline='') as f:
+                if path.endswith('.json'):
+                    json.dump({'frames': self.frames, 'spans': stats}, f, indent=2)
+                else:
+                    writer = csv.DictWriter(f, ['span', 'count', 'mean', 'p50', 'p95', 'p99', 'max'])
+                    writer.writeheader()
+                    writer.writerows(stats)
+        except IOError as e:
+            print("Profiler dump error: {}".format(e))
+
+
+profiler = FrameProfiler()  # Shared instance used by engine and game states
@@ -0,0 +1,110 @@
+#!usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+import random
+
+import numpy as np
+
+COMBAT = 'combat'  # Damage evasion
+LOOT = 'loot'  # Enemy drops
+AI = 'ai'  # Battle decisions of enemies
+MAP = 'map'  # Roaming NPC behaviour, which leads to map encounters
+PARTICLES = 'particles'  # Spell effects, drawn only by bulk generator
+STREAMS = (COMBAT, LOOT, AI, MAP)
+
+
+class RandomStreams:
+    """
+    Independent random generators of game subsystems.Every stream is seeded from game seed and it's name,
+    so numbers drawn by one subsystem don't change numbers of others and runs with the same seed are repeated exactly.
+    Streams are created on first use, so saves keep only streams game used
+    """
+
+    def __init__(self, seed=None):
+        """
+
+        :param seed: int or None to seed from system randomness
+        """
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(64)
+        self.game_seed = seed
+        self.streams = {}
+        self.bulk_streams = {}
+
+    def create(self, name):
+        return random.Random('{}:{}'.format(self.game_seed, name))
+
+    def get(self, name):
+        """
+        Get stream of subsystem
+        :param name: string - one of STREAMS or other subsystem name
+        :return: random.Random object
+        """
+        stream = self.streams.get(name)
+        if stream is None:
+            stream = self.create(name)
+            self.streams[name] = stream
+        return stream
+
+    def get_bulk(self, name):
+        """
+        Get numpy generator of subsystem for sampling many numbers at once, it's seeded from subsystem's stream
+        :param name: string - one of STREAMS or other subsystem name
+        :return: numpy Generator object
+        """
+        generator = self.bulk_streams.get(name)
+        if generator is None:
+            generator = np.random.default_rng(self.get(name).getrandbits(64))
+            self.bulk_streams[name] = generator
+        return generator
+
+    def __getstate__(self):
+        return {'game_seed': self.game_seed,
+                'states': {name: stream.getstate() for name, stream in self.streams.items()},
+                'bulk_states': {name: generator.bit_generator.state for name, generator in self.bulk_streams.items()}}
+
+    def __setstate__(self, state):
+        self.game_seed = state['game_seed']
+        self.streams = {}
+        for name, stream_state in state['states'].items():
+            stream = random.Random()
+            stream.setstate(stream_state)
+            self.streams[name] = stream
+        self.bulk_streams = {}
+        for name, generator_state in state['bulk_states'].items():
+            generator = np.random.default_rng()
+            generator.bit_generator.state = generator_state
+            self.bulk_streams[name] = generator
+
+
+streams = RandomStreams()  # Streams of running game, saved with it
+
+
+def get(name):
+    return streams.get(name)
+
+
+def get_bulk(name):
+    return streams.get_bulk(name)
+
+
+def seed(value):
+    """
+    Seed all streams of running game
+    :param value: int
+    """
+    streams.seed(value)
+
+
+def restore(saved):
+    """
+    Continue streams saved with game
+    :param saved: RandomStreams object
+    """
+    streams.game_seed = saved.game_seed
+    streams.streams = saved.streams
+    streams.bulk_streams = saved.bulk_streams
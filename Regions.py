@@ -0,0 +1,184 @@
+#!usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+import os
+import queue
+import re
+import threading
+import xml.etree.ElementTree as ElementTree
+
+REGION_FILE = re.compile(r'^.+_(\d+)_(\d+)\.tmx$')  # Region files are named <anything>_<column>_<row>.tmx
+BACKGROUND_LOADING = True  # Load regions in background thread, otherwise regions are loaded when requested
+
+
+class RegionLayout:
+    """
+    Grid of TMX region files in world directory.All regions have the same size in tiles
+    """
+
+    def __init__(self, directory):
+        """
+
+        :param directory: string - path of world directory
+        """
+        self.directory = directory
+        self.files = {}  # (column, row) - region file path
+        for name in os.listdir(directory):
+            match = REGION_FILE.match(name)
+            if match is not None:
+                self.files[(int(match.group(1)), int(match.group(2)))] = os.path.join(directory, name)
+        if not self.files:
+            raise RuntimeError('No region maps in {}'.format(directory))
+        self.columns = max(key[0] for key in self.files) + 1
+        self.rows = max(key[1] for key in self.files) + 1
+        self.read_header(self.files[min(self.files)])
+
+    def read_header(self, path):
+        """
+        Read map size from region file without loading it
+        :param path: string - region file path
+        """
+        root = ElementTree.parse(path).getroot()
+        self.width = int(root.get('width'))
+        self.height = int(root.get('height'))
+        self.tile_size = int(root.get('tilewidth'))
+        self.background_color = root.get('backgroundcolor', '#000000')
+
+    def region_of(self, tile):
+        """
+        Get region which contains tile
+        :param tile: (x, y) tile in world coordinates
+        :return: (column, row) tuple
+        """
+        return tile[0] // self.width, tile[1] // self.height
+
+    def origin(self, key):
+        """
+        Get first tile of region
+        :param key: (column, row) tuple
+        :return: (x, y) tile in world coordinates
+        """
+        return key[0] * self.width, key[1] * self.height
+
+    def around(self, key, radius):
+        """
+        Get existing regions around given one
+        :param key: (column, row) of center region
+        :param radius: int - number of regions in each direction
+        :return: list of (column, row) tuples
+        """
+        column, row = key
+        return [(c, r) for c in range(column - radius, column + radius + 1) for r in range(row - radius, row + radius + 1)
+                if (c, r) in self.files]
+
+
+class RegionStreamer:
+    """
+    Keeps regions around player loaded.Regions are loaded in background thread, regions which get
+    farther than radius + 1 are unloaded, so walking along region border doesn't reload them
+    """
+
+    def __init__(self, layout, load, radius=1):
+        """
+
+        :param layout: RegionLayout object
+        :param load: function which loads map from path
+        :param radius: int - regions loaded in each direction from player's region
+        """
+        self.layout = layout
+        self.load = load
+        self.radius = radius
+        self.regions = {}  # (column, row) - loaded map
+        self.pending = set()  # requested regions which aren't loaded yet
+        self.failed = set()  # regions which couldn't be loaded, not requested again
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.thread = None
+
+    def start(self):
+        if BACKGROUND_LOADING and self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='region-loader', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """
+        Stop loader thread and forget loaded regions
+        """
+        if self.thread is not None:
+            self.requests.put(None)
+            self.thread = None
+        self.regions = {}
+        self.pending = set()
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+
+    def run(self):
+        requests, results = self.requests, self.results  # Kept, so stopped thread doesn't touch new queues
+        while True:
+            key = requests.get()
+            if key is None:
+                return
+            results.put((key, self.load_region(key)))
+
+    def load_region(self, key):
+        """
+        Load region map
+        :param key: (column, row) tuple
+        :return: loaded map or exception raised while loading
+        """
+        try:
+            return self.load(self.layout.files[key])
+        except Exception as e:
+            return e
+
+    def request(self, key):
+        self.pending.add(key)
+        if self.thread is not None:
+            self.requests.put(key)
+        else:
+            self.results.put((key, self.load_region(key)))
+
+    def load_now(self, center):
+        """
+        Load regions around center region without waiting for loader thread
+        :param center: (column, row) tuple
+        :return: list of (column, row) of loaded regions
+        """
+        loaded = []
+        for key in self.layout.around(center, self.radius):
+            if key not in self.regions:
+                self.regions[key] = self.load(self.layout.files[key])
+                self.pending.discard(key)  # Result from loader thread, if any, will be ignored
+                loaded.append(key)
+        return loaded
+
+    def update(self, center):
+        """
+        Request regions around center, collect finished ones and unload far ones
+        :param center: (column, row) of player's region
+        :return: tuple (list of loaded regions, list of unloaded regions)
+        """
+        for key in self.layout.around(center, self.radius):
+            if key not in self.regions and key not in self.pending and key not in self.failed:
+                self.request(key)
+        keep = set(self.layout.around(center, self.radius + 1))
+        loaded = []
+        while True:
+            try:
+                key, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if key not in self.pending:
+                continue  # Already loaded synchronously
+            self.pending.discard(key)
+            if isinstance(result, Exception):
+                self.failed.add(key)
+                print('Region load error: {}'.format(result))
+            elif key in keep and key not in self.regions:
+                self.regions[key] = result
+                loaded.append(key)
+        unloaded = [key for key in self.regions if key not in keep]
+        for key in unloaded:
+            del self.regions[key]
+        return loaded, unloaded
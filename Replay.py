@@ -0,0 +1,332 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+"""
+Input recording and deterministic headless replay, used to benchmark game sessions.
+
+Record a session:   python Replay.py record walk.json [--map resources/maps/world.tmx | --save saves/save_0.sf]
+Replay it headless: python Replay.py replay walk.json [--report report.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from functools import partial
+
+import pygame as pg
+
+import Events as evs
+import RNG
+
+INPUT_EVENTS = (pg.KEYDOWN, pg.KEYUP, pg.MOUSEBUTTONDOWN, pg.MOUSEBUTTONUP, pg.QUIT)
+INPUT_ATTRS = ('key', 'mod', 'unicode', 'pos', 'button')
+USER_EVENTS = {evs.EngineEvent: 'EngineEvent', evs.TeleportEvent: 'TeleportEvent', evs.EncounterEvent: 'EncounterEvent',
+               evs.BattleEvent: 'BattleEvent', evs.MenuQuitEvent: 'MenuQuitEvent'}
+RECORDING_VERSION = 3  # Version 2 traces game messages of event bus, version 3 records time step of every frame
+
+
+def describe_event(event):
+    """
+    Get short description of game event, used to compare recorded and replayed sessions
+    :param event: pygame event of one of user event types
+    :return: string
+    """
+    if hasattr(event, 'sub'):
+        return '{}.{}'.format(USER_EVENTS[event.type], event.sub.name)
+    if hasattr(event, 'window'):
+        return '{}.{}'.format(USER_EVENTS[event.type], event.window.__name__)
+    return USER_EVENTS[event.type]
+
+
+def instrument():
+    """
+    Make game run the same way when session is recorded and replayed.NPC decisions are limited by count only
+    and regions are loaded without thread, otherwise game would depend on machine speed
+    """
+    import MapAI
+    import Regions
+
+    MapAI.TIME_BUDGET_MS = None
+    Regions.BACKGROUND_LOADING = False
+
+
+def percentiles(values):
+    """
+    Get frame time distribution
+    :param values: list of frame times in millis
+    :return: dict
+    """
+    values = sorted(values)
+    last = len(values) - 1
+    if last < 0:
+        return {}
+    return {'mean': sum(values) / len(values), 'p50': values[int(last * 0.5)], 'p95': values[int(last * 0.95)],
+            'p99': values[int(last * 0.99)], 'max': values[last]}
+
+
+class Recording:
+    """
+    Recorded session: start conditions, input events and trace of game events with frame numbers
+    """
+
+    def __init__(self, seed, fps, map_file=None, save_file=None):
+        self.seed = seed
+        self.fps = fps
+        self.map_file = map_file
+        self.save_file = save_file
+        self.frames = 0
+        self.frame_times = []  # Time step of every frame in millis
+        self.inputs = []  # [frame, time in millis, event type, attributes dict]
+        self.trace = []  # [frame, event description]
+
+    def add_input(self, frame, ticks, event):
+        attrs = {}
+        for name in INPUT_ATTRS:
+            if hasattr(event, name):
+                value = getattr(event, name)
+                attrs[name] = list(value) if name == 'pos' else value
+        self.inputs.append([frame, ticks, event.type, attrs])
+
+    def get_inputs(self):
+        """
+        Group recorded input by frame
+        :return: dict frame - list of pygame events
+        """
+        frames = {}
+        for frame, _, event_type, attrs in self.inputs:
+            if 'pos' in attrs:
+                attrs = dict(attrs, pos=tuple(attrs['pos']))
+            frames.setdefault(frame, []).append(pg.event.Event(event_type, attrs))
+        return frames
+
+    def get_frame_time(self, frame):
+        """
+        Get time step of frame, recordings without frame times are replayed with fixed step
+        :param frame: int - frame number
+        :return: int - millis
+        """
+        if frame < len(self.frame_times):
+            return self.frame_times[frame]
+        return 1000 // self.fps
+
+    def save(self, path):
+        data = {'version': RECORDING_VERSION, 'seed': self.seed, 'fps': self.fps, 'map_file': self.map_file,
+                'save_file': self.save_file, 'frames': self.frames, 'frame_times': self.frame_times,
+                'inputs': self.inputs, 'trace': self.trace}
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+    @staticmethod
+    def load(path):
+        with open(path) as f:
+            data = json.load(f)
+        if data['version'] not in (2, RECORDING_VERSION):
+            raise RuntimeError('Unsupported recording version {}'.format(data['version']))
+        recording = Recording(data['seed'], data['fps'], data['map_file'], data['save_file'])
+        recording.frames = data['frames']
+        recording.frame_times = data.get('frame_times', [])
+        recording.inputs = data['inputs']
+        recording.trace = data['trace']
+        return recording
+
+
+def start_game(recording):
+    """
+    Create game engine positioned at recording's start conditions
+    :param recording: Recording object
+    :return: Game object
+    """
+    # Imported here so SDL drivers can be selected before display is initialized
+    from Game import Game
+    from GameStates import MainMenuState, OpenWorldMapState, WorldMapState
+
+    RNG.seed(recording.seed)
+    screen = pg.display.get_surface()
+    if recording.map_file is not None:
+        args_dict = {'player_party': None, 'pos_x': 0, 'pos_y': 0, 'map_file': recording.map_file}
+        state = OpenWorldMapState if os.path.isdir(recording.map_file) else WorldMapState
+        game = Game(screen, partial(state, args_dict))
+    else:
+        game = Game(screen, MainMenuState)
+    if recording.save_file is not None:
+        game.load_game(recording.save_file)
+    game.fps = recording.fps
+    return game
+
+
+class Recorder:
+    """
+    Runs game normally and records every input event with it's frame number and time step of every frame
+    """
+
+    def __init__(self, recording):
+        self.recording = recording
+        instrument()
+        self.game = start_game(recording)
+        self.game.get_messages = self.get_messages
+        self.game.get_events = self.get_events
+        self.update = self.game.update
+        self.game.update = self.record_update
+
+    def get_messages(self):
+        messages = evs.bus.drain()
+        for message in messages:
+            self.recording.trace.append([self.recording.frames, describe_event(message)])
+        return messages
+
+    def get_events(self):
+        frame = self.recording.frames
+        events = pg.event.get()
+        for event in events:
+            if event.type in INPUT_EVENTS:
+                self.recording.add_input(frame, pg.time.get_ticks(), event)
+        self.recording.frames += 1
+        return events
+
+    def record_update(self, dt):
+        self.recording.frame_times.append(dt)
+        self.update(dt)
+
+    def run(self):
+        self.game.run()
+
+
+class Replayer:
+    """
+    Replays recorded input frame by frame with recorded time steps, collecting performance statistics
+    """
+
+    def __init__(self, recording):
+        self.recording = recording
+        self.inputs = recording.get_inputs()
+        self.frame = 0
+        self.trace = []
+        self.map_loads = 0
+        self.skipped_wait = 0
+        self.instrument()
+        self.game = start_game(recording)
+        self.game.get_messages = self.get_messages
+        self.game.get_events = self.get_events
+
+    def instrument(self):
+        """
+        Count map loads and skip sleeping in blocking battle delays, which would only measure sleeping.
+        Battle effects are still updated during delays, as when session was recorded
+        """
+        import GameStates
+        instrument()
+        load_tiled_map = GameStates.load_tiled_map
+
+        def counted_load(*args, **kwargs):
+            self.map_loads += 1
+            return load_tiled_map(*args, **kwargs)
+
+        def skipped_sleep(state, time_ms):
+            self.skipped_wait += time_ms
+
+        GameStates.load_tiled_map = counted_load
+        GameStates.BattleState.sleep = skipped_sleep
+
+    def get_messages(self):
+        messages = evs.bus.drain()
+        for message in messages:
+            self.trace.append([self.frame, describe_event(message)])
+        return messages
+
+    def get_events(self):
+        events = [e for e in pg.event.get() if e.type not in INPUT_EVENTS]  # Drop real input (if any)
+        events.extend(self.inputs.get(self.frame, []))
+        return events
+
+    def run(self):
+        """
+        Replay all recorded frames
+        :return: dict - benchmark report
+        """
+        frame_times = []
+        tracemalloc.start()
+        for self.frame in range(self.recording.frames):
+            start = time.perf_counter()
+            self.game.event_loop()
+            self.game.update(self.recording.get_frame_time(self.frame))
+            self.game.draw()
+            pg.display.update()
+            frame_times.append((time.perf_counter() - start) * 1000)
+            if self.game.finish:
+                break
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {'frames': len(frame_times), 'frame_ms': percentiles(frame_times),
+                'map_loads': self.map_loads, 'skipped_wait_ms': self.skipped_wait,
+                'alloc_current_kb': current / 1024, 'alloc_peak_kb': peak / 1024,
+                'diverged_at': self.find_divergence()}
+
+    def find_divergence(self):
+        """
+        Compare game events of replay to recorded ones
+        :return: frame number of first mismatch or None if replay matches recording
+        """
+        for recorded, replayed in zip(self.recording.trace, self.trace):
+            if recorded != replayed:
+                return recorded[0]
+        if len(self.recording.trace) != len(self.trace):
+            shorter = min(len(self.recording.trace), len(self.trace))
+            longer = self.recording.trace if len(self.recording.trace) > shorter else self.trace
+            return longer[shorter][0]
+        return None
+
+
+def init_display(headless):
+    """
+    Initialize pygame display, using SDL dummy drivers if headless
+    :param headless: bool
+    """
+    if headless:
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    from ResourceHelpers import SettingsHelper as Settings
+
+    pg.init()
+    settings = Settings()
+    pg.display.set_mode((settings.get('screen_width', 800), settings.get('screen_height', 640)))
+    pg.display.set_caption('JRPG')
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Record and replay game input for benchmarking')
+    commands = parser.add_subparsers(dest='command')
+    record = commands.add_parser('record', help='play the game and record input')
+    record.add_argument('path', help='recording file to write')
+    record.add_argument('--map', help='start on this world map or open world directory instead of main menu')
+    record.add_argument('--save', help='load this save file at start')
+    record.add_argument('--seed', type=int, default=0, help='random seed')
+    record.add_argument('--fps', type=int, default=60)
+    replay = commands.add_parser('replay', help='replay recorded input headless and print report')
+    replay.add_argument('path', help='recording file to replay')
+    replay.add_argument('--report', help='also write report to this JSON file')
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        init_display(False)
+        recording = Recording(args.seed, args.fps, args.map, args.save)
+        Recorder(recording).run()
+        recording.save(args.path)
+    elif args.command == 'replay':
+        recording = Recording.load(args.path)
+        init_display(True)
+        report = Replayer(recording).run()
+        print(json.dumps(report, indent=2))
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump(report, f, indent=2)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -2,9 +2,12 @@
 
 # -*- coding: utf-8 -*-
 
+import json
 import os
 import pickle as pic
 
+import pygame as pg
+
 
 class StringsHelper:
     def __init__(self, locale):
@@ -115,3 +118,155 @@ class MapsHelper:
     def get_map(map_name):
         res_dir = 'resources{}maps'.format(os.sep)
         return '{res}{sep}{name}.tmx'.format(res=res_dir, sep=os.sep, name=map_name)
+
+    @staticmethod
+    def get_world(world_name):
+        """
+        Get directory of open world made of region maps
+        :param world_name: name of world
+        :return: string with path to directory or None if there's no such world
+        """
+        path = 'resources{sep}maps{sep}{name}'.format(sep=os.sep, name=world_name)
+        if os.path.isdir(path):
+            return path
+
+
+class DataHelper:
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')  # Game data is shipped with code
+
+    @staticmethod
+    def get_path(name):
+        """
+        Get path of game data file
+        :param name: file name
+        :return: string with path to file
+        """
+        return os.path.join(DataHelper.data_dir, name)
+
+
+class Catalogue:
+    """
+    Definitions loaded from game data file by id.Every definition is created once and shared
+    """
+
+    def __init__(self, name, create):
+        """
+
+        :param name: data file name
+        :param create: function which makes definition from id and dict of it's data
+        """
+        with open(DataHelper.get_path(name), encoding='utf-8') as f:
+            data = json.load(f)
+        self.definitions = {key: create(key, value) for key, value in data.items()}
+
+    def get(self, key):
+        try:
+            return self.definitions[key]
+        except KeyError:
+            raise KeyError('Unknown definition {}'.format(key))
+
+    def __contains__(self, key):
+        return key in self.definitions
+
+    def __iter__(self):
+        return iter(self.definitions.values())
+
+
+class AnimationLibrary:
+    """
+    Decoded sprite images and animations shared by all characters.Every file is decoded once and scaled once
+    per size, so loading game or switching maps doesn't read sprites again
+    """
+
+    def __init__(self):
+        self.images = {}  # (path, size) - surface
+        self.walk_cycles = {}  # (creature, delay, scale) - dict of animations
+        self.battle_frames = {}  # (creature, size) - dict of frame lists
+
+    def get_image(self, path, size=None):
+        """
+        Get sprite image.Image is shared, so it must not be drawn on
+        :param path: string - path to sprite file
+        :param size: (width, height) tuple to scale image to, None for original size
+        :return: pygame surface
+        """
+        key = (path, size)
+        image = self.images.get(key)
+        if image is None:
+            if size is None:
+                image = pg.image.load(path)
+            else:
+                image = pg.transform.scale(self.get_image(path), size)
+            self.images[key] = image
+        return image
+
+    def get_frame(self, path, scale):
+        """
+        Get animation frame scaled by factor
+        :param path: string - path to frame file
+        :param scale: int - scale factor
+        :return: pygame surface
+        """
+        image = self.get_image(path)
+        if scale == 1:
+            return image
+        return self.get_image(path, (image.get_width() * scale, image.get_height() * scale))
+
+    def get_walk_cycle(self, creature, delay, scale=1):
+        """
+        Get map walk animations of creature.Animations are shared by everyone who walks with same sprite set
+        :param creature: name of creature sprite set
+        :param delay: delay between animation frames in seconds
+        :param scale: int - map scale factor
+        :return: dict with 'up', 'down', 'left', 'right' and 'idle' PygAnimation objects
+        """
+        key = (creature, delay, scale)
+        cycle = self.walk_cycles.get(key)
+        if cycle is None:
+            import pyganim  # Imported on first use to keep it out of startup
+
+            helper = SpritesHelper()
+            cycle = {}
+            for direction in ('up', 'down', 'left', 'right'):
+                frames = [(self.get_frame(path, scale), delay) for path in helper.get_animation(creature, direction)]
+                cycle[direction] = pyganim.PygAnimation(frames)
+            idle_frame = self.get_frame(helper.get_animation(creature, 'down')[1], scale)
+            cycle['idle'] = pyganim.PygAnimation([(idle_frame, 0.1)])
+            for anim in cycle.values():
+                anim.play()
+            self.walk_cycles[key] = cycle
+        return cycle
+
+    def get_battle_frames(self, creature, image):
+        """
+        Get battle animation frames of creature.Frames are read from battle_<action>_<n>.gif files,
+        actions without files are made from idle image
+        :param creature: name of creature sprite set
+        :param image: pygame surface - idle battle image, frames are scaled to it's size and use it's colorkey
+        :return: dict with 'idle', 'attack', 'hit' and 'ko' lists of surfaces
+        """
+        size = image.get_size()
+        key = (creature, size)
+        frames = self.battle_frames.get(key)
+        if frames is None:
+            helper = SpritesHelper()
+            frames = {}
+            for action in ('idle', 'attack', 'hit', 'ko'):
+                frames[action] = []
+                for path in helper.get_animation(creature, 'battle_' + action):
+                    if os.path.exists(path):
+                        frame = self.get_image(path, size)
+                        frame.set_colorkey(image.get_colorkey())
+                        frames[action].append(frame)
+            if not frames['idle']:
+                frames['idle'] = [image]
+            for action in ('attack', 'hit'):
+                if not frames[action]:
+                    frames[action] = frames['idle'][:1]
+            if not frames['ko']:
+                frames['ko'] = [pg.transform.rotate(frames['idle'][0], 90)]  # Lying character
+            self.battle_frames[key] = frames
+        return frames
+
+
+animation_library = AnimationLibrary()  # Shared instance used by party, NPCs and battle sprites
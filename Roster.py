@@ -0,0 +1,139 @@
+#!usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+MAX_ACTIVE = 4  # Members who travel and fight, others wait in reserve
+# Member attribute - array type.Values are returned to members as Python int, float or bool
+STATS = {'HP': np.int64, 'MAX_HP': np.int64, 'MP': np.int64, 'MAX_MP': np.int64, 'DMG': np.int64,
+         'DEF': np.int64, 'EVS': np.float64, 'KO': np.bool_, 'EXP': np.int64, 'UP_EXP': np.int64}
+CONVERT = {np.int64: int, np.float64: float, np.bool_: bool}
+
+
+class Stat:
+    """
+    Member attribute kept in roster arrays.Member which isn't in roster keeps it in it's own_stats dict
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.convert = CONVERT[STATS[name]]
+
+    def __get__(self, member, owner=None):
+        if member is None:
+            return self
+        roster = member.roster
+        if roster is None:
+            try:
+                return member.own_stats[self.name]
+            except KeyError:
+                raise AttributeError(self.name)
+        return self.convert(roster.stats[self.name][member.slot])
+
+    def __set__(self, member, value):
+        roster = member.roster
+        if roster is None:
+            member.own_stats[self.name] = value
+        else:
+            roster.stats[self.name][member.slot] = value
+
+
+class Roster:
+    """
+    Recruited party members.Stats of all members are kept in NumPy arrays indexed by member's slot, so whole
+    party is updated at once.Active members are ordered as in party, the rest are in reserve
+    """
+
+    def __init__(self, capacity=MAX_ACTIVE, max_active=MAX_ACTIVE):
+        """
+
+        :param capacity: int - number of slots allocated ahead, arrays grow when more members are added
+        :param max_active: int - number of active members, e.g. larger for simulated battles
+        """
+        self.max_active = max_active
+        self.members = []  # Active members in party order
+        self.reserve = []
+        self.stats = {name: np.zeros(capacity, dtype) for name, dtype in STATS.items()}
+        self.free = list(range(capacity - 1, -1, -1))  # Unused slots, lowest last
+        self.active = np.zeros(0, np.intp)  # Slots of active members in party order
+
+    def add(self, member):
+        """
+        Add member to roster, member is active if there is place in party
+        :param member: BaseMember object, it's stats are moved to roster arrays
+        """
+        if not self.free:
+            self.grow()
+        slot = self.free.pop()
+        for name in STATS:
+            self.stats[name][slot] = member.own_stats.pop(name)
+        member.slot = slot
+        member.roster = self
+        if len(self.members) < self.max_active:
+            self.members.append(member)
+        else:
+            self.reserve.append(member)
+        self.update_active()
+
+    def swap(self, member, reserve_member):
+        """
+        Swap active member with reserve member, which takes it's place in party order
+        :param member: active BaseMember object
+        :param reserve_member: BaseMember object from reserve
+        """
+        i = self.members.index(member)
+        j = self.reserve.index(reserve_member)
+        self.members[i], self.reserve[j] = reserve_member, member
+        self.update_active()
+
+    def grow(self):
+        size = len(self.stats['HP'])
+        for name, array in self.stats.items():
+            self.stats[name] = np.concatenate((array, np.zeros(size, array.dtype)))
+        self.free.extend(range(size * 2 - 1, size - 1, -1))
+
+    def update_active(self):
+        self.active = np.array([member.slot for member in self.members], np.intp)
+
+    def alive(self):
+        """
+        Get active members which aren't KOed
+        :return: tuple of BaseMember objects
+        """
+        ko = self.stats['KO'][self.active]
+        return tuple(member for member, knocked_out in zip(self.members, ko) if not knocked_out)
+
+    def add_exp(self, exp):
+        """
+        Add experience to all active members, members who reached level up experience level up
+        :param exp: int - experience
+        """
+        active = self.active
+        self.stats['EXP'][active] += exp
+        for i in np.flatnonzero(self.stats['EXP'][active] >= self.stats['UP_EXP'][active]):
+            self.members[i].lvl_up()
+
+    def resurrect_all(self):
+        """
+        Resurrect active members and restore their HP and MP
+        """
+        active = self.active
+        self.stats['KO'][active] = False
+        self.stats['HP'][active] = self.stats['MAX_HP'][active]
+        self.stats['MP'][active] = self.stats['MAX_MP'][active]
+
+    def all_members(self):
+        return self.members + self.reserve
+
+    def index(self, member):
+        return self.members.index(member)
+
+    def __getitem__(self, index):
+        return self.members[index]
+
+    def __len__(self):
+        return len(self.members)
+
+    def __iter__(self):
+        return iter(self.members)
@@ -0,0 +1,210 @@
+#!usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+CELL_SIZE = 128  # Size of spatial hash cell in pixels, few scaled tiles
+
+
+class SpatialHash:
+    """
+    Uniform grid which indexes objects by rectangles they cover, so only objects near queried area are checked
+    """
+
+    def __init__(self, cell_size=CELL_SIZE):
+        """
+
+        :param cell_size: int - cell width and height in pixels
+        """
+        self.cell_size = cell_size
+        self.cells = {}  # (column, row) - list of objects
+        self.index = {}  # id of object - (object, rect, list of cells it was added to)
+
+    def cells_of(self, rect):
+        """
+        Get grid cells covered by rectangle
+        :param rect: pygame rect object
+        :return: list of (column, row) tuples
+        """
+        size = self.cell_size
+        left = rect.left // size
+        top = rect.top // size
+        right = (rect.right - 1) // size
+        bottom = (rect.bottom - 1) // size
+        return [(x, y) for x in range(left, right + 1) for y in range(top, bottom + 1)]
+
+    def insert(self, item, rect):
+        """
+        Add object to index
+        :param item: any object
+        :param rect: pygame rect object covered by item
+        """
+        cells = self.cells_of(rect)
+        for cell in cells:
+            self.cells.setdefault(cell, []).append(item)
+        self.index[id(item)] = (item, rect.copy(), cells)
+
+    def remove(self, item):
+        """
+        Remove object from index, does nothing if object wasn't added
+        :param item: object
+        """
+        entry = self.index.pop(id(item), None)
+        if entry is None:
+            return
+        for cell in entry[2]:
+            bucket = self.cells[cell]
+            bucket.remove(item)
+            if not bucket:
+                del self.cells[cell]
+
+    def move(self, item, rect):
+        """
+        Update indexed rectangle of object which changed position
+        :param item: object
+        :param rect: pygame rect object - new area of item
+        """
+        entry = self.index.get(id(item))
+        if entry is not None and entry[1] == rect:
+            return
+        self.remove(item)
+        self.insert(item, rect)
+
+    def query(self, rect):
+        """
+        Get objects which rectangles collide with given one
+        :param rect: pygame rect object
+        :return: list of objects
+        """
+        found = []
+        seen = set()
+        for cell in self.cells_of(rect):
+            for item in self.cells.get(cell, ()):
+                key = id(item)
+                if key not in seen:
+                    seen.add(key)
+                    if rect.colliderect(self.index[key][1]):
+                        found.append(item)
+        return found
+
+    def clear(self):
+        self.cells = {}
+        self.index = {}
+
+    def __len__(self):
+        return len(self.index)
+
+
+class Colliders:
+    """
+    Static collider rectangles of map indexed by spatial hash, so moving objects check only colliders near their way
+    """
+
+    def __init__(self, rects=(), cell_size=CELL_SIZE):
+        """
+
+        :param rects: iterable of pygame rect objects
+        :param cell_size: int - cell size of spatial index in pixels
+        """
+        self.rects = list(rects)
+        self.cell_size = cell_size
+        self.grid = SpatialHash(cell_size)
+        for rect in self.rects:
+            self.grid.insert(rect, rect)
+
+    def query(self, rect):
+        """
+        Get colliders overlapping rectangle
+        :param rect: pygame rect object
+        :return: list of pygame rect objects
+        """
+        return self.grid.query(rect)
+
+    def __iter__(self):
+        return iter(self.rects)
+
+    def __len__(self):
+        return len(self.rects)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['grid'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.grid = SpatialHash(self.cell_size)
+        for rect in self.rects:
+            self.grid.insert(rect, rect)
+
+
+class Triggers:
+    """
+    Collection of map objects with 'rect' attribute (teleports, NPCs) which fire when player enters them.
+    Remembers which triggers are touched, so staying on trigger doesn't fire it again every frame
+    """
+
+    def __init__(self, items=(), cell_size=CELL_SIZE):
+        """
+
+        :param items: iterable of objects with rect attribute
+        :param cell_size: int - cell size of spatial index in pixels
+        """
+        self.items = []
+        self.cell_size = cell_size
+        self.grid = SpatialHash(cell_size)
+        self.touching = {}  # id - trigger which collided with player on last check
+        for item in items:
+            self.append(item)
+
+    def append(self, item):
+        self.items.append(item)
+        self.grid.insert(item, item.rect)
+
+    def remove(self, item):
+        self.items.remove(item)
+        self.grid.remove(item)
+        self.touching.pop(id(item), None)
+
+    def move(self, item):
+        """
+        Re-index trigger after it's rect changed
+        :param item: trigger object
+        """
+        self.grid.move(item, item.rect)
+
+    def update(self, rect):
+        """
+        Check triggers against player's rectangle
+        :param rect: pygame rect object
+        :return: tuple (list of entered triggers, list of left triggers)
+        """
+        current = {id(i): i for i in self.grid.query(rect)}
+        entered = [i for key, i in current.items() if key not in self.touching]
+        exited = [i for key, i in self.touching.items() if key not in current]
+        self.touching = current
+        return entered, exited
+
+    def reset(self):
+        """
+        Forget touched triggers, so triggers player stands on fire again on next check
+        """
+        self.touching = {}
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getstate__(self):
+        # Index is keyed by object ids, which are valid only within one process
+        state = self.__dict__.copy()
+        state['touching'] = {}
+        state['grid'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.grid = SpatialHash(self.cell_size)
+        for item in self.items:
+            self.grid.insert(item, item.rect)
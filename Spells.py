@@ -3,36 +3,64 @@
 # -*- coding: utf-8 -*-
 
 from Enums import CharacterEnum as Character, SideEnum
+from ResourceHelpers import Catalogue
+
+# Effect name - (function applying effect with amount to target, function checking if spell is appliable)
+SPELL_EFFECTS = {
+    'heal': (lambda target, amount: target.heal(amount),
+             lambda target: target.KO is not True and target.HP < target.MAX_HP),
+    'damage': (lambda target, amount: target.apply_damage(amount),
+               lambda target: True),  # Spell is always appliable to NPC,as they are removed on knock out
+    'magic_damage': (lambda target, amount: target.apply_magic_damage(amount),
+                     lambda target: not target.KO),
+}
 
 
 class Spell:
     """
-    Represents spell, which can be applied to characters
+    Represents spell, which can be applied to characters.Spells are definitions shared by all characters,
+    so they can't be changed and are pickled as catalogue id
     """
 
-    def __init__(self, name, cost, mp_cost, info, character, side):
+    __slots__ = ('id', 'name', 'cost', 'mp', 'info', 'char', 'side', 'effect', 'amount')
+
+    def __init__(self, id, name, cost, mp_cost, info, character, side, effect, amount):
         """
 
+        :param id: string - catalogue id
         :param name: string - spell name
         :param cost: int - cost in gold
         :param mp_cost: int - mana cost
         :param info: string - spell description
         :param character: CharacterEnum - determines which character can learn this spell (if spell is player-used)
         :param side: SideEnum - determines if spell is used on Player or NPC party
+        :param effect: string - key of SPELL_EFFECTS
+        :param amount: int - effect strength (HP, damage)
         """
+        self.id = id
         self.name = name
         self.cost = int(cost)
         self.mp = int(mp_cost)
         self.info = info
         self.char = character
         self.side = side
+        self.effect = effect
+        self.amount = amount
+
+    def __setattr__(self, key, value):
+        if hasattr(self, key):
+            raise AttributeError('Spell {} is immutable'.format(self.id))
+        super().__setattr__(key, value)
+
+    def __reduce__(self):
+        return get, (self.id,)
 
     def apply(self, target):
         """
         apply spell on it's target
         :param target: player or enemy party member
         """
-        pass
+        SPELL_EFFECTS[self.effect][0](target, self.amount)
 
     def check_appliable(self, target):
         """
@@ -40,64 +68,33 @@ class Spell:
         :param target:
         :return:
         """
-        pass
+        return SPELL_EFFECTS[self.effect][1](target)
 
     def __str__(self):
         return '{} ({} MP)'.format(self.name, self.mp)
 
 
-class Heal(Spell):
-
-    def __init__(self):
-        super().__init__('Heal', 50, 5, 'Heal 5 MP', Character.Healer, SideEnum.Player)
-
-    def apply(self, target):
-        target.heal(5)
-
-    def check_appliable(self, target):
-        if target.KO is not True and target.HP < target.MAX_HP:
-            return True
-        else:
-            return False
-
-
-class Fireball(Spell):
-
-    def __init__(self):
-        super().__init__('Fireball', 50, 10, 'Deal 15 points of damage', Character.Mage, SideEnum.NPC)
-
-    def apply(self, target):
-        target.apply_damage(15)
-
-    def check_appliable(self, target):
-        return True  # Spell is always appliable to NPC,as they are removed on knock out
-
+def create_spell(id, data):
+    """
+    Create spell definition from data file entry
+    :param id: string - catalogue id
+    :param data: dict of spell data
+    :return: Spell object
+    """
+    if data['effect'] not in SPELL_EFFECTS:
+        raise ValueError('Spell {}: unknown effect {}'.format(id, data['effect']))
+    character = Character[data['character']] if data.get('character') else None  # NPC spells aren't learned
+    return Spell(id, data['name'], data['cost'], data['mp'], data['info'], character, SideEnum[data['side']],
+                 data['effect'], int(data['amount']))
 
-class Lightning(Spell):
 
-    def __init__(self):
-        super().__init__('Lightning', 100, 20, 'Deal 25 points of damage', Character.Mage, SideEnum.NPC)
+catalogue = Catalogue('spells.json', create_spell)
 
-    def apply(self, target):
-        target.apply_damage(25)
 
-    def check_appliable(self, target):
-        return True  # Spell is always appliable to NPC,as they are removed on knock out
-        
-
-class FireBreath(Spell):
+def get(id):
     """
-    Fire elemental spell
+    Get spell definition
+    :param id: string - catalogue id
+    :return: Spell object
     """
-
-    def __init__(self):
-        super().__init__('Fire breath', 0, 10, 'Deal 15 points of damage', 0, SideEnum.Player)
-
-    def apply(self, target):
-        target.apply_magic_damage(15)
-
-    def check_appliable(self, target):
-        if target.KO:
-            return False
-        else:
-            return True
+    return catalogue.get(id)
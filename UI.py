@@ -5,10 +5,10 @@
 import pygame as pg
 import os
 from ResourceHelpers import StringsHelper
-from Spells import Fireball, Lightning
-from Items import *
+import Spells
+from Items import Weapon, Armor, Usable, Inventory, get as get_item
 from Enums import CharacterEnum as character, SideEnum as side, ActionsEnum as actions, BattleEnum as Battle, GameEnum
-from Events import MenuQuitEvent, BattleEvent, EngineEvent
+from Events import MenuQuitEvent, BattleEvent, EngineEvent, bus
 
 COL_BLUE = '#00E6E6'
 COL_WHITE = 'white'
@@ -18,6 +18,7 @@ COL_BACK = COL_BLUE
 COL_TEXT = COL_WHITE
 COL_HIGH = COL_GREEN
 COL_WARN = COL_RED
+TRADER_STOCK = ('ManaPotion', 'HealthPotion', 'PhoenixDown')  # Items trader sells, one of each every visit
 
 class MenuItem:
     """
@@ -155,6 +156,10 @@ class Menu:
     Basic class for any ui window with menu's
     """
 
+    # Key - name of method called on key press.Subclasses extend it with their own keys
+    menu_keys = {pg.K_w: 'prev_item', pg.K_UP: 'prev_item', pg.K_s: 'next_item', pg.K_DOWN: 'next_item',
+                 pg.K_RETURN: 'choose_item', pg.K_f: 'choose_item'}
+
     def __init__(self):
         self.index = 0
         self.menu_items = []
@@ -164,12 +169,9 @@ class Menu:
         Update window state on key input event
         :param key: pygame key code
         """
-        if key == pg.K_w or key == pg.K_UP:
-            self.prev_item()
-        elif key == pg.K_s or key == pg.K_DOWN:
-            self.next_item()
-        elif key == pg.K_RETURN or key == pg.K_f:
-            self.choose_item()
+        action = self.menu_keys.get(key)
+        if action is not None:
+            getattr(self, action)()
 
     def next_item(self):
         if self.index + 1 < len(self.menu_items):
@@ -219,8 +221,7 @@ class Window:
 
     def close(self):
         args_dict = {'window': self.__class__}
-        event = pg.event.Event(MenuQuitEvent, args_dict)
-        pg.event.post(event)
+        bus.post(MenuQuitEvent, args_dict)
 
     def create_message(self, msg):
         self.dialog = MessageWindow(self.x + self.width / 2 - 100, self.y + self.height / 2 - 50, 200, 100, msg)
@@ -240,7 +241,7 @@ class MessageWindow(Window):
         surface.blit(self.lbl.image, self.lbl.rect)
 
     def update(self, key):
-        if key == pg.K_RETURN or key == pg.K_f:
+        if key in (pg.K_RETURN, pg.K_f):
             self.quit = True
 
 
@@ -327,8 +328,7 @@ class SelectActionWindow(Window, Menu):
 
     def choose_item(self):
         args_dict = {'sub': Battle.ActionSelected,'action': actions(self.index)}
-        event = pg.event.Event(BattleEvent, args_dict)
-        pg.event.post(event)
+        bus.post(BattleEvent, args_dict)
 
 
 class SelectSpellWindow(SelectActionWindow):
@@ -345,8 +345,7 @@ class SelectSpellWindow(SelectActionWindow):
 
     def choose_item(self):
         args_dict = {'sub': Battle.SpellSelected, 'spell': self.spells[self.index]}
-        event = pg.event.Event(BattleEvent, args_dict)
-        pg.event.post(event)
+        bus.post(BattleEvent, args_dict)
 
 class SelectItemWindow(SelectActionWindow):
 
@@ -362,8 +361,7 @@ class SelectItemWindow(SelectActionWindow):
 
     def choose_item(self):
         args_dict = {'sub': Battle.ItemSelected, 'item': self.items[self.index]}
-        event = pg.event.Event(BattleEvent, args_dict)
-        pg.event.post(event)
+        bus.post(BattleEvent, args_dict)
 
 
 class PauseWindow(Window, Menu):
@@ -410,6 +408,10 @@ class PartyWindow(Window, Menu):
     """
     Party window which shows information about party members stats
     """
+
+    menu_keys = {**Menu.menu_keys, pg.K_d: 'next_item', pg.K_RIGHT: 'next_item', pg.K_a: 'prev_item',
+                 pg.K_LEFT: 'prev_item'}
+
     def __init__(self, x, y, width, height, party):
         super().__init__(x, y, width, height)
         Menu.__init__(self)
@@ -425,10 +427,6 @@ class PartyWindow(Window, Menu):
     def update(self, key):
         super().update(key)
         Menu.update(self, key)
-        if key == pg.K_d or key == pg.K_RIGHT:
-            self.next_item()
-        elif key == pg.K_a or key == pg.K_LEFT:
-            self.prev_item()
         self.set_character()
 
     def prev_item(self):
@@ -454,7 +452,7 @@ class PartyWindow(Window, Menu):
         self.add_info_items()
 
     def set_portrait(self):
-        self.portrait = self.current_member.portrait
+        self.portrait = self.current_member.view.portrait
         rect = self.portrait[1]
         rect.x = self.x + self.width * 0.01
         rect.y = self.y + self.height * 0.01
@@ -507,6 +505,10 @@ class LoadSaveWindow(Window, Menu):
     """
     Window which allows game state save\load
     """
+
+    menu_keys = {**Menu.menu_keys, pg.K_a: 'switch_state', pg.K_d: 'switch_state', pg.K_LEFT: 'switch_state',
+                 pg.K_RIGHT: 'switch_state'}
+
     def __init__(self, x, y, width, height, dummy):
         super().__init__(x, y, width, height)
         Menu.__init__(self)
@@ -528,11 +530,8 @@ class LoadSaveWindow(Window, Menu):
             if self.dialog.quit is True:
                 self.dialog = None
         else:
-            if key == pg.K_a or key == pg.K_d or key == pg.K_LEFT or key == pg.K_RIGHT:
-                self.switch_state()
-            else:
-                super(LoadSaveWindow, self).update(key)
-                Menu.update(self, key)
+            super(LoadSaveWindow, self).update(key)
+            Menu.update(self, key)
 
     def switch_state(self):
         self.save_state = not self.save_state
@@ -563,17 +562,15 @@ class LoadSaveWindow(Window, Menu):
 
     def save(self, slot):
         args_dict = {'sub': GameEnum.GameSaveEvent, 'path': 'saves/save_{}.sf'.format(slot)}
-        event = pg.event.Event(EngineEvent, args_dict)
         self.close()
-        pg.event.post(event)
+        bus.post(EngineEvent, args_dict)
 
 
     def load(self, slot):
         if os.path.isfile('saves/save_{}.sf'.format(slot)):
             args_dict = {'sub': GameEnum.GameLoadEvent, 'path': 'saves/save_{}.sf'.format(slot)}
-            event = pg.event.Event(EngineEvent, args_dict)
             self.close()
-            pg.event.post(event)
+            bus.post(EngineEvent, args_dict)
         else:
             self.create_message('No data in this slot')
 
@@ -601,8 +598,8 @@ class InventoryWindow(Window, Menu):
 
         self.drawables.clear()
         self.menu_items.clear()
-        for i in self.party.inventory:
-            item = MenuItem(i, str(i), None, font_size, COL_WHITE, COL_BLUE, x, y, False)
+        for index, i in enumerate(self.party.inventory):
+            item = MenuItem(i, self.party.inventory.label(index), None, font_size, COL_WHITE, COL_BLUE, x, y, False)
             self.drawables.append(item)
             self.menu_items.append(item)
             y += self.height * 0.06
@@ -641,14 +638,15 @@ class InventoryWindow(Window, Menu):
 
     def apply_selection(self, target):
         if target is not None:
-            if isinstance(self.party.inventory[self.index], Weapon):
-                self.party.inventory.append(target.weapon)
-                target.set_weapon(self.party.inventory[self.index])
-            elif isinstance(self.party.inventory[self.index], Armor):
-                self.party.inventory.append(target.armor)
-                target.set_armor(self.party.inventory[self.index])
-
-            del self.party.inventory[self.index]
+            item = self.party.inventory[self.index]
+            self.party.inventory.remove(item)
+            if isinstance(item, Weapon):
+                self.party.inventory.add(target.weapon)
+                target.set_weapon(item)
+            elif isinstance(item, Armor):
+                self.party.inventory.add(target.armor)
+                target.set_armor(item)
+            self.index = min(self.index, len(self.party.inventory) - 1)
 
             self.load_items()
             self.set_cursor()
@@ -666,6 +664,9 @@ class TraderWindow(Window, Menu):
     Trader window in which player can buy or sell things.Has two states - sell and buy
     """
 
+    menu_keys = {**Menu.menu_keys, pg.K_a: 'switch_state', pg.K_d: 'switch_state', pg.K_LEFT: 'switch_state',
+                 pg.K_RIGHT: 'switch_state'}
+
     def __init__(self, x, y, width, height, party):
         super().__init__(x, y, width, height)
         Menu.__init__(self)
@@ -673,7 +674,7 @@ class TraderWindow(Window, Menu):
         self.party = party
         self.description = Label('', COL_WHITE, None, 18, self.x + self.width * 0.01, self.y + self.height * 0.05)
         self.gold = InfoItem('Gold', party.gold, None, 18, self.x + self.width * 0.8, self.y + self.height * 0.05, 50)
-        self.buy_items = [ManaPotion(), HealthPotion(), PhoenixDown()]
+        self.buy_items = Inventory(get_item(i) for i in TRADER_STOCK)  # Trader's stock
         self.load_items()
         self.set_cursor()
 
@@ -696,10 +697,7 @@ class TraderWindow(Window, Menu):
             if key == pg.K_q:
                 self.close()
                 self.party.set_pos(self.party.rect.x, self.party.rect.y + 5)
-            elif key == pg.K_a or key == pg.K_d or key == pg.K_LEFT or key == pg.K_RIGHT:
-                self.switch_state()
             else:
-                super(TraderWindow, self).update(key)
                 Menu.update(self, key)
 
     def switch_state(self):
@@ -737,8 +735,8 @@ class TraderWindow(Window, Menu):
         y = self.y + self.height * 0.1 + font_size / 2
         x = self.x + self.width * 0.01
 
-        for i in self.party.inventory:
-            item = MenuItem(i, str(i), None, font_size, COL_WHITE, COL_BLUE, x, y, False)
+        for index, i in enumerate(self.party.inventory):
+            item = MenuItem(i, self.party.inventory.label(index), None, font_size, COL_WHITE, COL_BLUE, x, y, False)
             self.drawables.append(item)
             self.menu_items.append(item)
             y += self.height * 0.06
@@ -750,8 +748,8 @@ class TraderWindow(Window, Menu):
         y = self.y + self.height * 0.1 + font_size / 2
         x = self.x + self.width * 0.01
 
-        for i in self.buy_items:
-            item = MenuItem(i, str(i), None, font_size, COL_WHITE, COL_BLUE, x, y, False)
+        for index, i in enumerate(self.buy_items):
+            item = MenuItem(i, self.buy_items.label(index), None, font_size, COL_WHITE, COL_BLUE, x, y, False)
             self.drawables.append(item)
             self.menu_items.append(item)
             y += self.height * 0.06
@@ -761,8 +759,8 @@ class TraderWindow(Window, Menu):
     def sell_item(self, item):
         self.party.inventory.remove(item)
         self.party.gold += item.cost
-        self.index -= 1
-        self.buy_items.append(item)
+        self.index = max(min(self.index, len(self.party.inventory) - 1), 0)  # Cursor stays if stack is left
+        self.buy_items.add(item)
 
         self.gold.set_value(self.party.gold)
         self.load_items()
@@ -771,8 +769,8 @@ class TraderWindow(Window, Menu):
         if self.party.gold >= item.cost:
             self.party.add_items([item])
             self.party.gold -= item.cost
-            self.index -= 1
             self.buy_items.remove(item)
+            self.index = max(min(self.index, len(self.buy_items) - 1), 0)
 
             self.gold.set_value(self.party.gold)
             self.load_items()
@@ -789,7 +787,7 @@ class WizardWindow(Window, Menu):
         super().__init__(x, y, width, height)
         Menu.__init__(self)
         self.party = party
-        self.buy_items = [Fireball(), Lightning()]
+        self.buy_items = [Spells.get('Fireball'), Spells.get('Lightning')]
         self.description = Label('', COL_WHITE, None, 18, self.x + self.width * 0.01, self.y + self.height * 0.05)
         self.gold = InfoItem('Gold', party.gold, None, 18, self.x + self.width * 0.8, self.y + self.height * 0.05, 50)
         self.load_items()
@@ -815,7 +813,6 @@ class WizardWindow(Window, Menu):
                 self.close()
                 self.party.set_pos(self.party.rect.x, self.party.rect.y + 5)
             else:
-                super(WizardWindow, self).update(key)
                 Menu.update(self, key)
 
     def set_cursor(self):
@@ -915,8 +912,7 @@ class PartyInfoWindow(Window, Menu):
 
     def choose_item(self):
         args_dict = {'sub': Battle.TargetSelected, 'npc': self.party[self.index]}
-        event = pg.event.Event(BattleEvent, args_dict)
-        pg.event.post(event)
+        bus.post(BattleEvent, args_dict)
 
 
 class NPCInfoWindow(PartyInfoWindow):
@@ -0,0 +1,84 @@
+#!usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+DEFEATED = 'defeated'  # Map NPCs defeated in battle
+OPENED = 'opened'  # Opened chests and doors
+TALKED = 'talked'  # NPCs player talked to
+
+
+class WorldFlags:
+    """
+    One-shot world state flags grouped by namespace.Non-negative integer keys (NPC ids) are kept in bitsets,
+    so checking flag takes constant time and thousands of flags take few bytes in saves, other keys are kept in sets
+    """
+
+    def __init__(self):
+        self.bits = {}  # namespace - bytearray bitset of integer keys
+        self.keys = {}  # namespace - set of other keys
+
+    @staticmethod
+    def from_registry(registry, memo):
+        """
+        Convert list of defeated NPC ids of old saves.Conversions of the same list with the same memo return
+        the same flags, so states which shared list share flags
+        :param registry: list of int
+        :param memo: dict of id of converted list - (list, WorldFlags), kept while save is loaded
+        :return: WorldFlags object
+        """
+        entry = memo.get(id(registry))
+        if entry is None:
+            flags = WorldFlags()
+            for identifier in registry:
+                flags.set(DEFEATED, identifier)
+            entry = (registry, flags)
+            memo[id(registry)] = entry
+        return entry[1]
+
+    def set(self, namespace, key, value=True):
+        """
+        Set or clear flag
+        :param namespace: string - flag group, e.g. DEFEATED
+        :param key: int or other hashable key
+        :param value: bool
+        """
+        if isinstance(key, int) and key >= 0:
+            bits = self.bits.setdefault(namespace, bytearray())
+            index = key >> 3
+            if index >= len(bits):
+                if not value:
+                    return
+                bits.extend(bytes(index + 1 - len(bits)))
+            if value:
+                bits[index] |= 1 << (key & 7)
+            else:
+                bits[index] &= ~(1 << (key & 7)) & 0xFF
+        elif value:
+            self.keys.setdefault(namespace, set()).add(key)
+        else:
+            self.keys.get(namespace, set()).discard(key)
+
+    def is_set(self, namespace, key):
+        if isinstance(key, int) and key >= 0:
+            bits = self.bits.get(namespace)
+            index = key >> 3
+            return bits is not None and index < len(bits) and bits[index] >> (key & 7) & 1 == 1
+        return key in self.keys.get(namespace, ())
+
+    def count(self, namespace):
+        """
+        Get number of set flags in namespace
+        :param namespace: string
+        :return: int
+        """
+        bits = self.bits.get(namespace, b'')
+        return bin(int.from_bytes(bits, 'little')).count('1') + len(self.keys.get(namespace, ()))
+
+    def __getstate__(self):
+        # Trailing zero bytes of cleared flags aren't saved
+        return {'bits': {namespace: bytes(bits).rstrip(b'\x00') for namespace, bits in self.bits.items()},
+                'keys': self.keys}
+
+    def __setstate__(self, state):
+        self.bits = {namespace: bytearray(bits) for namespace, bits in state['bits'].items()}
+        self.keys = state['keys']
@@ -2,22 +2,35 @@
 
 # -*- coding: utf-8 -*-
 
+import time
+
+STARTED = time.perf_counter()  # Taken before any import to measure full time to first frame
+
 from Game import Game
 from GameStates import MainMenuState, SplashState
 from ResourceHelpers import SettingsHelper as Settings
-from moonphase import phase, position
 import pygame as pg
 
-pg.init()
+
+def choose_start_state():
+    """
+    Splash screen is shown on full moon
+    :return: starting state class
+    """
+    from moonphase import phase, position
+
+    if phase(position()) == "Full Moon":
+        return SplashState
+    return MainMenuState
+
+
+pg.display.init()  # Only subsystems used by the game, pg.init() also opens audio and joystick devices
+pg.font.init()
 settings = Settings()
 w = settings.get('screen_width', 800)
 h = settings.get('screen_height', 640)
 DISPLAY = (w, h)
 screen = pg.display.set_mode(DISPLAY)
 pg.display.set_caption('JRPG')
-if phase(position()) == "Full Moon":
-    g = Game(screen, SplashState)
-else:
-    g = Game(screen, MainMenuState)
+g = Game(screen, choose_start_state(), STARTED)
 g.run()
-
@@ -0,0 +1,63 @@
+#!usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame as pg
+
+import Benchmarks
+import Replay
+
+FRAME_TIMES = (16, 17, 33, 8)  # Uneven time steps of recorded session
+# Frame - (event type, key), party walks to standing NPC of generated town map while roaming NPC wanders
+INPUT = {2: [(pg.KEYDOWN, pg.K_a), (pg.KEYDOWN, pg.K_w)], 27: [(pg.KEYUP, pg.K_a)]}
+
+
+class ReplayTest(unittest.TestCase):
+    """
+    Session recorded on world map with roaming NPCs is replayed with the same game events on the same frames
+    """
+
+    def setUp(self):
+        self.fixture = Benchmarks.Fixture()
+
+    def tearDown(self):
+        self.fixture.close()
+
+    @staticmethod
+    def roaming_npcs(game):
+        world = game.state_stack.states[0]
+        return [npc.rect.topleft for npc in world.npcs if getattr(npc, 'ai', None) is not None]
+
+    def record(self, frames):
+        recording = Replay.Recording(7, 60, Benchmarks.world_args('town')['map_file'])
+        recorder = Replay.Recorder(recording)
+        game = recorder.game
+        for frame in range(frames):
+            for event_type, key in INPUT.get(frame, []):
+                pg.event.post(pg.event.Event(event_type, key=key, mod=0, unicode=''))
+            game.event_loop()
+            game.update(FRAME_TIMES[frame % len(FRAME_TIMES)])
+        path = os.path.join('saves', 'session.json')
+        recording.save(path)
+        return Replay.Recording.load(path), self.roaming_npcs(game)
+
+    def test_replay_matches_recording(self):
+        recording, npcs = self.record(190)
+        self.assertEqual(recording.frame_times[:len(FRAME_TIMES)], list(FRAME_TIMES))
+        self.assertIn('EncounterEvent', [event for frame, event in recording.trace])
+
+        replayer = Replay.Replayer(recording)
+        report = replayer.run()
+        self.assertIsNone(report['diverged_at'])
+        self.assertEqual(replayer.trace, recording.trace)
+        self.assertEqual(self.roaming_npcs(replayer.game), npcs)
+
+
+if __name__ == '__main__':
+    unittest.main()
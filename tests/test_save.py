@@ -0,0 +1,129 @@
+#!usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame as pg
+
+import Benchmarks
+import GameStates
+import NPC
+import RNG
+import UI
+import WorldFlags
+from Game import Game
+
+SAVE_PATH = os.path.join('saves', 'test.dat')
+
+
+class SaveTest(unittest.TestCase):
+    """
+    Real map state stacks are saved and loaded with their party, NPCs and world flags
+    """
+
+    def setUp(self):
+        self.fixture = Benchmarks.Fixture()
+
+    def tearDown(self):
+        self.fixture.close()
+
+    def start(self, state, args=None, frames=10):
+        game = Game(self.fixture.screen, partial(state, args or Benchmarks.world_args()))
+        self.run_frames(game, frames)
+        return game
+
+    @staticmethod
+    def run_frames(game, frames):
+        for _ in range(frames):
+            game.event_loop()
+            game.update(16)
+            game.draw()
+
+    @staticmethod
+    def snapshot(game):
+        states = game.state_stack.states
+        top = states[-1]
+        return ([type(state).__name__ for state in states], top.player_party.rect.topleft,
+                sorted((npc.id, npc.rect.topleft) for npc in top.npcs if isinstance(npc, NPC.MapNPC)),
+                [(member.name, member.LVL, member.HP) for member in top.player_party.roster.all_members()],
+                top.player_party.gold)
+
+    def save_and_load(self, game):
+        game.state_stack.peek().toggle_menu(UI.LoadSaveWindow)  # Game is saved from menu
+        saved = self.snapshot(game)
+        game.save_game(SAVE_PATH)
+        self.assertEqual(self.snapshot(game), saved)
+        self.run_frames(game, 20)  # NPCs walk away from saved positions
+        game.load_game(SAVE_PATH)
+        self.assertEqual(self.snapshot(game), saved)
+        top = game.state_stack.peek()
+        self.assertIsNone(top.menu)
+        self.assertFalse(top.player_party.paused)
+        top.get_event(pg.event.Event(pg.KEYDOWN, key=pg.K_d, mod=0, unicode=''))
+        self.run_frames(game, 5)
+        self.assertGreater(top.player_party.rect.x, saved[1][0])
+        return top
+
+    def test_world_map(self):
+        game = self.start(GameStates.WorldMapState)
+        world = game.state_stack.peek()
+        world.world_flags.set(WorldFlags.DEFEATED, 2)
+        world.remove_npc(2)
+        loaded = self.save_and_load(game)
+        self.assertIsNot(loaded, world)
+        self.assertTrue(loaded.world_flags.is_set(WorldFlags.DEFEATED, 2))
+
+    def test_local_map(self):
+        game = self.start(GameStates.WorldMapState)
+        game.state_stack.peek().player_party.set_pos(120, 120)  # Teleport to town
+        self.run_frames(game, 4)
+        self.assertIsInstance(game.state_stack.peek(), GameStates.LocalMapState)
+        loaded = self.save_and_load(game)
+        self.assertIs(loaded.player_party, game.state_stack.states[0].player_party)
+
+    def test_legacy_registry(self):
+        game = self.start(GameStates.WorldMapState)
+        game.state_stack.peek().player_party.set_pos(120, 120)
+        self.run_frames(game, 4)
+        registry = [2, 40]  # Old saves kept list of defeated NPC ids shared by states
+        for state in game.state_stack.states:
+            del state.world_flags
+            state.npc_registry = registry
+        game.save_game(SAVE_PATH)
+        game.load_game(SAVE_PATH)
+        world, town = game.state_stack.states
+        self.assertIs(world.world_flags, town.world_flags)
+        self.assertTrue(town.world_flags.is_set(WorldFlags.DEFEATED, 40))
+        self.assertEqual(GameStates.LOAD_MEMO, {})
+
+    def test_open_world(self):
+        args = dict(Benchmarks.world_args(), map_file=os.path.join('resources', 'maps', 'regions'))
+        self.save_and_load(self.start(GameStates.OpenWorldMapState, args))
+
+    @staticmethod
+    def next_draws():
+        return ([RNG.get(name).random() for name in RNG.STREAMS],
+                RNG.get_bulk(RNG.LOOT).random(3).tolist())
+
+    def test_random_streams(self):
+        RNG.seed(11)
+        game = self.start(GameStates.WorldMapState, frames=30)  # Roaming NPCs draw from map stream
+        RNG.get(RNG.COMBAT).random()
+        RNG.get_bulk(RNG.LOOT).random(5)
+        game.save_game(SAVE_PATH)
+        expected = self.next_draws()
+        self.next_draws()
+        RNG.seed(12)  # Game loaded in another session
+        game.load_game(SAVE_PATH)
+        self.assertEqual(RNG.streams.game_seed, 11)
+        self.assertEqual(self.next_draws(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()